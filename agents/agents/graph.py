@@ -10,7 +10,7 @@ from langgraph.types import Command
 
 # Tool imports
 sys.path.append(str(Path(__file__).parent))
-from tools.food_nutrition import food_nutrition_tool
+from tools.food_nutrition import food_nutrition_tool, food_nutrition_batch_tool
 from tools.ocr import clova_ocr_tool
 from tools.user_info import get_user_info_by_user_id
 from tools.volume_predictor import predict_volume_tool
@@ -18,12 +18,16 @@ from langchain.agents import create_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_naver_community.tool import NaverNewsSearch  # For news articles
 from langchain_naver_community.tool import NaverBlogSearch  # For blog posts
+from .planner import RulePlanner
 
 # ---- State definition ----
 class OrchestrationState(TypedDict, total=False):
     messages: List[BaseMessage]
     user_id: Optional[str]
     image: Optional[str]
+    # Supervisor output: agents to run and, per agent, the agents whose results it needs
+    plan: List[str]
+    dependencies: Dict[str, List[str]]
     # The following are per-agent results
     vision: Optional[Dict[str, Any]]
     nutrition: Optional[Dict[str, Any]]
@@ -37,8 +41,20 @@ Choose which agents to call, and in what order, to fulfil the request using this
 - nutrition: for nutrition lookup and synthesis
 - summarizer: for user profile/history/context
 
-Respond in JSON: { "plan": ["vision",...], "explanation": str }
+Agents only wait for the agents they need results from; the others run in parallel.
+By default nutrition needs vision and summarizer, and vision and summarizer need nothing.
+
+Respond in JSON: { "plan": ["vision",...], "depends_on": {"nutrition": ["vision"]}, "explanation": str }
+"depends_on" is optional and overrides the default dependencies of the agents it lists.
 """
+
+# Agents the supervisor can plan, and the results each one needs before it can start
+AGENTS = ("vision", "summarizer", "nutrition")
+DEFAULT_DEPENDENCIES: Dict[str, List[str]] = {
+    "vision": [],
+    "summarizer": [],
+    "nutrition": ["vision", "summarizer"],
+}
 VISION_SYSTEM = """You are an expert in food image analysis.
 - Call 'predict_volume_tool' to get food volume (if necessary)
 - Call 'clova_ocr_tool' to extract text from labels
@@ -46,7 +62,8 @@ VISION_SYSTEM = """You are an expert in food image analysis.
 Reply in JSON containing available info like: detections, ocr, volume, confidence, notes.
 """
 NUTRITION_SYSTEM = """You synthesize nutrition info from ingredients, ocr and volume.
-Use food_nutrition_tool as needed. Reply in JSON with keys:
+Use food_nutrition_batch_tool to look up all foods of a meal in one call,
+or food_nutrition_tool for a single food. Reply in JSON with keys:
 foods, macros, micronutrients, confidence, provenance.
 """
 SUMMARIZER_SYSTEM = """You pull up user profile and history with get_user_info_by_user_id.
@@ -81,17 +98,20 @@ def safe_json(text) -> Any:
 class MultiAgentGraph:
     """Simplified LangGraph setup according to agent-flow.md."""
 
-    def __init__(self, llm: BaseLanguageModel):
+    def __init__(self, llm: BaseLanguageModel, planner: Optional[RulePlanner] = None):
         # Instantiate each agent
         self.llm = llm
+        # Plans common requests without a supervisor LLM call
+        self.planner = planner if planner is not None else RulePlanner()
         self.supervisor = new_agent(llm, [], SUPERVISOR_SYSTEM)
         self.vision = new_agent(llm, [predict_volume_tool, clova_ocr_tool], VISION_SYSTEM)
-        self.nutrition = new_agent(llm, [food_nutrition_tool], NUTRITION_SYSTEM)
+        self.nutrition = new_agent(llm, [food_nutrition_batch_tool, food_nutrition_tool], NUTRITION_SYSTEM)
         self.summarizer = new_agent(llm, [get_user_info_by_user_id], SUMMARIZER_SYSTEM)
         self.composer = new_agent(llm, [], COMPOSER_SYSTEM)
 
         workflow = StateGraph(OrchestrationState)
         workflow.add_node("supervisor", self._supervisor_node)
+        workflow.add_node("dispatch", self._dispatch_node)
         workflow.add_node("vision", self._vision_node)
         workflow.add_node("nutrition", self._nutrition_node)
         workflow.add_node("summarizer", self._summarizer_node)
@@ -100,23 +120,49 @@ class MultiAgentGraph:
         workflow.add_edge("composer", END)
         self.graph = workflow.compile()
 
-    def _get_next_agent(self, plan: List[str], results: OrchestrationState) -> Optional[str]:
-        # plan is a list like ["vision", "nutrition", ...]
-        # Return the next agent not yet done (has no output in results)
-        for agent in plan:
-            if results.get(agent) is None:
-                return agent
-        return None
+    @staticmethod
+    def _ready_agents(state: OrchestrationState) -> List[str]:
+        """
+        Planned agents that have not run yet and whose dependencies all have results.
+        Dependencies on agents outside the plan are ignored.
+        """
+        plan = state.get("plan") or []
+        dependencies = state.get("dependencies") or {}
+        pending = [agent for agent in plan if state.get(agent) is None]
+        return [
+            agent for agent in pending
+            if all(dep not in pending for dep in dependencies.get(agent, []))
+        ]
 
     def _supervisor_node(self, state: OrchestrationState) -> Command:
         # Parse user intent and make a plan
         msg_content = state["messages"][-1].content if state.get("messages") else ""
-        plan_resp = self.supervisor.invoke({"input": msg_content})
-        plan_json = safe_json(plan_resp.get("output", str(plan_resp)))
-        plan = plan_json.get("plan") or []
-        updates = {"plan": plan}
-        next_agent = plan[0] if plan else "composer"
-        return Command(update=updates, goto=next_agent)
+        plan_json = self.planner.plan(msg_content, state.get("user_id"), state.get("image"))
+        if plan_json is None:
+            # Ambiguous request: ask the LLM supervisor
+            plan_resp = self.supervisor.invoke({"input": msg_content})
+            plan_json = safe_json(plan_resp.get("output", str(plan_resp)))
+        if not isinstance(plan_json, dict):
+            plan_json = {}
+        plan = [agent for agent in dict.fromkeys(plan_json.get("plan") or []) if agent in AGENTS]
+        dependencies = {agent: list(DEFAULT_DEPENDENCIES[agent]) for agent in plan}
+        for agent, deps in (plan_json.get("depends_on") or {}).items():
+            if agent in dependencies and isinstance(deps, list):
+                dependencies[agent] = [dep for dep in deps if dep in AGENTS and dep != agent]
+        updates = {"plan": plan, "dependencies": dependencies}
+        return Command(update=updates, goto="dispatch")
+
+    def _dispatch_node(self, state: OrchestrationState) -> Command:
+        """
+        Join point after every agent step: fan out to all agents whose inputs are ready
+        (LangGraph runs them as parallel branches in one step), or go to the composer
+        once every planned agent has a result.
+        """
+        pending = [agent for agent in state.get("plan") or [] if state.get(agent) is None]
+        if not pending:
+            return Command(goto="composer")
+        # A dependency cycle leaves nothing ready; fall back to plan order
+        return Command(goto=self._ready_agents(state) or pending[:1])
 
     def _vision_node(self, state: OrchestrationState) -> Command:
         # Only run if "vision" is in the plan
@@ -128,12 +174,8 @@ class MultiAgentGraph:
         vision_input = f"User: {info['user']}\nImage: {info['image']}\nRequest: {info['request']}\n"
         output = self.vision.invoke({"input": vision_input}).get("output", "")
         result = safe_json(output)
-        updates = {"vision": result}
-        # figure out who is next
-        plan = state.get("plan", ["vision"])
-        next_agent = self._get_next_agent(plan, {**state, **updates})
-        next_agent = next_agent or "composer"
-        return Command(update=updates, goto=next_agent)
+        # Only this agent's key is written, so parallel branches never conflict
+        return Command(update={"vision": result}, goto="dispatch")
 
     def _nutrition_node(self, state: OrchestrationState) -> Command:
         # Prepare context from vision and summarizer, if available
@@ -147,11 +189,8 @@ class MultiAgentGraph:
                      f"Profile: {json.dumps(nut_input['profile'], ensure_ascii=False)}"
         output = self.nutrition.invoke({"input": input_text}).get("output", "")
         result = safe_json(output)
-        updates = {"nutrition": result}
-        plan = state.get("plan", ["nutrition"])
-        next_agent = self._get_next_agent(plan, {**state, **updates})
-        next_agent = next_agent or "composer"
-        return Command(update=updates, goto=next_agent)
+        # Only this agent's key is written, so parallel branches never conflict
+        return Command(update={"nutrition": result}, goto="dispatch")
 
     def _summarizer_node(self, state: OrchestrationState) -> Command:
         sum_input = {
@@ -161,13 +200,10 @@ class MultiAgentGraph:
         input_text = f"User: {sum_input['user_id']}\nRequest: {sum_input['request']}"
         output = self.summarizer.invoke({"input": input_text}).get("output", "")
         result = safe_json(output)
-        updates = {"summarizer": result}
-        plan = state.get("plan", ["summarizer"])
-        next_agent = self._get_next_agent(plan, {**state, **updates})
-        next_agent = next_agent or "composer"
-        return Command(update=updates, goto=next_agent)
+        # Only this agent's key is written, so parallel branches never conflict
+        return Command(update={"summarizer": result}, goto="dispatch")
 
-    def _composer_node(self, state: OrchestrationState) -> OrchestrationState:
+    def _composer_node(self, state: OrchestrationState) -> Dict[str, Any]:
         input_data = {
             "plan": state.get("plan"),
             "vision": state.get("vision"),
@@ -181,7 +217,11 @@ class MultiAgentGraph:
                      f"Summarizer: {json.dumps(input_data['summarizer'], ensure_ascii=False)}\n"
         resp = self.composer.invoke({"input": input_text})
         output = resp.get("output", str(resp))
-        return {**state, "composer": output}
+        return {"composer": output}
+
+    def planner_stats(self) -> Dict[str, Any]:
+        """How many requests were planned by rules vs the LLM supervisor."""
+        return self.planner.stats()
 
     def invoke(
         self,
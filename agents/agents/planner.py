@@ -0,0 +1,79 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+# Words that mean the user wants nutrition facts (English and Korean)
+NUTRITION_KEYWORDS = (
+    "calorie", "calories", "kcal", "nutrition", "nutrient", "nutrients", "macro", "macros",
+    "protein", "carb", "carbs", "carbohydrate", "fat", "fats", "fiber", "sugar", "sodium",
+    "vitamin", "vitamins", "mineral", "cholesterol", "diet", "healthy", "weight", "portion",
+    "serving", "grams",
+    "칼로리", "영양", "단백질", "탄수화물", "지방", "당류", "나트륨", "식단", "다이어트",
+)
+# Words that refer to a picture; without an attached image the intent is unclear
+IMAGE_KEYWORDS = ("image", "photo", "picture", "pic", "사진", "이미지")
+
+_WORD_RE = re.compile(r"[\w']+", flags=re.UNICODE)
+
+
+class RulePlanner:
+    """
+    Deterministic pre-planner for MultiAgentGraph.
+
+    Common requests are planned from the request itself, without an LLM call:
+    - an attached image -> vision
+    - nutrition keywords -> nutrition
+    - a user id -> summarizer (profile, goals, allergies)
+    Returns None when the request is ambiguous, so the LLM supervisor plans it instead.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rule_planned = 0
+        self.llm_planned = 0
+
+    def plan(self, message: str, user_id: Optional[str] = None, image: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        text = (message or "").lower()
+        words = set(_WORD_RE.findall(text))
+        # Korean keywords are usually followed by particles, so match them as substrings
+        wants_nutrition = any(
+            keyword in words if keyword.isascii() else keyword in text for keyword in NUTRITION_KEYWORDS
+        )
+        mentions_image = any(
+            keyword in words if keyword.isascii() else keyword in text for keyword in IMAGE_KEYWORDS
+        )
+
+        plan: List[str] = []
+        reasons: List[str] = []
+        if image:
+            plan.append("vision")
+            reasons.append("image attached")
+        elif mentions_image:
+            # Refers to a picture that is not attached
+            return self._fallback()
+        if user_id:
+            plan.append("summarizer")
+            reasons.append("user id present")
+        if wants_nutrition:
+            plan.append("nutrition")
+            reasons.append("nutrition keywords")
+
+        if not image and not wants_nutrition:
+            # Nothing food-specific to anchor the plan on
+            return self._fallback()
+
+        with self._lock:
+            self.rule_planned += 1
+        return {"plan": plan, "explanation": "rule-based: " + ", ".join(reasons)}
+
+    def _fallback(self) -> None:
+        with self._lock:
+            self.llm_planned += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.rule_planned + self.llm_planned
+        return {
+            "rule_planned": self.rule_planned,
+            "llm_planned": self.llm_planned,
+            "rule_planned_fraction": self.rule_planned / total if total else 0.0,
+        }
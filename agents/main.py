@@ -1,32 +1,107 @@
-from typing import Optional
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import asyncio
+import json
+import time
+from typing import List, Optional
+from fastapi import BackgroundTasks, FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.responses import ORJSONResponse
 from langchain_naver import ChatClovaX
 from langfuse import get_client
 from pydantic import BaseModel
+import os
 import sys
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 # from agents.supervisor import SupervisorAgent
 from sqlmodel import Session, select
 from utils.postgresql import engine, Image
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 # import sys
 # from pathlib import Path
 # sys.path.append(str(Path(__file__).parent.parent))
-from volume_predictor import VolumePredictor
+from volume_predictor import model_registry, serialize_predictions, inference_pool, predictor_fingerprint
 
-from tools.food_nutrition import food_nutrition_tool
+from tools.food_nutrition import food_nutrition_tool, food_nutrition_batch_tool, attach_nutrition, get_retriever, retriever_stats
 from tools.ocr import clova_ocr_tool
 from tools.user_info import get_user_info_by_user_id
 from tools.volume_predictor import predict_volume_tool
 from utils.minio_client import minio_client
+from utils.micro_batcher import MicroBatcher, QueueFullError
+from utils.result_cache import prediction_cache
+from utils.executors import run_io, run_inference, inference_executor, shutdown_executors, executor_stats
+from utils.tool_runner import ToolRunner
 from langchain_community.tools import DuckDuckGoSearchRun 
 langfuse = get_client()
 
-def lifespan(app: FastAPI):
+def run_predict_batch(images):
+    """
+    Batched forward pass for the micro-batcher. If the batch fails (e.g. one corrupt upload),
+    retry image by image so only the failing request gets an error.
+    """
+    predictor = model_registry.get_predictor()
+    try:
+        return predictor.predict_batch(images)
+    except Exception:
+        if len(images) == 1:
+            raise
+    results = []
+    for image in images:
+        try:
+            results.append(predictor.predict(image))
+        except Exception as predict_err:
+            results.append(predict_err)
+    return results
+
+
+# Concurrent predict requests are grouped into one batched forward pass
+predict_batcher = MicroBatcher(
+    run_predict_batch,
+    max_batch_size=int(os.getenv("PREDICT_MAX_BATCH_SIZE", "8")),
+    max_wait_ms=float(os.getenv("PREDICT_MAX_WAIT_MS", "10")),
+    max_queue_size=int(os.getenv("PREDICT_MAX_QUEUE_SIZE", "64")),
+    run_blocking=run_inference,
+)
+# Seconds clients are asked to wait before retrying when the batcher queue is full
+RETRY_AFTER_SECONDS = os.getenv("PREDICT_RETRY_AFTER_SECONDS", "1")
+
+
+async def predict_stream(image_stream):
+    """
+    Predict one image: on the inference worker pool when INFERENCE_WORKERS > 0, otherwise
+    through the in-process micro-batcher.
+    """
+    if inference_pool is not None:
+        return await inference_pool.predict_async(image_stream, run_blocking=run_io)
+    return await predict_batcher.submit(image_stream)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the vision models once per worker and run a warm-up inference
+    # in the background, so /health answers while /ready waits for hot models.
+    # With an inference pool the models live in the pool processes only.
+    if inference_pool is not None:
+        inference_pool.start()
+    else:
+        threading.Thread(
+            target=model_registry.warm_up_with_retry,
+            kwargs={
+                "attempts": int(os.getenv("MODEL_WARMUP_ATTEMPTS", "3")),
+                "backoff_s": float(os.getenv("MODEL_WARMUP_BACKOFF_SECONDS", "5")),
+            },
+            name="model-warmup",
+            daemon=True,
+        ).start()
+    # The food retriever (embedder + Chroma) is built off the event loop, not at import
+    threading.Thread(target=get_retriever, name="retriever-warmup", daemon=True).start()
     print("FastAPI has been installed completely.")
     yield
+    await predict_batcher.stop()
+    if inference_pool is not None:
+        inference_pool.stop()
+    shutdown_executors()
 
 
 app = FastAPI(
@@ -39,38 +114,84 @@ app = FastAPI(
 )
 
 
-# POST /api/predict_img
-# {
-#   "user_id": "user123",
-#   "image_id": "image456"
-# }
-@app.post("/api/predict_img")
-async def predict_img(
-    user_id: str,
-    image_id: str,
-):
-    # Define fallback result
-    fallback_result = {
-        "volume_predictions": [
-            {
-                "object_name": "rice",
-                "volume_m3": 0.00012,
-                "weight_g": 30.5,
-                "density_g_per_cm3": 1.28,
-                "score": 0.97,
-                "box": [120, 55, 220, 185]
-            },
-            {
-                "object_name": "chicken",
-                "volume_m3": 0.00008,
-                "weight_g": 22.1,
-                "density_g_per_cm3": 1.03,
-                "score": 0.91,
-                "box": [250, 70, 340, 180]
-            }
-        ]
+@app.get("/health")
+async def health():
+    """
+    Liveness probe: the process is up and serving requests. Fails once model loading has
+    failed for good (warm-up retries exhausted, or a pool worker could not load its models),
+    so the orchestrator restarts the pod instead of leaving it unready.
+    """
+    if inference_pool is not None:
+        failed, status = inference_pool.failed, inference_pool.status()
+    else:
+        failed, status = model_registry.failed, model_registry.status()
+    if failed:
+        raise HTTPException(status_code=503, detail=status)
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: only healthy once the vision models are loaded and warmed up."""
+    if inference_pool is not None:
+        status, is_ready = inference_pool.status(), inference_pool.is_ready
+    else:
+        status, is_ready = model_registry.status(), model_registry.is_ready
+    if not is_ready:
+        raise HTTPException(status_code=503, detail=status)
+    return {"status": "ready", **status}
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Serving metrics: model registry state, micro-batcher, result caches and executor statistics."""
+    return {
+        "models": model_registry.status(),
+        "predict_batcher": predict_batcher.metrics(),
+        "prediction_cache": prediction_cache.stats(),
+        "executors": executor_stats(),
+        "inference_pool": inference_pool.status() if inference_pool is not None else None,
+        "tools": tool_runner.stats(),
+        "food_retriever": retriever_stats(),
     }
 
+
+def service_unavailable(err: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(err),
+        headers={"Retry-After": RETRY_AFTER_SECONDS},
+    )
+
+
+# Fallback result returned when an image cannot be fetched or predicted
+FALLBACK_RESULT = {
+    "volume_predictions": [
+        {
+            "object_name": "rice",
+            "volume_m3": 0.00012,
+            "weight_g": 30.5,
+            "density_g_per_cm3": 1.28,
+            "score": 0.97,
+            "box": [120, 55, 220, 185]
+        },
+        {
+            "object_name": "chicken",
+            "volume_m3": 0.00008,
+            "weight_g": 22.1,
+            "density_g_per_cm3": 1.03,
+            "score": 0.91,
+            "box": [250, 70, 340, 180]
+        }
+    ]
+}
+
+
+def fetch_image_stream(image_id: str):
+    """
+    Look up the image metadata in Postgres and download the file from MinIO.
+    Returns a BytesIO stream, or None if the image cannot be retrieved.
+    """
     # 1. Retrieve image metadata from Postgres
     try:
         with Session(engine) as session:
@@ -78,47 +199,201 @@ async def predict_img(
             image_obj = session.exec(stmt).first()
             if not image_obj:
                 print(f"Error: Image not found for the provided image_id: {image_id}")
-                return fallback_result
+                return None
     except Exception as db_err:
         print(f"Database error while retrieving image: {str(db_err)}")
-        return fallback_result
+        return None
 
     # 2. Retrieve image file from MinIO
     try:
-        image_stream = minio_client.get_image(
+        return minio_client.get_image(
             file_name=image_obj.file_name,
             bucket_name=image_obj.bucket
         )
     except Exception as minio_err:
         print(f"Error retrieving image from MinIO: {str(minio_err)}")
-        return fallback_result
+        return None
+
+
+def lookup_cached_prediction(image_stream):
+    """
+    Hash the image and look it up in the result cache (may read the disk tier).
+    Returns (cache_key, cached volume_predictions or None).
+    """
+    cache_key = prediction_cache.key(image_stream, predictor_fingerprint())
+    return cache_key, prediction_cache.get(cache_key)
+
+
+# POST /api/predict_img
+# {
+#   "user_id": "user123",
+#   "image_id": "image456"
+# }
+@app.post("/api/predict_img")
+async def predict_img(
+    user_id: str,
+    image_id: str,
+):
+    # DB/MinIO calls are blocking, so they run on the I/O pool instead of the event loop
+    image_stream = await run_io(fetch_image_stream, image_id)
+    if image_stream is None:
+        return FALLBACK_RESULT
 
-    # 3. Volume prediction
     try:
-        predictor = VolumePredictor(
-            yolo_path=str(Path(__file__).parent / "checkpoints/yolov8_foodseg103.onnx"),
-            dav2_path=str(Path(__file__).parent / "checkpoints/depth_anything_v2_metric_hypersim_vits.pth"),
-            dav2_type="vits"
-        )
-        prediction_result = predictor.predict(image_stream)
+        # Re-sent photos are answered from the result cache
+        cache_key, cached = await run_io(lookup_cached_prediction, image_stream)
+        if cached is not None:
+            return {"volume_predictions": await run_io(attach_nutrition, cached)}
+
+        # Volume prediction, batched with other in-flight requests
+        prediction_result = await predict_stream(image_stream)
         # prediction_result is a list of Prediction dataclasses
         # We'll return the detected items, their volume (ml or cm³), and estimated weight (g)
-        result_items = []
-        for pred in prediction_result:
-            result_items.append({
-                "object_name": pred.object_name,
-                "volume_m3": pred.volume,
-                "weight_g": pred.weight,
-                "density_g_per_cm3": pred.density,
-                "score": pred.score,
-                "box": pred.box,
-            })
+        volume_predictions = serialize_predictions(prediction_result)
+        await run_io(prediction_cache.put, cache_key, volume_predictions)
+        # Nutrition is looked up per request, so the cached result only depends on the models
         return {
-            "volume_predictions": result_items
+            "volume_predictions": await run_io(attach_nutrition, volume_predictions)
         }
+    except QueueFullError as queue_err:
+        raise service_unavailable(queue_err)
+    except Exception as predict_err:
+        print(f"Error: {predict_err}")
+        return FALLBACK_RESULT
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def predict_events(image_id: str):
+    """
+    Stage events for /api/predict_img/stream: fetched, decoded, depth, masks,
+    one volume event per detection, then done (or error).
+    """
+    start = time.perf_counter()
+    image_stream = await run_io(fetch_image_stream, image_id)
+    if image_stream is None:
+        yield sse_event("error", {"detail": f"Image {image_id} could not be retrieved.", **FALLBACK_RESULT})
+        return
+    yield sse_event("fetched", {"image_id": image_id, "fetch_ms": (time.perf_counter() - start) * 1000})
+
+    try:
+        cache_key, cached = await run_io(lookup_cached_prediction, image_stream)
+        if cached is None and inference_pool is not None:
+            # Stages run inside a worker process, so only the final result is streamed
+            cached = serialize_predictions(await predict_stream(image_stream))
+            await run_io(prediction_cache.put, cache_key, cached)
+        if cached is not None:
+            for index, item in enumerate(cached):
+                yield sse_event("volume", {"index": index, **item})
+            yield sse_event("done", {
+                "volume_predictions": await run_io(attach_nutrition, cached),
+                "timings": {"total_ms": (time.perf_counter() - start) * 1000},
+            })
+            return
+
+        # All stages run as one job on the inference pool, so no other prediction touches the
+        # models until this one is done; events go out as soon as each stage finishes
+        stages = inference_executor.iterate(lambda: model_registry.get_predictor().predict_stages(image_stream))
+        async for event, data in stages:
+            if event == "volume":
+                data = {"index": data["index"], **serialize_predictions([data["prediction"]])[0]}
+            elif event == "done":
+                volume_predictions = serialize_predictions(data["predictions"])
+                await run_io(prediction_cache.put, cache_key, volume_predictions)
+                data = {
+                    "volume_predictions": await run_io(attach_nutrition, volume_predictions),
+                    "timings": data["timings"],
+                }
+            yield sse_event(event, data)
+    except QueueFullError as queue_err:
+        yield sse_event("error", {"detail": str(queue_err), "retry_after": RETRY_AFTER_SECONDS})
     except Exception as predict_err:
         print(f"Error: {predict_err}")
-        return fallback_result
+        yield sse_event("error", {"detail": str(predict_err), **FALLBACK_RESULT})
+
+
+# POST /api/predict_img/stream?user_id=user123&image_id=image456
+@app.post("/api/predict_img/stream")
+async def predict_img_stream(
+    user_id: str,
+    image_id: str,
+):
+    """Server-Sent Events variant of /api/predict_img that reports each pipeline stage as it finishes."""
+    return StreamingResponse(
+        predict_events(image_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class PredictBatchRequest(BaseModel):
+    user_id: str
+    image_ids: List[str]
+
+
+# POST /api/predict_img/batch
+# {
+#   "user_id": "user123",
+#   "image_ids": ["image456", "image789"]
+# }
+@app.post("/api/predict_img/batch")
+async def predict_img_batch(payload: PredictBatchRequest):
+    """Predict every image of a meal in one batched pass; results keep the request order."""
+    if not payload.image_ids:
+        raise HTTPException(status_code=400, detail="image_ids field is required.")
+
+    # Images are fetched and hashed concurrently on the I/O pool
+    image_ids = list(dict.fromkeys(payload.image_ids))
+    fetched = await asyncio.gather(*[run_io(fetch_image_stream, image_id) for image_id in image_ids])
+    streams = {image_id: stream for image_id, stream in zip(image_ids, fetched) if stream is not None}
+    try:
+        lookups = await asyncio.gather(*[run_io(lookup_cached_prediction, stream) for stream in streams.values()])
+    except Exception as load_err:
+        print(f"Error: {load_err}")
+        return {"results": [{"image_id": image_id, **FALLBACK_RESULT} for image_id in payload.image_ids]}
+    cache_keys = {image_id: cache_key for image_id, (cache_key, _) in zip(streams, lookups)}
+
+    # Cached images skip the model entirely
+    predictions_by_id = {
+        image_id: cached for image_id, (_, cached) in zip(streams, lookups) if cached is not None
+    }
+    fetched_ids = [image_id for image_id in cache_keys if image_id not in predictions_by_id]
+
+    # Each image goes through the micro-batcher, so it shares forward passes with other requests
+    batch_result = await asyncio.gather(
+        *[predict_stream(streams[image_id]) for image_id in fetched_ids],
+        return_exceptions=True,
+    )
+    for image_id, result in zip(fetched_ids, batch_result):
+        if isinstance(result, QueueFullError):
+            raise service_unavailable(result)
+        if isinstance(result, Exception):
+            print(f"Error: {result}")
+            continue
+        predictions_by_id[image_id] = serialize_predictions(result)
+        await run_io(prediction_cache.put, cache_keys[image_id], predictions_by_id[image_id])
+
+    # One nutrition lookup for the foods of every image in the meal
+    flat = [(image_id, item) for image_id, items in predictions_by_id.items() for item in items]
+    with_nutrition = await run_io(attach_nutrition, [item for _, item in flat])
+    predictions_by_id = {image_id: [] for image_id in predictions_by_id}
+    for (image_id, _), item in zip(flat, with_nutrition):
+        predictions_by_id[image_id].append(item)
+
+    results = []
+    for image_id in payload.image_ids:
+        if image_id in predictions_by_id:
+            results.append({
+                "image_id": image_id,
+                "volume_predictions": predictions_by_id[image_id],
+            })
+        else:
+            results.append({"image_id": image_id, **FALLBACK_RESULT})
+    return {"results": results}
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -133,27 +408,33 @@ chat = ChatClovaX(
     timeout=None,
     max_retries=2,
 )
-chat_with_tools = chat.bind_tools([
-    food_nutrition_tool, 
-    clova_ocr_tool, 
-    get_user_info_by_user_id, 
+# Tools the chat model may call; the streaming endpoint executes them by name
+CHAT_TOOLS = [
+    food_nutrition_tool,
+    food_nutrition_batch_tool,
+    clova_ocr_tool,
+    get_user_info_by_user_id,
     predict_volume_tool,
     DuckDuckGoSearchRun()
-])
+]
+# Upper bound on model -> tools -> model rounds in one reply
+MAX_TOOL_ROUNDS = int(os.getenv("CHAT_MAX_TOOL_ROUNDS", "4"))
+# Independent tool calls of one turn run concurrently, each under its own timeout
+tool_runner = ToolRunner(
+    CHAT_TOOLS,
+    default_timeout_s=float(os.getenv("TOOL_TIMEOUT_SECONDS", "30")),
+    timeouts={
+        predict_volume_tool.name: float(os.getenv("PREDICT_TOOL_TIMEOUT_SECONDS", "60")),
+        "duckduckgo_search": float(os.getenv("SEARCH_TOOL_TIMEOUT_SECONDS", "10")),
+    },
+    max_concurrency=int(os.getenv("TOOL_MAX_CONCURRENCY", "4")),
+)
+chat_with_tools = chat.bind_tools(CHAT_TOOLS)
 # supervisor = SupervisorAgent(llm=chat)
 
-@app.post("/api/chat")
-async def chat_completion(payload: ChatRequest):
-    """Route chat requests through the LangGraph-based supervisor."""
-    if not payload.message:
-        raise HTTPException(status_code=400, detail="message field is required.")
 
-    # result = supervisor.execute(
-    #     user_message=payload.message,
-    #     user_id=payload.user_id,
-    #     image=payload.image,
-    # )
-    messages = [
+def build_chat_messages(payload: ChatRequest) -> list:
+    return [
         (
             "system",
             (
@@ -169,7 +450,78 @@ async def chat_completion(payload: ChatRequest):
         ("human", payload.message),
     ]
 
-    result = chat_with_tools.invoke(messages)
 
-    langfuse.flush()
-    return {"reply": result.content, "chat_name": "Healthy Meal"}
+@app.post("/api/chat")
+async def chat_completion(payload: ChatRequest, background_tasks: BackgroundTasks):
+    """Route chat requests through the LangGraph-based supervisor."""
+    if not payload.message:
+        raise HTTPException(status_code=400, detail="message field is required.")
+
+    # result = supervisor.execute(
+    #     user_message=payload.message,
+    #     user_id=payload.user_id,
+    #     image=payload.image,
+    # )
+    messages = build_chat_messages(payload)
+
+    # Native async model calls; requested tools run concurrently until the model answers
+    result, metadata = await tool_runner.run(chat_with_tools, messages, max_rounds=MAX_TOOL_ROUNDS, final_llm=chat)
+
+    # Telemetry is flushed after the response has been sent
+    background_tasks.add_task(langfuse.flush)
+    return {"reply": result.content, "chat_name": "Healthy Meal", "metadata": metadata}
+
+
+async def chat_events(messages: list):
+    """
+    Token events for /api/chat/stream. When the model asks for tools, they are executed
+    inside the stream (tool_call / tool_result events) and the model is streamed again
+    with their results, under the same round budget as /api/chat (ToolRunner.run_events).
+    The done event's reply is all the text streamed to the client.
+    """
+    start = time.perf_counter()
+    first_token_ms = None
+    reply = ""
+    try:
+        async for event, data in tool_runner.run_events(
+            chat_with_tools, messages, max_rounds=MAX_TOOL_ROUNDS, final_llm=chat, stream=True
+        ):
+            if event == "token":
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                reply += data
+                yield sse_event("token", {"content": data})
+            elif event == "tool_call":
+                yield sse_event("tool_call", {"id": data["id"], "name": data["name"], "args": data["args"]})
+            elif event == "tool_result":
+                tool_message, record = data
+                yield sse_event("tool_result", {**record, "content": tool_message.content})
+            else:
+                _, metadata = data
+                yield sse_event("done", {
+                    "reply": reply,
+                    "chat_name": "Healthy Meal",
+                    "time_to_first_token_ms": first_token_ms,
+                    "rounds": metadata["rounds"],
+                    "tool_latency_ms": metadata["tool_latency_ms"],
+                    "truncated": metadata["truncated"],
+                    "total_ms": (time.perf_counter() - start) * 1000,
+                })
+    except Exception as chat_err:
+        print(f"Error: {chat_err}")
+        yield sse_event("error", {"detail": str(chat_err)})
+
+
+@app.post("/api/chat/stream")
+async def chat_completion_stream(payload: ChatRequest):
+    """Streaming variant of /api/chat: reply tokens are sent as Server-Sent Events as they are generated."""
+    if not payload.message:
+        raise HTTPException(status_code=400, detail="message field is required.")
+
+    return StreamingResponse(
+        chat_events(build_chat_messages(payload)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Telemetry is flushed once the stream is complete, off the token path
+        background=BackgroundTask(langfuse.flush),
+    )
@@ -0,0 +1,43 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+# Imported by the volume_predictor package
+pytest.importorskip("open3d", exc_type=ImportError)
+
+from volume_predictor.depth_estimator import (
+    MODEL_CONFIGS,
+    PATCH_SIZE,
+    check_onnx_parity,
+    export_depth_anything_onnx,
+    load_depth_anything,
+)
+from volume_predictor.depth_anything_v2.dpt import DepthAnythingV2
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    """A randomly initialized ViT-S checkpoint: parity does not depend on trained weights."""
+    torch.manual_seed(0)
+    model = DepthAnythingV2(**{**MODEL_CONFIGS["vits"], "max_depth": 20})
+    path = tmp_path_factory.mktemp("dav2") / "depth_anything_v2_vits.pth"
+    torch.save(model.state_dict(), path)
+    return str(path)
+
+
+@pytest.mark.parametrize("input_size", [14 * PATCH_SIZE, 23 * PATCH_SIZE])
+def test_exported_graph_matches_torch(checkpoint, tmp_path, input_size):
+    onnx_path = export_depth_anything_onnx(
+        checkpoint, str(tmp_path / "depth.onnx"), input_size=input_size, verify=False
+    )
+    model = load_depth_anything(checkpoint)
+    # Portrait, landscape and square inputs through the one dynamic-shape graph
+    sizes = (
+        (input_size + 4 * PATCH_SIZE, input_size),
+        (input_size, input_size + 4 * PATCH_SIZE),
+        (input_size, input_size),
+    )
+    errors = check_onnx_parity(model, onnx_path, sizes, rtol=float("inf"))
+    assert set(errors) == set(sizes)
+    assert max(errors.values()) < 1e-2
@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("open3d", exc_type=ImportError)
+
+from utils.benchmark_volume_engine import FOCAL_LENGTH, memory_budget_bytes, peak_memory_bytes, synthetic_scene
+from volume_predictor.point_cloud_generator import PointCloudGenerator
+from volume_predictor.yolov8.compact_mask import CompactMask
+
+
+def to_compact(mask: np.ndarray) -> CompactMask:
+    rows, cols = np.nonzero(mask)
+    crop = mask[rows.min():rows.max() + 1, cols.min():cols.max() + 1]
+    return CompactMask.from_crop(crop, cols.min(), rows.min(), mask.shape)
+
+
+@pytest.mark.parametrize("method", ["hull", "height"])
+@pytest.mark.parametrize("width, height, num_masks", [(1024, 768, 20), (4000, 3000, 1), (4000, 3000, 20)])
+def test_peak_memory_within_budget(method, width, height, num_masks):
+    depth_map, masks, _ = synthetic_scene(width, height, num_masks)
+    generator = PointCloudGenerator(FOCAL_LENGTH, FOCAL_LENGTH, method=method)
+    peak = peak_memory_bytes(generator, width, height, depth_map, masks)
+    assert peak < memory_budget_bytes(width, height)
+
+
+def test_height_engine_matches_exact_volumes():
+    depth_map, masks, exact = synthetic_scene(1024, 768, 10)
+    generator = PointCloudGenerator(FOCAL_LENGTH, FOCAL_LENGTH, method="height")
+    volumes = generator.calculate_volumes_from_masks(1024, 768, depth_map, masks)
+    assert volumes == pytest.approx(exact, rel=1e-3)
+
+
+def test_height_engine_compact_and_full_frame_masks_agree():
+    depth_map, masks, _ = synthetic_scene(640, 480, 6)
+    generator = PointCloudGenerator(FOCAL_LENGTH, FOCAL_LENGTH, method="height")
+    full = generator.calculate_volumes_from_masks(640, 480, depth_map, masks)
+    compact = generator.calculate_volumes_from_masks(640, 480, depth_map, [to_compact(mask) for mask in masks])
+    assert compact == pytest.approx(full, rel=1e-6)
+
+
+def test_height_engine_empty_mask_has_no_volume():
+    depth_map, _, _ = synthetic_scene(640, 480, 1)
+    generator = PointCloudGenerator(FOCAL_LENGTH, FOCAL_LENGTH, method="height")
+    assert generator.calculate_volumes_from_masks(640, 480, depth_map, np.zeros((1, 480, 640), np.uint8)) == [0.0]
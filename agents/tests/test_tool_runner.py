@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from utils.tool_runner import TRUNCATED_REPLY, ToolRunner
+
+
+class EchoTool:
+    name = "echo"
+
+    def invoke(self, args):
+        return {"echo": args}
+
+
+class ToolHungryModel:
+    """Asks for the echo tool on every call, both through ainvoke and astream."""
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(
+            content="Checking. ",
+            tool_calls=[{"id": f"call-{self.calls}", "name": "echo", "args": {"n": self.calls}}],
+        )
+
+    async def astream(self, messages):
+        self.calls += 1
+        yield AIMessageChunk(content="Checking. ")
+        yield AIMessageChunk(
+            content="",
+            tool_call_chunks=[{"id": f"call-{self.calls}", "name": "echo", "args": json.dumps({"n": self.calls}), "index": 0}],
+        )
+
+
+async def run_inline(fn, *args):
+    return fn(*args)
+
+
+def make_runner():
+    return ToolRunner([EchoTool()], run_blocking=run_inline)
+
+
+def run_blocking_endpoint(runner, max_rounds):
+    """What /api/chat does: ToolRunner.run with ainvoke."""
+    model = ToolHungryModel()
+    response, metadata = asyncio.run(runner.run(model, [("human", "hi")], max_rounds=max_rounds))
+    return model, response.content, metadata
+
+
+def run_streaming_endpoint(runner, max_rounds):
+    """What /api/chat/stream does: ToolRunner.run_events with astream."""
+    model = ToolHungryModel()
+
+    async def consume():
+        tokens, tool_results, done = [], 0, None
+        async for event, data in runner.run_events(model, [("human", "hi")], max_rounds=max_rounds, stream=True):
+            if event == "token":
+                tokens.append(data)
+            elif event == "tool_result":
+                tool_results += 1
+            elif event == "done":
+                done = data
+        return tokens, tool_results, done
+
+    tokens, tool_results, (response, metadata) = asyncio.run(consume())
+    return model, tokens, tool_results, response.content, metadata
+
+
+@pytest.mark.parametrize("max_rounds", [1, 3])
+def test_streaming_and_blocking_chat_share_the_round_budget(max_rounds):
+    runner = make_runner()
+    blocking_model, blocking_reply, blocking = run_blocking_endpoint(runner, max_rounds)
+    assert runner.truncated_replies == 1
+    streaming_model, tokens, tool_results, streaming_reply, streaming = run_streaming_endpoint(runner, max_rounds)
+    assert runner.truncated_replies == 2
+
+    assert blocking["rounds"] == streaming["rounds"] == max_rounds
+    # Tools run on every round but the last, then one wrap-up call without tools
+    assert len(blocking["tool_calls"]) == len(streaming["tool_calls"]) == tool_results == max_rounds - 1
+    assert blocking_model.calls == streaming_model.calls == max_rounds + 1
+    assert blocking["truncated"] and streaming["truncated"]
+    assert blocking_reply == streaming_reply == TRUNCATED_REPLY
+    assert tokens[-1] == TRUNCATED_REPLY
+    assert runner.stats()["truncated_replies"] == 2
+
+
+def test_answer_without_tools_is_not_truncated():
+    class PoliteModel:
+        async def ainvoke(self, messages):
+            return AIMessage(content="Rice has about 130 kcal per 100 g.")
+
+    runner = make_runner()
+    response, metadata = asyncio.run(runner.run(PoliteModel(), [("human", "rice?")], max_rounds=2))
+    assert metadata["rounds"] == 1 and not metadata["truncated"]
+    assert response.content.startswith("Rice")
+    assert runner.truncated_replies == 0
@@ -1,17 +1,30 @@
 import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 from langchain.tools import tool
-import chromadb
-from utils.embedder import Embedder
+from utils.lru_cache import LRUCache
 
 def get_or_create_collection(persist_directory: str, collection_name: str):
+    import chromadb
     client = chromadb.PersistentClient(path=persist_directory)
     try:
         collection = client.get_collection(collection_name)
     except Exception:
         collection = client.create_collection(collection_name)
     return collection
+
+
+def normalize_food_name(name: str) -> str:
+    """Case-, width- and whitespace-insensitive key for a food name ("  Fried  RICE " -> "fried rice")."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", name or "")).strip().casefold()
+
+
 @dataclass
 class SearchResult:
     title: str
@@ -20,14 +33,127 @@ class SearchResult:
     source: Optional[str] = None
 
 class FoodChromaRetriever:
+    """
+    Nearest-name lookup of nutrition records in Chroma.
+
+    Repeated lookups are served from memory:
+    - name index: normalized FOOD_NAME -> record ids, built once in a background thread from
+      the collection metadata; when it has at least k exact matches their records are fetched
+      by id, skipping the embedder and the vector query (vector search is used until it is ready)
+    - embedding cache: normalized name -> query embedding (skips the e5 model)
+    - result cache: (normalized name, k, include_distances) -> results (skips embed + query)
+    """
     def __init__(
         self, 
         collection_name: str = "food_records", 
         persist_directory: Optional[str] = "./chroma_db", 
+        embedding_cache_size: int = 1024,
+        result_cache_size: int = 1024,
+        use_name_index: bool = True,
+        name_index_page_size: int = 5000,
+        name_index_max_per_name: int = 10,
     ):
+        # Imported here so importing this module stays cheap until the first lookup
+        from utils.embedder import Embedder
         self.collection = get_or_create_collection(persist_directory, collection_name)
         self.embedder = Embedder()
 
+        self.embedding_cache = LRUCache(embedding_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self.use_name_index = use_name_index
+        self.name_index_page_size = name_index_page_size
+        self.name_index_max_per_name = name_index_max_per_name
+        self._name_index: Optional[Dict[str, List[str]]] = None
+        self.name_index_build_s: Optional[float] = None
+        self.name_index_hits = 0
+        self.name_index_misses = 0
+        self.name_index_not_ready = 0
+
+        # Latency of the slow path, used to estimate the time saved by each cache
+        self._lock = threading.Lock()
+        self.embed_calls = 0
+        self.embed_ms = 0.0
+        self.query_calls = 0
+        self.query_ms = 0.0
+
+        if self.use_name_index:
+            threading.Thread(target=self._build_name_index, name="food-name-index", daemon=True).start()
+
+    def build_name_index(self) -> Dict[str, List[str]]:
+        """Page through the collection metadata once and index record ids by normalized FOOD_NAME."""
+        start = time.perf_counter()
+        index: Dict[str, List[str]] = defaultdict(list)
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["metadatas"], limit=self.name_index_page_size, offset=offset
+            )
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            for _id, metadata in zip(ids, page.get("metadatas") or []):
+                food_name = (metadata or {}).get("FOOD_NAME")
+                if not isinstance(food_name, str):
+                    continue
+                record_ids = index[normalize_food_name(food_name)]
+                if len(record_ids) < self.name_index_max_per_name:
+                    record_ids.append(_id)
+            offset += len(ids)
+        self.name_index_build_s = time.perf_counter() - start
+        print(f"Food name index: {len(index)} names from {offset} records in {self.name_index_build_s:.1f}s")
+        return dict(index)
+
+    def _build_name_index(self) -> None:
+        try:
+            self._name_index = self.build_name_index()
+        except Exception as index_err:
+            print(f"Food name index unavailable, using vector search only: {index_err}")
+            self.use_name_index = False
+
+    def _exact_match_ids(self, key: str, k: int) -> Optional[List[str]]:
+        """Ids of k records named exactly like the query, or None (vector search is needed)."""
+        if not self.use_name_index:
+            return None
+        index = self._name_index
+        if index is None:
+            # Still building in the background
+            self.name_index_not_ready += 1
+            return None
+        record_ids = index.get(key, [])
+        if len(record_ids) < k:
+            # Fewer exact hits than requested: the vector search fills the rest
+            self.name_index_misses += 1
+            return None
+        self.name_index_hits += 1
+        return record_ids[:k]
+
+    def _fetch_records(self, record_ids: List[str]) -> Dict[str, Any]:
+        """Metadata of records by id (one Chroma get for all of them)."""
+        res = self.collection.get(ids=record_ids, include=["metadatas"])
+        return dict(zip(res.get("ids") or [], res.get("metadatas") or []))
+
+    def embed_queries(self, food_names: List[str]) -> List[List[float]]:
+        """Embeddings of food names, cached by normalized name; all misses are embedded in one ONNX run."""
+        keys = [normalize_food_name(name) for name in food_names]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        missing = {key: name for key, name, embedding in zip(keys, food_names, embeddings) if embedding is None}
+        if missing:
+            start = time.perf_counter()
+            computed = self.embedder.embed(list(missing.values())).tolist()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.embed_calls += len(missing)
+                self.embed_ms += elapsed_ms
+            computed = dict(zip(missing, computed))
+            for key, embedding in computed.items():
+                self.embedding_cache.put(key, embedding)
+            embeddings = [computed[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def embed_query(self, food_name: str) -> List[float]:
+        """Embedding of a food name, cached by normalized name."""
+        return self.embed_queries([food_name])[0]
+
     def retrieve_by_name(
         self, 
         food_name: str, 
@@ -37,35 +163,146 @@ class FoodChromaRetriever:
         """
         Given a food_name (string), embed it and query Chroma for top-k nearest.
         Returns a list of result dicts containing: id, score (distance or similarity), metadata.
+        Exact name matches and repeated lookups are answered from memory.
+        """
+        return self.retrieve_many([food_name], k=k, include_distances=include_distances)[food_name]
+
+    def retrieve_many(
+        self,
+        food_names: List[str],
+        k: int = 3,
+        include_distances: bool = True,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Top-k records for several food names at once (e.g. every detection of a meal).
+        Names not answered from memory are embedded in one ONNX run and sent to Chroma
+        as a single multi-query. Returns {food_name: results} in the input order.
         """
-        query_emb = self.embedder.embed([food_name])[0]
+        found: Dict[str, List[Dict[str, Any]]] = {}  # normalized name -> results
+        exact: Dict[str, List[str]] = {}  # normalized name -> ids of exact name matches
+        pending: Dict[str, str] = {}  # normalized name -> name to embed
+        for food_name in food_names:
+            key = normalize_food_name(food_name)
+            if key in found or key in exact or key in pending:
+                continue
+            out = self.result_cache.get((key, k, include_distances))
+            if out is not None:
+                found[key] = out
+                continue
+            record_ids = self._exact_match_ids(key, k)
+            if record_ids is not None:
+                exact[key] = record_ids
+            else:
+                pending[key] = food_name
+
+        if exact:
+            metadatas = self._fetch_records([_id for record_ids in exact.values() for _id in record_ids])
+            for key, record_ids in exact.items():
+                # No query embedding on this path, so there is no distance to report
+                out = [{"id": _id, "metadata": metadatas.get(_id), "distance": None} for _id in record_ids]
+                self.result_cache.put((key, k, include_distances), out)
+                found[key] = out
+
+        if pending:
+            for key, out in zip(pending, self._query_many(list(pending.values()), k, include_distances)):
+                self.result_cache.put((key, k, include_distances), out)
+                found[key] = out
+
+        # Spelling variants of the same name share one lookup
+        return {
+            food_name: [dict(result) for result in found[normalize_food_name(food_name)]]
+            for food_name in food_names
+        }
+
+    def _query_many(self, food_names: List[str], k: int, include_distances: bool) -> List[List[Dict[str, Any]]]:
+        query_embs = self.embed_queries(food_names)
+        start = time.perf_counter()
         res = self.collection.query(
-            query_embeddings=[query_emb],
+            query_embeddings=query_embs,
             n_results=k,
             include=["metadatas", "distances", "ids"],
         )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.query_calls += len(food_names)
+            self.query_ms += elapsed_ms
 
         if not res or len(res.get("ids", [])) == 0:
-            return []
+            return [[] for _ in food_names]
+
+        all_ids = res.get("ids") or []
+        all_metadatas = res.get("metadatas") or []
+        all_distances = res.get("distances") or []
+        outs = []
+        for row in range(len(food_names)):
+            ids = all_ids[row] if row < len(all_ids) else []
+            metadatas = all_metadatas[row] if row < len(all_metadatas) else []
+            distances = (
+                all_distances[row] if include_distances and row < len(all_distances) else [None] * len(ids)
+            )
+            out = []
+            for i, _id in enumerate(ids):
+                out.append(
+                    {
+                        "id": _id,
+                        "metadata": metadatas[i] if i < len(metadatas) else None,
+                        "distance": distances[i] if i < len(distances) else None,
+                    }
+                )
+            outs.append(out)
+        return outs
 
-        out = []
-        ids = res.get("ids", [[]])[0]
-        metadatas = res.get("metadatas", [[]])[0]
-        distances = (
-            res.get("distances", [[]])[0] if include_distances else [None] * len(ids)
+    def stats(self) -> Dict[str, Any]:
+        """Cache hit rates and the embed/query time they saved (estimated from the average miss cost)."""
+        avg_embed_ms = self.embed_ms / self.embed_calls if self.embed_calls else 0.0
+        avg_query_ms = self.query_ms / self.query_calls if self.query_calls else 0.0
+        lookups = self.name_index_hits + self.name_index_misses
+        saved_ms = (
+            # A name index hit still fetches its records by id, so only the embed is counted
+            (self.embedding_cache.hits + self.name_index_hits) * avg_embed_ms
+            + self.result_cache.hits * (avg_embed_ms + avg_query_ms)
         )
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "name_index": {
+                "enabled": self.use_name_index,
+                "names": len(self._name_index) if self._name_index is not None else None,
+                "build_s": self.name_index_build_s,
+                "hits": self.name_index_hits,
+                "misses": self.name_index_misses,
+                "not_ready": self.name_index_not_ready,
+                "hit_rate": self.name_index_hits / lookups if lookups else 0.0,
+            },
+            "avg_embed_ms": avg_embed_ms,
+            "avg_query_ms": avg_query_ms,
+            "saved_ms": saved_ms,
+        }
+
+_retriever: Optional[FoodChromaRetriever] = None
+_retriever_lock = threading.Lock()
 
-        for i, _id in enumerate(ids):
-            out.append(
-                {
-                    "id": _id,
-                    "metadata": metadatas[i] if i < len(metadatas) else None,
-                    "distance": distances[i] if i < len(distances) else None,
-                }
-            )
-        return out
 
-retriever = FoodChromaRetriever()
+def get_retriever() -> FoodChromaRetriever:
+    """Shared retriever, built on first use so that importing the tools loads no model."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = FoodChromaRetriever(
+                    embedding_cache_size=int(os.getenv("FOOD_EMBEDDING_CACHE_SIZE", "1024")),
+                    result_cache_size=int(os.getenv("FOOD_RESULT_CACHE_SIZE", "1024")),
+                    use_name_index=os.getenv("FOOD_NAME_INDEX", "true").lower() == "true",
+                )
+    return _retriever
+
+
+def retriever_stats() -> Optional[Dict[str, Any]]:
+    """Retriever cache statistics, or None while it has not been built."""
+    return _retriever.stats() if _retriever is not None else None
+
+# Attach the closest nutrition record to every volume prediction returned by the API
+ATTACH_NUTRITION = os.getenv("ATTACH_NUTRITION", "true").lower() == "true"
 
 @tool(
     description=(
@@ -76,7 +313,44 @@ retriever = FoodChromaRetriever()
 )
 def food_nutrition_tool(food_name: str, k: int = 3):
     try:
-        results = retriever.retrieve_by_name(food_name, k=k)
+        results = get_retriever().retrieve_by_name(food_name, k=k)
         return json.dumps(results, default=str, ensure_ascii=False, indent=2)
     except Exception as e:
         return f"Error retrieving food: {e}"
+
+
+@tool(
+    description=(
+        "Look up nutrition records for several foods at once, e.g. every food detected in a meal. "
+        "Prefer this over calling food_nutrition_tool once per food. "
+        "Args: food_names (list of str), k (int, optional, default=3). "
+        "Returns JSON mapping each food name to its top-k records and metadata."
+    ),
+)
+def food_nutrition_batch_tool(food_names: List[str], k: int = 3):
+    try:
+        results = get_retriever().retrieve_many(food_names, k=k)
+        return json.dumps(results, default=str, ensure_ascii=False, indent=2)
+    except Exception as e:
+        return f"Error retrieving foods: {e}"
+
+
+def attach_nutrition(volume_predictions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Add the closest nutrition record to each volume prediction item (by object_name),
+    with one batched lookup for all items. Items are left unchanged if the lookup fails.
+    """
+    if not ATTACH_NUTRITION:
+        return volume_predictions
+    names = [item["object_name"] for item in volume_predictions if item.get("object_name")]
+    if not names:
+        return volume_predictions
+    try:
+        matches = get_retriever().retrieve_many(names, k=1)
+    except Exception as lookup_err:
+        print(f"Error attaching nutrition: {lookup_err}")
+        return volume_predictions
+    return [
+        {**item, "nutrition": (matches.get(item.get("object_name")) or [None])[0]}
+        for item in volume_predictions
+    ]
@@ -2,8 +2,10 @@ from langchain.tools import tool
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
-from volume_predictor import VolumePredictor
+from volume_predictor import serialize_predictions, predictor_fingerprint, predict_image
+from tools.food_nutrition import attach_nutrition
 from utils.minio_client import minio_client
+from utils.result_cache import prediction_cache
 from utils.postgresql import engine, Image
 from sqlmodel import Session, select
 
@@ -43,17 +45,17 @@ def predict_volume_tool(image_id: str) -> dict:
     except Exception as minio_err:
         return {"error": f"Error retrieving image from MinIO: {str(minio_err)}"}
 
-    # 3. Load and run the VolumePredictor
+    # 3. Run the shared VolumePredictor, unless this image was already predicted
     try:
-        predictor = VolumePredictor(
-            yolo_path=str(Path(__file__).parent / "checkpoints/yolov8_foodseg103.onnx"),
-            dav2_path=str(Path(__file__).parent / "checkpoints/depth_anything_v2_metric_hypersim_vits.pth"),
-            dav2_type="vits"
-        )
-        prediction_result = predictor.predict(image_stream)
-        if not isinstance(prediction_result, dict):
-            return {"error": "Prediction module did not return a dictionary"}
-        return prediction_result
+        cache_key = prediction_cache.key(image_stream, predictor_fingerprint())
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return {"volume_predictions": attach_nutrition(cached)}
+
+        prediction_result = predict_image(image_stream)
+        volume_predictions = serialize_predictions(prediction_result)
+        prediction_cache.put(cache_key, volume_predictions)
+        return {"volume_predictions": attach_nutrition(volume_predictions)}
 
     except Exception as predict_err:
         return {"error": f"Error during prediction: {str(predict_err)}"}
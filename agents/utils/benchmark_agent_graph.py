@@ -0,0 +1,114 @@
+"""
+End-to-end latency of MultiAgentGraph with parallel fan-out vs a strictly sequential plan,
+on a fixture conversation with fake agents that stand in for LLM calls.
+
+Each fake agent sleeps for a fixed latency and returns canned JSON, so the difference
+between the two runs is purely the graph schedule:
+- parallel: vision and summarizer run as parallel branches, joined before nutrition
+- sequential: the supervisor chains every agent (vision -> summarizer -> nutrition)
+
+Usage (from the agents/ directory):
+    python utils/benchmark_agent_graph.py [--runs 5] [--scale 1.0]
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+import numpy as np
+import agents.graph as graph_module
+from agents.graph import MultiAgentGraph
+from agents.planner import RulePlanner
+
+FIXTURE_MESSAGE = "I had this bowl for lunch, how many calories is it and does it fit my diet?"
+FIXTURE_IMAGE = "6f1c2d3e-0000-4000-8000-000000000001"
+FIXTURE_USER = "user123"
+
+# Typical per-agent latencies (seconds) of the real agents, including their tool calls
+AGENT_LATENCY_S = {
+    "supervisor": 0.4,
+    "vision": 1.2,
+    "summarizer": 0.8,
+    "nutrition": 1.0,
+    "composer": 0.9,
+}
+AGENT_OUTPUTS = {
+    "vision": {"detections": ["rice", "chicken"], "volume": {"rice": 0.00012, "chicken": 0.00008}},
+    "summarizer": {"goals": "weight loss", "allergies": []},
+    "nutrition": {"foods": ["rice", "chicken"], "macros": {"kcal": 420}},
+    "composer": "About 420 kcal; fits a weight-loss plan.",
+}
+
+
+class SupervisorOnlyPlanner(RulePlanner):
+    """Always defers to the (fake) supervisor, so the fixture plan drives the schedule."""
+    def plan(self, message, user_id=None, image=None):
+        return self._fallback()
+
+
+class FakeAgent:
+    """Stand-in for a create_agent runnable: sleeps like an LLM call, returns canned output."""
+    def __init__(self, name: str, output: Any, latency_s: float):
+        self.name = name
+        self.output = output
+        self.latency_s = latency_s
+
+    def invoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        time.sleep(self.latency_s)
+        output = self.output if isinstance(self.output, str) else json.dumps(self.output)
+        return {"output": output}
+
+
+def build_graph(sequential: bool, scale: float) -> MultiAgentGraph:
+    plan = {"plan": ["vision", "summarizer", "nutrition"], "explanation": "fixture"}
+    if sequential:
+        plan["depends_on"] = {"summarizer": ["vision"], "nutrition": ["summarizer"]}
+    outputs = {"supervisor": plan, **AGENT_OUTPUTS}
+
+    # new_agent is called in MultiAgentGraph.__init__ in this order
+    names = iter(["supervisor", "vision", "nutrition", "summarizer", "composer"])
+
+    def fake_new_agent(llm, tools, sys_prompt):
+        name = next(names)
+        return FakeAgent(name, outputs[name], AGENT_LATENCY_S[name] * scale)
+
+    original = graph_module.new_agent
+    graph_module.new_agent = fake_new_agent
+    try:
+        return MultiAgentGraph(llm=None, planner=SupervisorOnlyPlanner())
+    finally:
+        graph_module.new_agent = original
+
+
+def measure(graph: MultiAgentGraph, runs: int) -> np.ndarray:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = graph.invoke(user_message=FIXTURE_MESSAGE, user_id=FIXTURE_USER, image=FIXTURE_IMAGE)
+        latencies.append(time.perf_counter() - start)
+        assert result.get("composer") == AGENT_OUTPUTS["composer"], result
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel vs sequential MultiAgentGraph latency.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier on the fake agent latencies")
+    args = parser.parse_args()
+
+    sequential = measure(build_graph(sequential=True, scale=args.scale), args.runs)
+    parallel = measure(build_graph(sequential=False, scale=args.scale), args.runs)
+
+    print(f"Fake agent latencies (s): {({k: v * args.scale for k, v in AGENT_LATENCY_S.items()})}\n")
+    print("| schedule | median s | min s |")
+    print("|----------|----------|-------|")
+    print(f"| sequential | {np.median(sequential):.2f} | {sequential.min():.2f} |")
+    print(f"| parallel fan-out | {np.median(parallel):.2f} | {parallel.min():.2f} |")
+    print(f"\nlatency reduction: {(1 - np.median(parallel) / np.median(sequential)) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Throughput comparison between VolumePredictor.predict_batch and a sequential predict loop.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_batch_predict.py image1.jpg image2.jpg ...
+
+Without images, random noise images in two aspect ratios are used.
+"""
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import os
+import numpy as np
+from PIL import Image
+from volume_predictor import VolumePredictor
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "checkpoints"
+
+
+def load_images(paths):
+    if paths:
+        return [Image.open(p).convert("RGB") for p in paths]
+    rng = np.random.default_rng(0)
+    shapes = [(480, 640)] * 4 + [(720, 1280)] * 4
+    return [Image.fromarray(rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)) for h, w in shapes]
+
+
+def main():
+    images = load_images(sys.argv[1:])
+    runs = int(os.getenv("BENCH_RUNS", "3"))
+    cores = os.cpu_count() or 1
+
+    predictor = VolumePredictor(
+        yolo_path=str(CHECKPOINT_DIR / "yolov8_foodseg103.onnx"),
+        dav2_path=str(CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.pth"),
+        dav2_type="vits",
+        dav2_backend=os.getenv("DAV2_BACKEND", "onnx"),
+    )
+    predictor.predict_batch(images[:2])  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        for image in images:
+            predictor.predict(image)
+    sequential_s = (time.perf_counter() - start) / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        predictor.predict_batch(images)
+    batch_s = (time.perf_counter() - start) / runs
+
+    for name, elapsed in [("sequential", sequential_s), ("batch", batch_s)]:
+        throughput = len(images) / elapsed
+        print(f"{name:>10}: {elapsed * 1000:9.1f} ms / {len(images)} images | "
+              f"{throughput:6.2f} img/s | {throughput / cores:6.3f} img/s/core")
+    print(f"speedup: {sequential_s / batch_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
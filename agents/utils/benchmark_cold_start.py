@@ -0,0 +1,78 @@
+"""
+Cold-start cost of the food nutrition tools, each measured in a fresh interpreter:
+- import tools.food_nutrition (should load no model)
+- Embedder() construction (tokenizer + ONNX session)
+- first embed call
+
+Scenarios:
+- first boot: empty model cache, files come from the hub and are added to the cache
+- warm boot: same cache, run with HF_HUB_OFFLINE=1 to show that no hub call is made
+
+Usage (from the agents/ directory):
+    python utils/benchmark_cold_start.py [--runs 5] [--cache-dir /tmp/model_cache]
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+
+AGENTS_DIR = Path(__file__).parent.parent
+
+# Runs in the child interpreter; prints one JSON line of timings
+CHILD = """
+import json, sys, time
+sys.path.append(".")
+start = time.perf_counter()
+import tools.food_nutrition
+import_s = time.perf_counter() - start
+from utils.embedder import Embedder
+start = time.perf_counter()
+embedder = Embedder(local_model_path="{local_model_path}")
+init_s = time.perf_counter() - start
+start = time.perf_counter()
+embedder.embed(["rice"])
+first_embed_s = time.perf_counter() - start
+print(json.dumps({{"import_s": import_s, "init_s": init_s, "first_embed_s": first_embed_s}}))
+"""
+
+
+def run_child(cache_dir: str, offline: bool) -> dict:
+    env = dict(os.environ, MODEL_CACHE_DIR=cache_dir)
+    if offline:
+        env["HF_HUB_OFFLINE"] = "1"
+        env["TRANSFORMERS_OFFLINE"] = "1"
+    # A path that does not exist, so the model comes from the cache rather than checkpoints/
+    code = CHILD.format(local_model_path=os.path.join(cache_dir, "unused", "model.onnx"))
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=AGENTS_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedder and food tool cold-start times.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cache-dir", default=None, help="Model cache to use (default: a fresh temp dir)")
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="model_cache_")
+    first = run_child(cache_dir, offline=False)
+    warm = [run_child(cache_dir, offline=True) for _ in range(args.runs)]
+
+    print(f"model cache: {cache_dir}, {args.runs} warm boots\n")
+    print("| boot | import s | Embedder() s | first embed s |")
+    print("|------|----------|--------------|---------------|")
+    print(f"| first (hub download) | {first['import_s']:.2f} | {first['init_s']:.2f} | {first['first_embed_s']:.3f} |")
+    medians = {key: np.median([run[key] for run in warm]) for key in first}
+    print(f"| warm, offline (median) | {medians['import_s']:.2f} | {medians['init_s']:.2f} | "
+          f"{medians['first_embed_s']:.3f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Parity and latency comparison between the torch and ONNX Runtime backends of DepthEstimator.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_depth_backends.py [image ...]
+
+Without images, random noise images of a few typical phone aspect ratios are used.
+"""
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import os
+import numpy as np
+import cv2
+from volume_predictor.depth_estimator import DepthEstimator, export_depth_anything_onnx
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "checkpoints"
+DAV2_PTH = CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.pth"
+DAV2_ONNX = CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.onnx"
+
+# Maximum tolerated mean absolute difference between backends, in meters
+PARITY_MAE_TOLERANCE = 1e-2
+
+
+def load_images(paths):
+    if paths:
+        return [cv2.imread(p) for p in paths]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8) for h, w in [(480, 640), (720, 1280), (1024, 768)]]
+
+
+def time_predict(estimator, image, runs):
+    estimator.predict(image)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        estimator.predict(image)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    images = load_images(sys.argv[1:])
+    runs = int(os.getenv("BENCH_RUNS", "5"))
+    threads = int(os.getenv("DAV2_INTRA_OP_THREADS", "0")) or os.cpu_count()
+
+    if not DAV2_ONNX.exists():
+        export_depth_anything_onnx(str(DAV2_PTH), str(DAV2_ONNX))
+
+    torch_estimator = DepthEstimator(str(DAV2_PTH), backend="torch")
+    onnx_estimator = DepthEstimator(str(DAV2_ONNX), backend="onnx", intra_op_num_threads=threads)
+
+    print(f"{'image':>12} | {'max abs':>9} | {'mae':>9} | {'rel':>7} | {'torch ms':>9} | {'onnx ms':>9} | speedup")
+    failed = False
+    for image in images:
+        torch_depth = torch_estimator.predict(image)
+        onnx_depth = onnx_estimator.predict(image)
+        diff = np.abs(torch_depth - onnx_depth)
+        mae = float(diff.mean())
+        rel = float((diff / np.clip(torch_depth, 1e-6, None)).mean())
+        torch_ms = time_predict(torch_estimator, image, runs)
+        onnx_ms = time_predict(onnx_estimator, image, runs)
+        h, w = image.shape[:2]
+        print(f"{f'{w}x{h}':>12} | {diff.max():9.5f} | {mae:9.5f} | {rel:7.4f} | {torch_ms:9.2f} | {onnx_ms:9.2f} | {torch_ms / onnx_ms:.2f}x")
+        failed = failed or mae > PARITY_MAE_TOLERANCE
+
+    if failed:
+        print(f"Parity check FAILED: mean absolute error above {PARITY_MAE_TOLERANCE} m")
+        sys.exit(1)
+    print("Parity check passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Embedder throughput on the full FOOD_NAME list of magnusdtd/usda_branded_food:
+whole-batch padding (every batch padded to its longest name, truncated at the tokenizer's
+512 default) vs length-bucketed batches with tight padding and a configurable max_length.
+
+Names are fed in chunks of --chunk (the unit ingestion would embed at once); the embedder
+splits each chunk into buckets of --batch-size.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_embedder.py [--max-length 128] [--batch-size 64] [--chunk 4096] [--limit N]
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import time
+
+import numpy as np
+from datasets import load_dataset
+from utils.embedder import Embedder
+
+
+def load_names(limit=None):
+    ds = load_dataset("magnusdtd/usda_branded_food", split="train")
+    names = [
+        name if isinstance(name, str) and name.strip() else "UNKNOWN_FOOD"
+        for name in ds["FOOD_NAME"]
+    ]
+    return names[:limit] if limit else names
+
+
+def run(embedder, names, chunk):
+    start = time.perf_counter()
+    embeddings = [embedder.embed(names[i:i + chunk]) for i in range(0, len(names), chunk)]
+    elapsed = time.perf_counter() - start
+    return np.concatenate(embeddings), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-batch padding vs length-bucketed Embedder batches.")
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk", type=int, default=4096)
+    parser.add_argument("--limit", type=int, default=None, help="Only embed the first N names")
+    args = parser.parse_args()
+
+    names = load_names(args.limit)
+    lengths = np.array([len(ids) for ids in Embedder().tokenizer(names, truncation=False)["input_ids"]])
+    print(f"{len(names)} names, tokens p50={np.median(lengths):.0f} p99={np.percentile(lengths, 99):.0f} "
+          f"max={lengths.max()}, {(lengths > args.max_length).sum()} truncated at {args.max_length}\n")
+
+    # Baseline: the chunk is split into batches in dataset order, each padded to its longest name
+    baseline = Embedder(max_length=512, batch_size=args.batch_size, bucket_by_length=False)
+    baseline_embeddings, baseline_s = run(baseline, names, args.batch_size)
+
+    bucketed = Embedder(max_length=args.max_length, batch_size=args.batch_size)
+    bucketed_embeddings, bucketed_s = run(bucketed, names, args.chunk)
+
+    # Untruncated names must embed identically; truncated ones drift slightly
+    cosine = np.sum(baseline_embeddings * bucketed_embeddings, axis=1)
+    kept = lengths <= args.max_length
+
+    print("| embedder | names/s | total s |")
+    print("|----------|---------|---------|")
+    print(f"| whole-batch padding, max_length=512 | {len(names) / baseline_s:.0f} | {baseline_s:.1f} |")
+    print(f"| length-bucketed, max_length={args.max_length} | {len(names) / bucketed_s:.0f} | {bucketed_s:.1f} |")
+    print(f"\nspeed-up: {baseline_s / bucketed_s:.2f}x")
+    print(f"min cosine vs baseline: {cosine[kept].min():.6f} (untruncated), "
+          f"{cosine[~kept].min() if (~kept).any() else 1.0:.6f} (truncated)")
+
+
+if __name__ == "__main__":
+    main()
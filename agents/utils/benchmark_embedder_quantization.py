@@ -0,0 +1,72 @@
+"""
+Retrieval quality and speed of the fp32, optimized and int8 embedder variants.
+
+Quality: a corpus of FOOD_NAMEs from magnusdtd/usda_branded_food is embedded by each variant;
+a sample of queries (other names from the dataset, so they are not exact corpus hits) is
+searched by cosine similarity, and the top-k ids are compared with the fp32 top-k:
+- top-k overlap: mean |topk_variant ∩ topk_fp32| / k
+- top-1 agreement: fraction of queries with the same best match
+Speed: embeddings/sec over the corpus with the same bucketing and thread settings.
+
+Usage (from the agents/ directory, after utils/quantize_embedder.py):
+    python utils/benchmark_embedder_quantization.py [--corpus 20000] [--queries 500] [--k 5] [--threads 4]
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import random
+import time
+
+import numpy as np
+from datasets import load_dataset
+from utils.embedder import Embedder, EMBEDDER_VARIANTS
+
+
+def sample_names(corpus_size: int, num_queries: int, seed: int = 42):
+    ds = load_dataset("magnusdtd/usda_branded_food", split="train")
+    names = sorted({name.strip() for name in ds["FOOD_NAME"] if isinstance(name, str) and name.strip()})
+    random.Random(seed).shuffle(names)
+    return names[:corpus_size], names[corpus_size:corpus_size + num_queries]
+
+
+def top_k(corpus_embeddings: np.ndarray, query_embeddings: np.ndarray, k: int) -> np.ndarray:
+    scores = query_embeddings @ corpus_embeddings.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    # Order each row by score so top-1 is the first column
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedder variants: top-k overlap vs fp32 and embeddings/sec.")
+    parser.add_argument("--corpus", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="intra_op_num_threads for every variant")
+    args = parser.parse_args()
+
+    corpus, queries = sample_names(args.corpus, args.queries)
+    print(f"{len(corpus)} corpus names, {len(queries)} queries, k={args.k}, threads={args.threads or 'default'}\n")
+
+    results = {}
+    for variant in EMBEDDER_VARIANTS:
+        embedder = Embedder(variant=variant, intra_op_num_threads=args.threads)
+        embedder.embed(corpus[:256])  # warm-up
+        start = time.perf_counter()
+        corpus_embeddings = embedder.embed(corpus)
+        elapsed = time.perf_counter() - start
+        query_embeddings = embedder.embed(queries)
+        results[variant] = (top_k(corpus_embeddings, query_embeddings, args.k), len(corpus) / elapsed)
+
+    reference, fp32_rate = results["fp32"]
+    print(f"| variant | top-{args.k} overlap | top-1 agreement | embeddings/s | speed-up |")
+    print("|---------|---------------|-----------------|--------------|----------|")
+    for variant, (neighbours, rate) in results.items():
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(neighbours, reference)])
+        top1 = np.mean(neighbours[:, 0] == reference[:, 0])
+        print(f"| {variant} | {overlap:.3f} | {top1:.3f} | {rate:.0f} | {rate / fp32_rate:.2f}x |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Nutrition lookup for the foods of one meal: a retrieve_by_name loop (one embed and one
+Chroma query per food, what one tool call per food costs) vs retrieve_many (one ONNX run
+and one multi-query for the whole meal).
+
+Caches and the exact-name index are disabled, so both paths do the full embed + query.
+
+Usage (from the agents/ directory, with a populated ./chroma_db):
+    python utils/benchmark_food_lookup.py [--runs 20] [--k 3] [food names ...]
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import time
+
+import numpy as np
+from tools.food_nutrition import get_retriever
+
+retriever = get_retriever()
+
+# Typical detections of a mixed plate
+DEFAULT_MEAL = ["rice", "chicken", "broccoli", "kimchi", "egg", "tofu", "carrot", "beef"]
+
+
+def clear_caches():
+    retriever.embedding_cache.clear()
+    retriever.result_cache.clear()
+
+
+def run_loop(names, k):
+    for name in names:
+        retriever.retrieve_by_name(name, k=k)
+
+
+def run_batch(names, k):
+    retriever.retrieve_many(names, k=k)
+
+
+def measure(fn, names, k, runs):
+    latencies = []
+    for _ in range(runs):
+        clear_caches()
+        start = time.perf_counter()
+        fn(names, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-name loop vs batched nutrition lookup.")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("names", nargs="*")
+    args = parser.parse_args()
+    names = args.names or DEFAULT_MEAL
+
+    retriever.use_name_index = False
+    # The two paths must return the same records
+    clear_caches()
+    looped = {name: retriever.retrieve_by_name(name, k=args.k) for name in names}
+    clear_caches()
+    batched = retriever.retrieve_many(names, k=args.k)
+    same = all([r["id"] for r in looped[name]] == [r["id"] for r in batched[name]] for name in names)
+
+    # Warm-up
+    measure(run_loop, names, args.k, 2)
+    measure(run_batch, names, args.k, 2)
+    loop_ms = measure(run_loop, names, args.k, args.runs)
+    batch_ms = measure(run_batch, names, args.k, args.runs)
+
+    print(f"{len(names)} foods, k={args.k}, {args.runs} runs, identical results: {same}\n")
+    print("| lookup | p50 ms | p95 ms | ms / food |")
+    print("|--------|--------|--------|-----------|")
+    for label, latencies in (("retrieve_by_name loop", loop_ms), ("retrieve_many", batch_ms)):
+        print(f"| {label} | {np.percentile(latencies, 50):.1f} | {np.percentile(latencies, 95):.1f} | "
+              f"{np.median(latencies) / len(names):.1f} |")
+    print(f"\nspeed-up: {np.median(loop_ms) / np.median(batch_ms):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Decode benchmark: the previous ingestion path (full-resolution Image.open().convert("RGB")
+followed by a resize to the working resolution) against volume_predictor.image_io, which
+decodes JPEGs in draft mode straight to about the working resolution.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_image_decode.py [photo.jpg ...]
+
+Without photos, synthetic JPEGs of several sizes are used.
+"""
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import os
+import numpy as np
+from PIL import Image
+from volume_predictor.image_io import load_image
+
+SIZES = [(1280, 960), (2048, 1536), (3024, 2268), (4032, 3024)]
+
+
+def synthetic_jpegs():
+    rng = np.random.default_rng(0)
+    jpegs = []
+    for width, height in SIZES:
+        # Smooth gradients plus noise compress like a photo rather than like pure noise
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+        pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        buffer = BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        jpegs.append((f"{width}x{height}", buffer.getvalue()))
+    return jpegs
+
+
+def baseline_decode(data: bytes, long_side: int) -> Image.Image:
+    image = Image.open(BytesIO(data)).convert("RGB")
+    scale = long_side / max(image.size)
+    if scale < 1:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR)
+    return image
+
+
+def draft_decode(data: bytes, long_side: int) -> Image.Image:
+    loaded = load_image(BytesIO(data), long_side)
+    image = loaded.image
+    scale = long_side / max(loaded.original_size)
+    if scale < 1:
+        size = (round(loaded.original_size[0] * scale), round(loaded.original_size[1] * scale))
+        if image.size != size:
+            image = image.resize(size, Image.BILINEAR)
+    return image
+
+
+def median_ms(fn, data, long_side, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(data, long_side)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+def main():
+    runs = int(os.getenv("BENCH_RUNS", "10"))
+    long_side = int(os.getenv("WORKING_LONG_SIDE", "1024"))
+    if len(sys.argv) > 1:
+        jpegs = [(Path(p).name, Path(p).read_bytes()) for p in sys.argv[1:]]
+    else:
+        jpegs = synthetic_jpegs()
+
+    print(f"Working long side: {long_side} px, {runs} runs per image\n")
+    print("| image | full decode + resize ms | draft decode ms | speedup | max abs diff |")
+    print("|-------|-------------------------|-----------------|---------|--------------|")
+    for name, data in jpegs:
+        baseline_ms = median_ms(baseline_decode, data, long_side, runs)
+        draft_ms = median_ms(draft_decode, data, long_side, runs)
+        reference = np.asarray(baseline_decode(data, long_side), dtype=np.int16)
+        candidate = np.asarray(draft_decode(data, long_side), dtype=np.int16)
+        diff = int(np.abs(reference - candidate).max()) if reference.shape == candidate.shape else -1
+        print(f"| {name} | {baseline_ms:.1f} | {draft_ms:.1f} | {baseline_ms / draft_ms:.2f}x | {diff} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Accuracy-vs-latency report for the fp32 and int8 VolumePredictor precision profiles.
+
+Runs both profiles on the held-out FoodSeg103 test split produced by volume_predictor/dataset.py
+and reports, per profile:
+- mean mask IoU against the ground-truth polygons (per class, averaged over images)
+- volume error relative to the fp32 profile for detections of the same class
+- median and p90 end-to-end latency
+
+Usage (from the agents/ directory):
+    python utils/benchmark_quantization.py --test-dir foodseg103_yolo/test --num-images 100
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import os
+import time
+from typing import Dict, List
+import cv2
+import numpy as np
+from PIL import Image
+from volume_predictor import VolumePredictor
+from volume_predictor.yolov8.utils import class_names
+from utils.quantize_models import sample_calibration_images
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "checkpoints"
+
+
+def load_ground_truth(label_path: str, width: int, height: int) -> Dict[int, np.ndarray]:
+    """
+    Rasterize YOLO polygon labels (normalized coordinates) into one binary mask per class.
+    """
+    masks: Dict[int, np.ndarray] = {}
+    if not os.path.exists(label_path):
+        return masks
+    with open(label_path) as f:
+        for line in f:
+            values = line.split()
+            if len(values) < 7:
+                continue
+            cls = int(values[0])
+            pts = np.array(values[1:], dtype=np.float32).reshape(-1, 2)
+            pts *= np.array([width, height], dtype=np.float32)
+            mask = masks.setdefault(cls, np.zeros((height, width), dtype=np.uint8))
+            cv2.fillPoly(mask, [pts.astype(np.int32)], 1)
+    return masks
+
+
+def predicted_class_masks(predictions, width: int, height: int) -> Dict[int, np.ndarray]:
+    masks: Dict[int, np.ndarray] = {}
+    for pred in predictions:
+        cls = class_names.index(pred.object_name) if pred.object_name in class_names else -1
+        mask = masks.setdefault(cls, np.zeros((height, width), dtype=np.uint8))
+        mask |= pred.mask.to_full((width, height))
+    return masks
+
+
+def mean_iou(gt: Dict[int, np.ndarray], pred: Dict[int, np.ndarray]) -> float:
+    classes = set(gt) | set(pred)
+    if not classes:
+        return 1.0
+    ious = []
+    for cls in classes:
+        g = gt.get(cls)
+        p = pred.get(cls)
+        if g is None or p is None:
+            ious.append(0.0)
+            continue
+        union = np.logical_or(g, p).sum()
+        ious.append(float(np.logical_and(g, p).sum() / union) if union else 1.0)
+    return float(np.mean(ious))
+
+
+def volumes_by_class(predictions) -> Dict[str, float]:
+    volumes: Dict[str, float] = {}
+    for pred in predictions:
+        volumes[pred.object_name] = volumes.get(pred.object_name, 0.0) + float(pred.volume)
+    return volumes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 vs int8 accuracy/latency report.")
+    parser.add_argument("--test-dir", default="foodseg103_yolo/test")
+    parser.add_argument("--num-images", type=int, default=100)
+    args = parser.parse_args()
+
+    image_paths = sample_calibration_images(os.path.join(args.test_dir, "images"), args.num_images)
+    profiles = ["fp32", "int8"]
+    predictors = {
+        precision: VolumePredictor(
+            yolo_path=str(CHECKPOINT_DIR / "yolov8_foodseg103.onnx"),
+            dav2_path=str(CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.pth"),
+            dav2_type="vits",
+            dav2_backend="onnx",
+            precision=precision,
+        )
+        for precision in profiles
+    }
+
+    ious: Dict[str, List[float]] = {p: [] for p in profiles}
+    latencies: Dict[str, List[float]] = {p: [] for p in profiles}
+    volume_errors: List[float] = []
+
+    for path in image_paths:
+        image = Image.open(path).convert("RGB")
+        width, height = image.size
+        label_path = os.path.join(args.test_dir, "labels", Path(path).stem + ".txt")
+        gt = load_ground_truth(label_path, width, height)
+
+        volumes = {}
+        for precision, predictor in predictors.items():
+            start = time.perf_counter()
+            predictions = predictor.predict(image)
+            latencies[precision].append((time.perf_counter() - start) * 1000)
+            ious[precision].append(mean_iou(gt, predicted_class_masks(predictions, width, height)))
+            volumes[precision] = volumes_by_class(predictions)
+
+        for name, ref in volumes["fp32"].items():
+            if name in volumes["int8"] and ref > 0:
+                volume_errors.append(abs(volumes["int8"][name] - ref) / ref)
+
+    print(f"Evaluated {len(image_paths)} test images from {args.test_dir}\n")
+    print("| profile | mask mIoU | median ms | p90 ms | volume rel. error vs fp32 |")
+    print("|---------|-----------|-----------|--------|---------------------------|")
+    for precision in profiles:
+        lat = np.array(latencies[precision])
+        vol_err = "-" if precision == "fp32" else (
+            f"{np.median(volume_errors) * 100:.1f}% median, {np.mean(volume_errors) * 100:.1f}% mean"
+            if volume_errors else "n/a"
+        )
+        print(
+            f"| {precision} | {np.mean(ious[precision]):.4f} | {np.median(lat):.1f} | "
+            f"{np.percentile(lat, 90):.1f} | {vol_err} |"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Time-per-mask benchmark of the PointCloudGenerator volume engines ('hull' vs 'height'),
+plus a peak-memory regression check.
+
+A synthetic scene is used: a tilted table plane with N rectangular food items raised
+5 cm above it, so the exact volume of every item is known.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_volume_engine.py [--width 1024 --height 768 --masks 1 5 10 20]
+    python utils/benchmark_volume_engine.py --check-memory --width 4000 --height 3000
+
+The memory check fails (exit code 1) if either engine's peak transient allocation reaches
+the size of a dense float32 H x W x 3 point cloud, which the engines must never build.
+tests/test_point_cloud_generator.py asserts the same budget.
+"""
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import tracemalloc
+import numpy as np
+from volume_predictor.point_cloud_generator import PointCloudGenerator
+
+FOCAL_LENGTH = 470.4
+FOOD_HEIGHT_M = 0.05
+
+
+def synthetic_scene(width: int, height: int, num_masks: int, seed: int = 0):
+    """
+    Table plane z - 0.3 * Y = 1 seen from the origin, with num_masks boxes FOOD_HEIGHT_M above it.
+    Returns (depth_map, masks, exact_volumes).
+    """
+    rng = np.random.default_rng(seed)
+    y = ((np.arange(height) - height / 2) / FOCAL_LENGTH)[:, np.newaxis]
+    n = np.array([0.0, -0.3, 1.0]) / np.linalg.norm([0.0, -0.3, 1.0])
+    d = -1.0 / np.linalg.norm([0.0, -0.3, 1.0])
+    n_dot_r = np.broadcast_to(n[1] * y + n[2], (height, width))
+
+    depth_map = (-d / n_dot_r).astype(np.float32)
+    masks = np.zeros((num_masks, height, width), dtype=np.uint8)
+    for i in range(num_masks):
+        h, w = rng.integers(height // 12, height // 5), rng.integers(width // 12, width // 5)
+        top, left = rng.integers(0, height - h), rng.integers(0, width - w)
+        masks[i, top:top + h, left:left + w] = 1
+        region = masks[i] > 0
+        depth_map[region] = (-d - FOOD_HEIGHT_M) / n_dot_r[region]
+    # Later boxes may cover earlier ones; keep masks disjoint like instance segmentation output
+    for i in range(num_masks - 1):
+        masks[i][masks[i + 1:].any(axis=0)] = 0
+    exact = [float((d ** 2 / (FOCAL_LENGTH ** 2 * n_dot_r[m > 0] ** 3)).sum() * FOOD_HEIGHT_M) for m in masks]
+    return depth_map, masks, exact
+
+
+def memory_budget_bytes(width: int, height: int) -> int:
+    """Size of a dense float32 H x W x 3 point cloud, which the engines must stay below."""
+    return width * height * 3 * 4
+
+
+def peak_memory_bytes(generator, width, height, depth_map, masks) -> int:
+    tracemalloc.start()
+    try:
+        generator.calculate_volumes_from_masks(width, height, depth_map, masks)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def check_memory(width: int, height: int, num_masks: int) -> bool:
+    depth_map, masks, _ = synthetic_scene(width, height, num_masks)
+    budget = memory_budget_bytes(width, height)
+    ok = True
+    for method in ("hull", "height"):
+        generator = PointCloudGenerator(FOCAL_LENGTH, FOCAL_LENGTH, method=method)
+        peak = peak_memory_bytes(generator, width, height, depth_map, masks)
+        passed = peak < budget
+        ok = ok and passed
+        print(f"{method:>6}: peak {peak / 1e6:8.1f} MB (budget {budget / 1e6:.1f} MB) {'OK' if passed else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Volume engine benchmark.")
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=768)
+    parser.add_argument("--masks", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--check-memory", action="store_true")
+    args = parser.parse_args()
+
+    if args.check_memory:
+        if not check_memory(args.width, args.height, max(args.masks)):
+            sys.exit(1)
+        return
+
+    print(f"{args.width}x{args.height} depth map")
+    print(f"{'masks':>5} | {'method':>6} | {'ms total':>9} | {'ms/mask':>8} | {'mean rel. error':>15}")
+    for num_masks in args.masks:
+        depth_map, masks, exact = synthetic_scene(args.width, args.height, num_masks)
+        for method in ("hull", "height"):
+            generator = PointCloudGenerator(FOCAL_LENGTH, FOCAL_LENGTH, method=method)
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                volumes = generator.calculate_volumes_from_masks(args.width, args.height, depth_map, masks)
+                timings.append((time.perf_counter() - start) * 1000)
+            elapsed = float(np.median(timings))
+            errors = [abs(v - e) / e for v, e in zip(volumes, exact) if e > 0]
+            print(f"{num_masks:>5} | {method:>6} | {elapsed:9.2f} | {elapsed / num_masks:8.2f} | {np.mean(errors) * 100:14.2f}%")
+
+
+if __name__ == "__main__":
+    main()
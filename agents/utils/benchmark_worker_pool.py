@@ -0,0 +1,115 @@
+"""
+Throughput and RAM of the inference worker pool against the equivalent N uvicorn workers.
+
+- "N uvicorn workers" is N separate processes that each load the VolumePredictor in
+  process (what every uvicorn worker does), run concurrently on their share of the images;
+  throughput is measured over all of them and RAM is their summed RSS after the run.
+- "pool" is one API process (no models) plus N inference workers; RAM is the summed RSS.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_worker_pool.py --workers 2 --images 32 [photo.jpg ...]
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from volume_predictor.registry import ModelRegistry, model_registry
+from volume_predictor.worker_pool import InferenceWorkerPool, process_rss_mb
+
+
+def load_images(paths, count):
+    if paths:
+        data = [Path(p).read_bytes() for p in paths]
+    else:
+        rng = np.random.default_rng(0)
+        data = []
+        for _ in range(4):
+            buffer = BytesIO()
+            Image.fromarray(rng.integers(0, 255, size=(1536, 2048, 3), dtype=np.uint8)).save(buffer, format="JPEG")
+            data.append(buffer.getvalue())
+    return [BytesIO(data[i % len(data)]) for i in range(count)]
+
+
+def run_pool(workers, images, config):
+    pool = InferenceWorkerPool(workers, config)
+    pool.start()
+    while not pool.is_ready:
+        if pool.last_error:
+            raise RuntimeError(pool.last_error)
+        time.sleep(0.5)
+
+    start = time.perf_counter()
+    # Enough client threads to keep every worker busy
+    with ThreadPoolExecutor(max_workers=2 * workers) as clients:
+        list(clients.map(pool.predict, images))
+    elapsed = time.perf_counter() - start
+
+    rss = process_rss_mb(os.getpid()) + sum(process_rss_mb(pid) for pid in pool.ready_workers.values())
+    pool.stop()
+    return len(images) / elapsed, rss
+
+
+def _in_process_worker(config, payloads, ready, go, results):
+    registry = ModelRegistry(**config)
+    registry.warm_up()
+    predictor = registry.get_predictor()
+    ready.wait()  # barrier: every process has loaded its models
+    go.wait()
+    for payload in payloads:
+        predictor.predict(BytesIO(payload))
+    results.put((time.time(), process_rss_mb(os.getpid())))
+
+
+def run_in_process(workers, images, config):
+    """N independent processes with their own models, each predicting its share of the images."""
+    ctx = mp.get_context("spawn")
+    ready = ctx.Barrier(workers + 1)
+    go = ctx.Event()
+    results = ctx.Queue()
+    payloads = [image.getvalue() for image in images]
+    processes = [
+        ctx.Process(target=_in_process_worker, args=(config, payloads[i::workers], ready, go, results))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    ready.wait()
+    start = time.time()  # wall clock: compared with timestamps taken in the children
+    go.set()
+    finished = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = max(end for end, _ in finished) - start
+    return len(images) / elapsed, sum(rss for _, rss in finished)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference worker pool vs N uvicorn workers.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("paths", nargs="*")
+    args = parser.parse_args()
+
+    config = model_registry.config()
+    images = load_images(args.paths, args.images)
+
+    # This process never loads a model: both setups run the models in child processes
+    pool_throughput, pool_rss = run_pool(args.workers, images, config)
+    multi_throughput, multi_rss = run_in_process(args.workers, images, config)
+
+    print(f"{args.images} images, {args.workers} workers, {os.cpu_count()} cores\n")
+    print("| setup | img/s | RSS MB |")
+    print("|-------|-------|--------|")
+    print(f"| {args.workers} uvicorn workers (in-process models) | {multi_throughput:.2f} | {multi_rss:.0f} |")
+    print(f"| API + {args.workers} inference workers | {pool_throughput:.2f} | {pool_rss:.0f} |")
+
+
+if __name__ == "__main__":
+    main()
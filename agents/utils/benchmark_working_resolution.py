@@ -0,0 +1,85 @@
+"""
+Latency vs input megapixels for VolumePredictor at the full upload resolution and at a
+fixed working resolution (long side WORKING_LONG_SIDE, default 1024).
+
+Every input is JPEG-encoded first so decode cost is included, as for real uploads.
+Also prints the relative volume difference between the two runs per size.
+
+Usage (from the agents/ directory):
+    python utils/benchmark_working_resolution.py [image.jpg]
+
+Without an image, a synthetic plate scene is scaled to each size.
+"""
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import os
+import numpy as np
+from PIL import Image, ImageDraw
+from volume_predictor import VolumePredictor
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "checkpoints"
+SIZES = [(640, 480), (1280, 960), (2048, 1536), (3024, 2268), (4032, 3024)]
+
+
+def base_image(path=None) -> Image.Image:
+    if path:
+        return Image.open(path).convert("RGB")
+    image = Image.new("RGB", (1600, 1200), (200, 190, 170))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((250, 150, 1350, 1050), fill=(245, 245, 245))
+    draw.ellipse((500, 350, 900, 700), fill=(180, 120, 40))
+    draw.ellipse((850, 550, 1150, 850), fill=(60, 140, 50))
+    return image
+
+
+def encode(image: Image.Image, size) -> bytes:
+    buffer = BytesIO()
+    image.resize(size, Image.BILINEAR).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def make_predictor(working_long_side):
+    return VolumePredictor(
+        yolo_path=str(CHECKPOINT_DIR / "yolov8_foodseg103.onnx"),
+        dav2_path=str(CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.pth"),
+        dav2_type="vits",
+        dav2_backend=os.getenv("DAV2_BACKEND", "onnx"),
+        working_long_side=working_long_side,
+    )
+
+
+def main():
+    runs = int(os.getenv("BENCH_RUNS", "3"))
+    working_long_side = int(os.getenv("WORKING_LONG_SIDE", "1024"))
+    image = base_image(sys.argv[1] if len(sys.argv) > 1 else None)
+    predictors = {"full": make_predictor(None), f"{working_long_side}px": make_predictor(working_long_side)}
+
+    print("| megapixels | mode | decode ms | depth ms | seg ms | volume ms | total ms | total volume m3 |")
+    print("|------------|------|-----------|----------|--------|-----------|----------|-----------------|")
+    for size in SIZES:
+        data = encode(image, size)
+        megapixels = size[0] * size[1] / 1e6
+        totals = {}
+        for mode, predictor in predictors.items():
+            predictor.predict(data)  # warm-up for this input shape
+            timings = []
+            for _ in range(runs):
+                predictions, t = predictor.predict_with_timings(data)
+                timings.append(t)
+            median = {k: float(np.median([t[k] for t in timings])) for k in timings[0]}
+            totals[mode] = sum(float(p.volume) for p in predictions)
+            print(
+                f"| {megapixels:10.1f} | {mode} | {median['decode_ms']:9.1f} | {median['depth_ms']:8.1f} | "
+                f"{median['segmentation_ms']:6.1f} | {median['volume_ms']:9.1f} | {median['total_ms']:8.1f} | "
+                f"{totals[mode]:.6f} |"
+            )
+        full, reduced = totals["full"], totals[f"{working_long_side}px"]
+        if full > 0:
+            print(f"|            | volume diff vs full | {abs(reduced - full) / full * 100:.1f}% | | | | | |")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,41 +2,99 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 import numpy as np
-from typing import List
-from transformers import AutoTokenizer
+from typing import List, Optional
 import onnxruntime as ort
 import os
-from huggingface_hub import hf_hub_download
-import shutil
+from utils.model_resolver import model_resolver
+
+# Food names are short; 128 tokens leaves headroom for long branded names
+EMBEDDER_MAX_LENGTH = int(os.getenv("EMBEDDER_MAX_LENGTH", "128"))
+EMBEDDER_BATCH_SIZE = int(os.getenv("EMBEDDER_BATCH_SIZE", "64"))
+# fp32 (the Hugging Face export), optimized (fused fp32) or int8; see utils/quantize_embedder.py
+EMBEDDER_VARIANT = os.getenv("EMBEDDER_VARIANT", "fp32")
+EMBEDDER_INTRA_OP_THREADS = int(os.getenv("EMBEDDER_INTRA_OP_THREADS", "0")) or None
+EMBEDDER_INTER_OP_THREADS = int(os.getenv("EMBEDDER_INTER_OP_THREADS", "0")) or None
+EMBEDDER_VARIANTS = ("fp32", "optimized", "int8")
+
+
+def embedder_model_path(local_model_path: str, variant: str) -> str:
+    """Path of an embedder variant, e.g. model.onnx -> model.opt.onnx / model.int8.onnx."""
+    if variant not in EMBEDDER_VARIANTS:
+        raise ValueError(f"Unknown embedder variant {variant}; expected one of {EMBEDDER_VARIANTS}")
+    suffix = {"fp32": "", "optimized": ".opt", "int8": ".int8"}[variant]
+    return os.path.splitext(local_model_path)[0] + suffix + ".onnx"
+
 
 class Embedder:
     """
     Embeds text using ONNX runtime with intfloat/multilingual-e5-small.
-    Loads ONNX model and tokenizer once in __init__.
+    Loads ONNX model and tokenizer once in __init__, local-first: an existing local_model_path
+    or the content-addressed model cache is opened in place, and the hub is only contacted
+    on a cache miss.
+
+    Inputs are sorted by token length and run in buckets of batch_size, each padded only
+    to its own longest member and truncated at max_length; outputs keep the input order.
     """
     def __init__(
         self,
         model_name: str = "intfloat/multilingual-e5-small",
-        local_model_path: str = "checkpoints/onnx/model.onnx"
+        local_model_path: str = "checkpoints/onnx/model.onnx",
+        max_length: int = EMBEDDER_MAX_LENGTH,
+        batch_size: int = EMBEDDER_BATCH_SIZE,
+        bucket_by_length: bool = True,
+        variant: str = EMBEDDER_VARIANT,
+        intra_op_num_threads: Optional[int] = EMBEDDER_INTRA_OP_THREADS,
+        inter_op_num_threads: Optional[int] = EMBEDDER_INTER_OP_THREADS,
     ):
         self.model_name = model_name
         self.local_model_path = local_model_path
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.bucket_by_length = bucket_by_length
+        self.variant = variant
+        self.model_path = embedder_model_path(local_model_path, variant)
+        self.tokenizer = model_resolver.load_tokenizer(self.model_name)
         # self.mlflow_model_uri = os.environ.get("EMBEDDER_MLFLOW_URI") # "models:/intfloat_multilingual-e5-small_onnx_model/1"
 
-        print("Downloading model from Huggingface Hub...")
-        # Download model.onnx from Huggingface
-        model_onnx_path = hf_hub_download(
-            repo_id=self.model_name,
-            filename="onnx/model.onnx",
-            cache_dir=os.path.dirname(self.local_model_path),
-            resume_download=True,
+        if variant != "fp32":
+            # Built offline by utils/quantize_embedder.py, already graph-optimized
+            if not os.path.exists(self.model_path):
+                raise FileNotFoundError(
+                    f"Embedder {variant} model not found: {self.model_path}. "
+                    "Run utils/quantize_embedder.py to build it."
+                )
+            self.session = self.create_session(
+                self.model_path, intra_op_num_threads, inter_op_num_threads, optimize=False
+            )
+            return
+
+        # A model placed at local_model_path wins; otherwise the cached hub export is used as is
+        if not os.path.exists(self.model_path):
+            self.model_path = model_resolver.resolve_file(self.model_name, "onnx/model.onnx")
+        self.session = self.create_session(self.model_path, intra_op_num_threads, inter_op_num_threads)
+
+    @staticmethod
+    def create_session(
+        path: str,
+        intra_op_num_threads: Optional[int] = None,
+        inter_op_num_threads: Optional[int] = None,
+        optimize: bool = True,
+    ) -> ort.InferenceSession:
+        """
+        CPU session with explicit thread budgets (None lets ONNX Runtime decide).
+        Graphs saved already optimized skip the optimizer, which shortens session start-up.
+        """
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL if optimize else ort.GraphOptimizationLevel.ORT_DISABLE_ALL
         )
-        # Save/copy the model to local_model_path if not already present
-        if model_onnx_path != self.local_model_path:
-            shutil.copyfile(model_onnx_path, self.local_model_path)
-        self.session = ort.InferenceSession(self.local_model_path)
-    
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_num_threads:
+            sess_options.intra_op_num_threads = intra_op_num_threads
+        if inter_op_num_threads:
+            sess_options.inter_op_num_threads = inter_op_num_threads
+        return ort.InferenceSession(path, sess_options=sess_options, providers=["CPUExecutionProvider"])
+
     @staticmethod
     def mean_pooling(last_hidden_state, attention_mask) -> np.ndarray:
         """
@@ -57,12 +115,37 @@ class Embedder:
         return x / np.clip(norm, eps, None)
 
     def embed(self, texts: List[str]) -> np.ndarray:
-        encoded_input = self.tokenizer(
-            texts, padding=True, truncation=True, return_tensors="np"
-        )
-        input_ids = encoded_input["input_ids"]
-        attention_mask = encoded_input["attention_mask"]
+        """
+        Embed texts; returns an array of shape (len(texts), hidden_size) in the input order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if not self.bucket_by_length:
+            encoded_input = self.tokenizer(
+                texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+            )
+            return self._embed_padded(encoded_input["input_ids"], encoded_input["attention_mask"])
+
+        # Tokenize once without padding, then pad each bucket to its own longest member
+        token_ids = self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        pad_id = self.tokenizer.pad_token_id or 0
+        embeddings = None
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            seq_len = max(len(token_ids[i]) for i in bucket)
+            input_ids = np.full((len(bucket), seq_len), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(bucket), seq_len), dtype=np.int64)
+            for row, i in enumerate(bucket):
+                input_ids[row, :len(token_ids[i])] = token_ids[i]
+                attention_mask[row, :len(token_ids[i])] = 1
+            bucket_embeddings = self._embed_padded(input_ids, attention_mask)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), bucket_embeddings.shape[1]), dtype=bucket_embeddings.dtype)
+            embeddings[bucket] = bucket_embeddings
+        return embeddings
 
+    def _embed_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
         inputs_for_onnx = {
             "input_ids": input_ids,
             "attention_mask": attention_mask,
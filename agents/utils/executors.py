@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+
+class BoundedExecutor:
+    """
+    Named thread pool that async handlers hand blocking work to, with in-flight counters.
+    ONNX Runtime, torch, psycopg and urllib3 all release the GIL while they wait or compute,
+    so threads keep the event loop responsive without pickling images between processes.
+    """
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    async def iterate(self, make_iterator: Callable[[], Iterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Drain a blocking iterator as one job on this pool, yielding its items to the event
+        loop as they are produced. The pool slot is held until the iterator is exhausted
+        (even if the consumer stops early), so nothing else runs on it in between.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def drain():
+            try:
+                for item in make_iterator():
+                    loop.call_soon_threadsafe(queue.put_nowait, ("item", item))
+            except BaseException as err:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", err))
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+
+        job = asyncio.ensure_future(self.run(drain))
+        while True:
+            kind, value = await queue.get()
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                break
+        await job
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Blocking counterpart of run for sync code on other threads (e.g. LangChain tools on
+        the I/O pool): the call queues behind the pool's other jobs and waits for its result.
+        Called from one of this pool's own threads, it runs inline instead of deadlocking.
+        """
+        if threading.current_thread().name.startswith(self.name + "_"):
+            return fn(*args, **kwargs)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self.executor.submit(fn, *args, **kwargs).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_workers": self.max_workers, "in_flight": self.in_flight, "completed": self.completed}
+
+
+# DB queries, MinIO downloads, cache files and sync LLM/tool calls
+io_executor = BoundedExecutor("io", int(os.getenv("IO_POOL_SIZE", "16")))
+# Model forward passes. Always a single worker: YOLOv8Seg keeps per-call state on the
+# instance (img_height, boxes, ...), so the shared predictor must never run concurrently,
+# and each model already uses all cores. Scale out with INFERENCE_WORKERS processes instead.
+inference_executor = BoundedExecutor("inference", 1)
+
+
+async def run_io(fn: Callable, *args, **kwargs) -> Any:
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+async def run_inference(fn: Callable, *args, **kwargs) -> Any:
+    return await inference_executor.run(fn, *args, **kwargs)
+
+
+def shutdown_executors() -> None:
+    io_executor.shutdown()
+    inference_executor.shutdown()
+
+
+def executor_stats() -> Dict[str, Dict[str, int]]:
+    return {"io": io_executor.stats(), "inference": inference_executor.stats()}
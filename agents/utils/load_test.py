@@ -0,0 +1,146 @@
+"""
+Load test for the agent API: measures latency of a light endpoint (/health) on its own
+and again while heavy /api/predict_img requests keep the vision models busy.
+With blocking work off the event loop, the light endpoint's p99 should stay flat.
+
+Heavy requests must reach the models, not the prediction result cache: run the server with
+PREDICTION_CACHE_SIZE=0 and without PREDICTION_CACHE_DIR. The script checks /api/metrics and
+refuses to run against an enabled cache (unless --allow-cache), and reports the cache hits
+seen during the run. Pass several image ids; heavy requests rotate through them.
+
+Usage (from the agents/ directory, with the API running):
+    PREDICTION_CACHE_SIZE=0 uvicorn main:app ...
+    python utils/load_test.py --base-url http://localhost:8000 --image-id <uuid> [<uuid> ...] \
+        --heavy-concurrency 8 --duration 30
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+def timed_request(url: str, method: str = "GET", timeout: float = 120.0) -> float:
+    start = time.perf_counter()
+    request = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def light_probe(url: str, duration: float, interval: float) -> List[float]:
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            latencies.append(timed_request(url, timeout=10.0))
+        except Exception as e:
+            print(f"Light request failed: {e}")
+        time.sleep(interval)
+    return latencies
+
+
+def heavy_worker(urls: Iterator[str], stop: threading.Event, latencies: List[float], errors: List[str]) -> None:
+    while not stop.is_set():
+        try:
+            latencies.append(timed_request(next(urls), method="POST"))
+        except Exception as e:
+            errors.append(str(e))
+
+
+def prediction_cache_stats(base_url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(f"{base_url}/api/metrics", timeout=10.0) as response:
+            return json.loads(response.read()).get("prediction_cache")
+    except Exception as e:
+        print(f"Could not read /api/metrics: {e}")
+        return None
+
+
+def cache_hits(stats: Optional[Dict[str, Any]]) -> int:
+    return (stats or {}).get("hits", 0) + (stats or {}).get("disk_hits", 0)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"count": 0}
+    values = np.array(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Light-endpoint latency under heavy prediction load.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--image-id", nargs="+", required=True, help="Image ids; heavy requests rotate through them")
+    parser.add_argument("--allow-cache", action="store_true", help="Run even if the prediction cache is enabled")
+    parser.add_argument("--user-id", default="load-test")
+    parser.add_argument("--heavy-concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    light_url = f"{args.base_url}/health"
+    heavy_urls = [
+        f"{args.base_url}/api/predict_img?" + urllib.parse.urlencode({"user_id": args.user_id, "image_id": image_id})
+        for image_id in args.image_id
+    ]
+    # itertools.cycle is not thread-safe on its own
+    url_lock = threading.Lock()
+    url_cycle = itertools.cycle(heavy_urls)
+
+    def next_url() -> Iterator[str]:
+        while True:
+            with url_lock:
+                url = next(url_cycle)
+            yield url
+
+    cache_before = prediction_cache_stats(args.base_url)
+    if cache_before and (cache_before.get("max_entries", 0) > 0 or cache_before.get("disk_enabled")):
+        message = ("The prediction cache is enabled, so repeated images are answered from it instead of "
+                   "the models. Restart the API with PREDICTION_CACHE_SIZE=0 and no PREDICTION_CACHE_DIR.")
+        if not args.allow_cache:
+            raise SystemExit(message)
+        print(f"Warning: {message}")
+
+    print(f"Baseline: {light_url} alone for {args.duration:.0f}s")
+    idle = light_probe(light_url, args.duration, args.probe_interval)
+
+    print(f"Loaded: {args.heavy_concurrency} concurrent predict_img clients")
+    stop = threading.Event()
+    heavy_latencies: List[float] = []
+    heavy_errors: List[str] = []
+    workers = [
+        threading.Thread(target=heavy_worker, args=(next_url(), stop, heavy_latencies, heavy_errors), daemon=True)
+        for _ in range(args.heavy_concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    loaded = light_probe(light_url, args.duration, args.probe_interval)
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=120)
+
+    report = {
+        "health_idle": summarize(idle),
+        "health_under_load": summarize(loaded),
+        "predict_img": summarize(heavy_latencies),
+        "predict_img_errors": len(heavy_errors),
+        "predict_img_images": len(heavy_urls),
+        "prediction_cache_hits": cache_hits(prediction_cache_stats(args.base_url)) - cache_hits(cache_before),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
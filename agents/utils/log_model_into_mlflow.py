@@ -6,13 +6,14 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from volume_predictor.depth_anything_v2.dpt import DepthAnythingV2
+from volume_predictor.depth_estimator import export_depth_anything_onnx
 
 def download_and_log_model(
     repo_id: str,
     filename: str,
     registered_model_name: str,
     local_dir: str = "models/",
-    model_type: str = "onnx",  # Accept "onnx" or "torch"
+    model_type: str = "onnx",  # Accept "onnx", "torch" or "torch_onnx" (torch checkpoint exported to ONNX)
 ):
     # Download model from Hugging Face
     model_path = hf_hub_download(
@@ -42,6 +43,18 @@ def download_and_log_model(
                 registered_model_name=registered_model_name
             )
             mlflow.log_artifact(model_path, artifact_path=repo_id.split('/')[-1])
+        elif model_type == "torch_onnx":
+            onnx_path = export_depth_anything_onnx(
+                model_path,
+                str(Path(model_path).with_suffix(".onnx")),
+                model_type="vits",
+            )
+            model = onnx.load(onnx_path)
+            mlflow.onnx.log_model(
+                onnx_model=model,
+                name=repo_id.split('/')[-1],
+                registered_model_name=registered_model_name
+            )
         else:
             raise ValueError(f"Unsupported model_type: {model_type}")
     return registered_model_name
@@ -66,6 +79,11 @@ def main():
             "filename": "depth_anything_v2_metric_hypersim_vits.pth",
             "model_type": "torch"
         },
+        {
+            "repo_id": "depth-anything/Depth-Anything-V2-Metric-Hypersim-Small",
+            "filename": "depth_anything_v2_metric_hypersim_vits.pth",
+            "model_type": "torch_onnx"
+        },
     ]
 
     for model_info in model_list:
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a request is submitted while the batcher queue is at capacity."""
+
+
+class MicroBatcher:
+    """
+    Asyncio micro-batcher in front of a batched model call.
+
+    Requests submitted concurrently are collected until either max_batch_size items are
+    waiting or max_wait_ms has elapsed since the first one arrived; the whole group then
+    goes through one process_batch call and each awaiting request gets its own result back.
+    process_batch may return an Exception instance in place of a result to fail only that item.
+
+    process_batch runs through run_blocking (e.g. utils.executors.run_inference, so the
+    work is queued and counted like any other job on that pool), or on the loop's default
+    executor when None, so the event loop stays free.
+    """
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue_size: int = 64,
+        run_blocking: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.run_blocking = run_blocking
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batch_size_counts: Counter = Counter()
+        self.total_items = 0
+        self.total_batches = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.max_queue_depth_seen = 0
+        self.last_batch_ms: Optional[float] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self) -> None:
+        # Created lazily so the queue and worker belong to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue one item and wait for its result.
+        Raises QueueFullError immediately when the queue is at capacity (backpressure).
+        """
+        self._ensure_started()
+        if self._queue.full():
+            self.rejected += 1
+            raise QueueFullError(f"Batcher queue is full ({self.max_queue_size} pending requests)")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _call_process_batch(self, items: List[Any]) -> List[Any]:
+        if self.run_blocking is not None:
+            return await self.run_blocking(self.process_batch, items)
+        return await asyncio.get_running_loop().run_in_executor(None, self.process_batch, items)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            # Requests whose client went away are dropped before the forward pass
+            batch = [(item, future) for item, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = await self._call_process_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"process_batch returned {len(results)} results for {len(batch)} items")
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            except Exception as e:
+                self.failed_batches += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self.last_batch_ms = (time.perf_counter() - start) * 1000
+                self.total_batches += 1
+                self.total_items += len(batch)
+                self.batch_size_counts[len(batch)] += 1
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "max_queue_size": self.max_queue_size,
+            "total_items": self.total_items,
+            "total_batches": self.total_batches,
+            "avg_batch_size": self.total_items / self.total_batches if self.total_batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_size_counts.items())),
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+            "last_batch_ms": self.last_batch_ms,
+        }
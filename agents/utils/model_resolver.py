@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", str(Path(__file__).parent.parent / "checkpoints" / "model_cache")))
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelResolver:
+    """
+    Local-first resolution of Hugging Face model files and tokenizers.
+
+    Files live in a content-addressed cache (blobs/<sha256>) indexed by a manifest of
+    "repo_id/filename" -> {sha256, size}. A file listed in the manifest is returned in place
+    without any hub call; the hub is only contacted on a cache miss (or a failed check),
+    and the download is hashed and moved into the cache once. Tokenizers are saved once as a
+    fast tokenizer directory and loaded from there afterwards.
+
+    verify=True re-hashes a cached file on every resolve; otherwise only its size is checked.
+    """
+    def __init__(self, cache_dir: Path = MODEL_CACHE_DIR, verify: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.verify = verify
+        self.manifest_path = self.cache_dir / "manifest.json"
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.downloads = 0
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        # Written atomically so a crashed boot never leaves a half-written manifest
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def blob_path(self, sha256: str, filename: str) -> Path:
+        # Keep the extension: some loaders dispatch on it
+        return self.cache_dir / "blobs" / (sha256 + Path(filename).suffix)
+
+    def cached_file(self, repo_id: str, filename: str) -> Optional[str]:
+        """Path of a cached, checked file, or None."""
+        entry = self._read_manifest().get(f"{repo_id}/{filename}")
+        if not entry:
+            return None
+        path = self.blob_path(entry["sha256"], filename)
+        if not path.exists() or path.stat().st_size != entry["size"]:
+            return None
+        if self.verify and sha256_file(str(path)) != entry["sha256"]:
+            print(f"Checksum mismatch for cached {repo_id}/{filename}; downloading it again")
+            return None
+        return str(path)
+
+    def add_file(self, repo_id: str, filename: str, source_path: str) -> str:
+        """
+        Hash source_path and copy it into the cache; returns the cached path.
+        Each caller copies into its own temp file, so uvicorn workers and inference worker
+        processes adding the same file at once never write into one another's copy.
+        """
+        sha256 = sha256_file(source_path)
+        path = self.blob_path(sha256, filename)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as tmp:
+                tmp_path = tmp.name
+                with open(source_path, "rb") as source:
+                    shutil.copyfileobj(source, tmp)
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+        # Check what actually ended up at the blob path, whoever wrote it
+        if sha256_file(str(path)) != sha256:
+            path.unlink(missing_ok=True)
+            raise RuntimeError(f"Checksum mismatch after adding {repo_id}/{filename} to the model cache")
+        with self._lock:
+            manifest = self._read_manifest()
+            manifest[f"{repo_id}/{filename}"] = {"sha256": sha256, "size": path.stat().st_size}
+            self._write_manifest(manifest)
+        return str(path)
+
+    def resolve_file(self, repo_id: str, filename: str) -> str:
+        """Local path of repo_id/filename, downloading it into the cache only on a miss."""
+        path = self.cached_file(repo_id, filename)
+        if path is not None:
+            self.hits += 1
+            return path
+
+        from huggingface_hub import hf_hub_download
+        print(f"Downloading {repo_id}/{filename} from Huggingface Hub...")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as tmp_dir:
+            downloaded = hf_hub_download(repo_id=repo_id, filename=filename, cache_dir=tmp_dir)
+            path = self.add_file(repo_id, filename, downloaded)
+        self.downloads += 1
+        return path
+
+    def tokenizer_dir(self, repo_id: str) -> Path:
+        return self.cache_dir / "tokenizers" / repo_id.replace("/", "--")
+
+    def load_tokenizer(self, repo_id: str):
+        """Fast tokenizer from the local cache, saved from the hub on first use."""
+        from transformers import AutoTokenizer
+        local_dir = self.tokenizer_dir(repo_id)
+        if (local_dir / "tokenizer.json").exists():
+            self.hits += 1
+            return AutoTokenizer.from_pretrained(str(local_dir), use_fast=True, local_files_only=True)
+
+        print(f"Downloading {repo_id} tokenizer from Huggingface Hub...")
+        tokenizer = AutoTokenizer.from_pretrained(repo_id, use_fast=True)
+        local_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=local_dir.parent, prefix=local_dir.name + ".", suffix=".tmp")
+        tokenizer.save_pretrained(tmp_dir)
+        try:
+            os.replace(tmp_dir, local_dir)
+        except OSError:
+            # Another process saved it first (the rename cannot replace a non-empty directory)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.downloads += 1
+        return tokenizer
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache_dir": str(self.cache_dir), "hits": self.hits, "downloads": self.downloads}
+
+
+model_resolver = ModelResolver(verify=os.getenv("MODEL_CACHE_VERIFY", "false").lower() == "true")
@@ -0,0 +1,80 @@
+"""
+Build the optimized and INT8 variants of the e5-small embedder (see EMBEDDER_VARIANT).
+
+- optimized: the Hugging Face fp32 export with BERT fusions (attention, LayerNorm, GELU),
+  then run through the ONNX Runtime optimizer and saved, so sessions load it without
+  re-optimizing.
+- int8: dynamic INT8 quantization (per-channel weights) of the fused graph. The encoder is
+  dominated by MatMul, whose weights quantize well without calibration. It is then saved
+  already optimized, like the optimized variant.
+
+Usage (from the agents/ directory):
+    python utils/quantize_embedder.py
+Then check retrieval quality and speed with utils/benchmark_embedder_quantization.py.
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import os
+import onnxruntime
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from onnxruntime.transformers.optimizer import optimize_model
+from utils.embedder import Embedder, embedder_model_path
+
+# multilingual-e5-small: 12 layers, 12 attention heads, hidden size 384
+NUM_HEADS = 12
+HIDDEN_SIZE = 384
+
+
+def save_optimized_graph(path: str) -> None:
+    """Run the ONNX Runtime graph optimizer once and overwrite path with the optimized graph."""
+    optimized_path = path + ".tmp"
+    sess_options = onnxruntime.SessionOptions()
+    # EXTENDED rather than ALL: the saved graph stays portable across CPUs
+    sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    sess_options.optimized_model_filepath = optimized_path
+    onnxruntime.InferenceSession(path, sess_options=sess_options, providers=["CPUExecutionProvider"])
+    os.replace(optimized_path, path)
+
+
+def build_optimized(fp32_path: str, model_path: str) -> str:
+    optimized_path = embedder_model_path(model_path, "optimized")
+    os.makedirs(os.path.dirname(optimized_path) or ".", exist_ok=True)
+    fused = optimize_model(fp32_path, model_type="bert", num_heads=NUM_HEADS, hidden_size=HIDDEN_SIZE)
+    fused.save_model_to_file(optimized_path)
+    save_optimized_graph(optimized_path)
+    print(f"Optimized embedder saved to {optimized_path}")
+    return optimized_path
+
+
+def build_int8(optimized_path: str, model_path: str) -> str:
+    int8_path = embedder_model_path(model_path, "int8")
+    quantize_dynamic(
+        optimized_path,
+        int8_path,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        op_types_to_quantize=["MatMul", "Gemm", "Attention"],
+    )
+    save_optimized_graph(int8_path)
+    print(f"INT8 embedder saved to {int8_path}")
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build optimized and INT8 variants of the e5 embedder.")
+    parser.add_argument("--model-path", default="checkpoints/onnx/model.onnx")
+    args = parser.parse_args()
+
+    # model_path itself, or the fp32 export from the model cache (downloaded on a miss)
+    fp32_path = Embedder(local_model_path=args.model_path, variant="fp32").model_path
+
+    optimized_path = build_optimized(fp32_path, args.model_path)
+    int8_path = build_int8(optimized_path, args.model_path)
+    for variant, path in (("fp32", fp32_path), ("optimized", optimized_path), ("int8", int8_path)):
+        print(f"{variant}: {os.path.getsize(path) / 1e6:.1f} MB  {path}")
+
+
+if __name__ == "__main__":
+    main()
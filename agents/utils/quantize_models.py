@@ -0,0 +1,163 @@
+"""
+Build the INT8 precision profile for VolumePredictor.
+
+- Depth Anything V2: dynamic INT8 quantization of the exported ONNX graph. The DINOv2
+  ViT-S encoder is dominated by MatMul/Gemm, whose weights quantize well without calibration.
+- YOLOv8-seg: static INT8 (QDQ, per-channel) quantization of the conv stack, calibrated on
+  a sample of FoodSeg103 images produced by volume_predictor/dataset.py.
+
+Usage (from the agents/ directory, after running volume_predictor/dataset.py):
+    python utils/quantize_models.py --calib-dir foodseg103_yolo/val/images --num-calib 200
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import argparse
+import glob
+import os
+import random
+from typing import List, Optional
+import cv2
+import numpy as np
+import onnxruntime
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from volume_predictor.depth_estimator import export_depth_anything_onnx, prepare_depth_input
+from volume_predictor.volume_predictor import quantized_model_path
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "checkpoints"
+DAV2_PTH = CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.pth"
+DAV2_ONNX = CHECKPOINT_DIR / "depth_anything_v2_metric_hypersim_vits.onnx"
+YOLO_ONNX = CHECKPOINT_DIR / "yolov8_foodseg103.onnx"
+
+
+def sample_calibration_images(calib_dir: str, num_images: int, seed: int = 42) -> List[str]:
+    """
+    Pick a reproducible random sample of images from a FoodSeg103 split converted by dataset.py.
+    """
+    paths = sorted(glob.glob(os.path.join(calib_dir, "*.jpg")))
+    if not paths:
+        raise FileNotFoundError(
+            f"No calibration images in {calib_dir}. Run volume_predictor/dataset.py to convert FoodSeg103 first."
+        )
+    random.Random(seed).shuffle(paths)
+    return paths[:num_images]
+
+
+class YOLOCalibrationReader(CalibrationDataReader):
+    """
+    Feeds FoodSeg103 images through the same preprocessing as YOLOv8Seg.prepare_input.
+    """
+    def __init__(self, model_path: str, image_paths: List[str]):
+        session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_height, self.input_width = model_input.shape[2], model_input.shape[3]
+        self.image_paths = iter(image_paths)
+
+    def get_next(self) -> Optional[dict]:
+        path = next(self.image_paths, None)
+        if path is None:
+            return None
+        image = cv2.imread(path)
+        input_img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        input_img = cv2.resize(input_img, (self.input_width, self.input_height))
+        input_img = input_img / 255.0
+        input_img = input_img.transpose(2, 0, 1)
+        return {self.input_name: input_img[np.newaxis, :, :, :].astype(np.float32)}
+
+
+class DepthCalibrationReader(CalibrationDataReader):
+    """
+    Feeds FoodSeg103 images through the same preprocessing as DepthEstimator.prepare_input.
+    """
+    def __init__(self, model_path: str, image_paths: List[str], input_size: int = 518):
+        session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = session.get_inputs()[0].name
+        self.input_size = input_size
+        self.image_paths = iter(image_paths)
+
+    def get_next(self) -> Optional[dict]:
+        path = next(self.image_paths, None)
+        if path is None:
+            return None
+        input_tensor, _ = prepare_depth_input(cv2.imread(path), self.input_size)
+        return {self.input_name: input_tensor}
+
+
+def quantize_depth_model(fp32_path: str, image_paths: List[str], mode: str = "dynamic") -> str:
+    int8_path = quantized_model_path(fp32_path)
+    if mode == "dynamic":
+        quantize_dynamic(
+            fp32_path,
+            int8_path,
+            weight_type=QuantType.QInt8,
+            op_types_to_quantize=["MatMul", "Gemm"],
+        )
+    else:
+        preprocessed_path = fp32_path.replace(".onnx", ".preprocessed.onnx")
+        quant_pre_process(fp32_path, preprocessed_path)
+        quantize_static(
+            preprocessed_path,
+            int8_path,
+            DepthCalibrationReader(preprocessed_path, image_paths),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.Percentile,
+        )
+        os.remove(preprocessed_path)
+    print(f"Depth Anything V2 INT8 ({mode}) model saved to {int8_path}")
+    return int8_path
+
+
+def quantize_yolo_model(fp32_path: str, image_paths: List[str], mode: str = "static") -> str:
+    int8_path = quantized_model_path(fp32_path)
+    if mode == "dynamic":
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+    else:
+        preprocessed_path = fp32_path.replace(".onnx", ".preprocessed.onnx")
+        quant_pre_process(fp32_path, preprocessed_path)
+        quantize_static(
+            preprocessed_path,
+            int8_path,
+            YOLOCalibrationReader(preprocessed_path, image_paths),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+        os.remove(preprocessed_path)
+    print(f"YOLOv8-seg INT8 ({mode}) model saved to {int8_path}")
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build INT8 variants of the volume prediction models.")
+    parser.add_argument("--calib-dir", default="foodseg103_yolo/val/images")
+    parser.add_argument("--num-calib", type=int, default=200)
+    parser.add_argument("--depth-mode", choices=["dynamic", "static"], default="dynamic")
+    parser.add_argument("--yolo-mode", choices=["dynamic", "static"], default="static")
+    args = parser.parse_args()
+
+    image_paths = sample_calibration_images(args.calib_dir, args.num_calib)
+    print(f"Using {len(image_paths)} FoodSeg103 calibration images from {args.calib_dir}")
+
+    if not DAV2_ONNX.exists():
+        export_depth_anything_onnx(str(DAV2_PTH), str(DAV2_ONNX))
+
+    quantize_depth_model(str(DAV2_ONNX), image_paths, mode=args.depth_mode)
+    quantize_yolo_model(str(YOLO_ONNX), image_paths, mode=args.yolo_mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from utils.lru_cache import LRUCache
+
+
+class PredictionResultCache:
+    """
+    Cache of serialized volume predictions keyed by the SHA-256 of the image bytes and a
+    fingerprint of the predictor (model checkpoints, thresholds, precision, volume method).
+
+    Two tiers: an in-process LRU and, when cache_dir is set, one JSON file per entry on disk
+    so results survive restarts and are shared by workers on the same volume.
+    Loading a changed checkpoint (on restart) gives a new fingerprint, so old entries are
+    never served again; the in-memory tier is dropped as soon as the new fingerprint is seen.
+    """
+    def __init__(self, max_entries: int = 512, cache_dir: Optional[str] = None):
+        self.memory = LRUCache(max_entries)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.invalidations = 0
+
+    def key(self, image: Union[bytes, BytesIO], fingerprint: str) -> str:
+        """Cache key of an image (bytes or an in-memory stream) under a predictor fingerprint."""
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._fingerprint is not None:
+                    self.invalidations += 1
+                    self.memory.clear()
+                self._fingerprint = fingerprint
+
+        digest = hashlib.sha256(fingerprint.encode())
+        if isinstance(image, BytesIO):
+            # Hash the stream's buffer in place instead of copying it out
+            with image.getbuffer() as view:
+                digest.update(view)
+        else:
+            digest.update(image)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self.cache_dir is None:
+            return value
+
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (OSError, ValueError) as e:
+            self.disk_errors += 1
+            print(f"Failed to read cached prediction {path}: {e}")
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.memory.put(key, value)
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)  # atomic, so readers never see a partial file
+        except OSError as e:
+            self.disk_errors += 1
+            print(f"Failed to write cached prediction {path}: {e}")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats.update({
+            "disk_enabled": self.cache_dir is not None,
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "invalidations": self.invalidations,
+        })
+        return stats
+
+
+prediction_cache = PredictionResultCache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "512")),
+    cache_dir=os.getenv("PREDICTION_CACHE_DIR") or None,
+)
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from utils.executors import run_io
+
+# Appended when the model still asks for tools after the last allowed round
+TOOL_BUDGET_NOTE = (
+    "The tool call budget for this reply is used up. Do not call any more tools; "
+    "answer now with the information gathered above and say what is still unknown."
+)
+# Returned if the model keeps asking for tools even after TOOL_BUDGET_NOTE
+TRUNCATED_REPLY = (
+    "Sorry, I could not finish looking this up within the allowed number of steps. "
+    "Please try again with a more specific question."
+)
+
+
+class ToolRunner:
+    """
+    Executes the tool calls of one assistant turn concurrently and loops the model until it
+    answers without tool calls.
+
+    Each call runs on the I/O pool under a per-tool timeout; a semaphore caps how many tool
+    calls run at once across all requests. A timed-out call is reported to the model as an
+    error; its worker thread cannot be interrupted, so it keeps its semaphore permit until
+    the thread finishes (the result is dropped). The cap therefore also bounds abandoned calls.
+    """
+    def __init__(
+        self,
+        tools: List[Any],
+        default_timeout_s: float = 30.0,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_concurrency: int = 4,
+        run_blocking: Callable[..., Awaitable[Any]] = run_io,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.default_timeout_s = default_timeout_s
+        self.timeouts = timeouts or {}
+        self.max_concurrency = max_concurrency
+        self.run_blocking = run_blocking
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.timeouts_hit: Dict[str, int] = defaultdict(int)
+        self.total_ms: Dict[str, float] = defaultdict(float)
+        self.truncated_replies = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run_tool_call(self, tool_call: Dict[str, Any]) -> Tuple[ToolMessage, Dict[str, Any]]:
+        """Run one tool call; returns the ToolMessage for the model and a latency record."""
+        name = tool_call["name"]
+        tool = self.tools.get(name)
+        timeout_s = self.timeouts.get(name, self.default_timeout_s)
+        status = "ok"
+        start = time.perf_counter()
+        semaphore = self.semaphore
+        await semaphore.acquire()
+        queued_ms = (time.perf_counter() - start) * 1000
+        task = None
+        try:
+            if tool is None:
+                raise KeyError(f"unknown tool {name}")
+            task = asyncio.ensure_future(self.run_blocking(tool.invoke, tool_call["args"]))
+            # The permit goes back when the tool's thread is done, not when we stop waiting
+            task.add_done_callback(lambda done: _release_permit(semaphore, done))
+            output = await asyncio.wait_for(asyncio.shield(task), timeout_s)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            output = f"Error: {name} timed out after {timeout_s:.0f}s"
+        except Exception as tool_err:
+            status = "error"
+            output = f"Error: {tool_err}"
+        finally:
+            if task is None:
+                semaphore.release()
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        self.calls[name] += 1
+        self.total_ms[name] += latency_ms
+        if status == "timeout":
+            self.timeouts_hit[name] += 1
+        elif status == "error":
+            self.errors[name] += 1
+
+        content = output if isinstance(output, str) else json.dumps(output, default=str)
+        record = {
+            "id": tool_call["id"],
+            "name": name,
+            "status": status,
+            "latency_ms": latency_ms,
+            "queued_ms": queued_ms,
+        }
+        return ToolMessage(content=content, tool_call_id=tool_call["id"], name=name), record
+
+    async def run_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Tuple[ToolMessage, Dict[str, Any]]]:
+        """Run the independent tool calls of one turn concurrently, keeping their order."""
+        return list(await asyncio.gather(*[self.run_tool_call(tool_call) for tool_call in tool_calls]))
+
+    async def run(
+        self,
+        llm: Any,
+        messages: List[Any],
+        max_rounds: int = 4,
+        final_llm: Optional[Any] = None,
+    ) -> Tuple[AIMessage, Dict[str, Any]]:
+        """
+        Call the model, execute its tool calls, feed the results back and repeat until it
+        returns an answer without tool calls (see run_events for the round budget).
+        Returns the final message and metadata with per-tool latency accounting.
+        """
+        async for event, data in self.run_events(llm, messages, max_rounds, final_llm):
+            if event == "done":
+                return data
+
+    async def run_events(
+        self,
+        llm: Any,
+        messages: List[Any],
+        max_rounds: int = 4,
+        final_llm: Optional[Any] = None,
+        stream: bool = False,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        The model -> tools loop shared by run() and the streaming chat endpoint, as events:
+        ("token", text) for each streamed text chunk (stream=True only), ("tool_call", call),
+        ("tool_result", (ToolMessage, record)) and finally ("done", (message, metadata)).
+
+        At most max_rounds model calls may request tools, and tools run for all but the last
+        of them. If the last one still asks for tools, the model is asked once more to answer
+        without tools (final_llm, e.g. the model without bound tools, when given); if even
+        that asks for tools, a fixed truncation reply is used. Either way the reply is
+        flagged as truncated and counted in stats().
+        """
+        start = time.perf_counter()
+        llm_ms = 0.0
+        records: List[Dict[str, Any]] = []
+        rounds = 0
+        truncated = False
+        while True:
+            rounds += 1
+            llm_start = time.perf_counter()
+            async for event, data in self._call_model(llm, messages, stream):
+                if event == "token":
+                    yield event, data
+                else:
+                    response = data
+            llm_ms += (time.perf_counter() - llm_start) * 1000
+            if not response.tool_calls:
+                break
+            if rounds >= max_rounds:
+                truncated = True
+                self.truncated_replies += 1
+                llm_start = time.perf_counter()
+                wrap_up_messages = messages + [SystemMessage(content=TOOL_BUDGET_NOTE)]
+                async for event, data in self._call_model(final_llm or llm, wrap_up_messages, stream):
+                    if event == "token":
+                        yield event, data
+                    else:
+                        response = data
+                llm_ms += (time.perf_counter() - llm_start) * 1000
+                if response.tool_calls:
+                    response = AIMessage(content=TRUNCATED_REPLY)
+                    if stream:
+                        yield "token", TRUNCATED_REPLY
+                break
+            messages.append(response)
+            for tool_call in response.tool_calls:
+                yield "tool_call", tool_call
+            for tool_message, record in await self.run_tool_calls(response.tool_calls):
+                record = {**record, "round": rounds}
+                messages.append(tool_message)
+                records.append(record)
+                yield "tool_result", (tool_message, record)
+
+        yield "done", (response, {
+            "rounds": rounds,
+            "llm_ms": llm_ms,
+            "tool_calls": records,
+            "tool_latency_ms": summarize_latency(records),
+            "truncated": truncated,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        })
+
+    @staticmethod
+    async def _call_model(llm: Any, messages: List[Any], stream: bool) -> AsyncIterator[Tuple[str, Any]]:
+        """One model call: ("token", text) chunks when streaming, then ("message", full message)."""
+        if not stream:
+            yield "message", await llm.ainvoke(messages)
+            return
+        response = None
+        async for chunk in llm.astream(messages):
+            response = chunk if response is None else response + chunk
+            if isinstance(chunk.content, str) and chunk.content:
+                yield "token", chunk.content
+        yield "message", response if response is not None else AIMessage(content="")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "truncated_replies": self.truncated_replies,
+            "tools": self._tool_stats(),
+        }
+
+    def _tool_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "calls": calls,
+                "errors": self.errors[name],
+                "timeouts": self.timeouts_hit[name],
+                "avg_ms": self.total_ms[name] / calls,
+            }
+            for name, calls in self.calls.items()
+        }
+
+
+def _release_permit(semaphore: asyncio.Semaphore, task: asyncio.Future) -> None:
+    if not task.cancelled():
+        task.exception()  # mark a late failure as retrieved; it was already reported as a timeout
+    semaphore.release()
+
+
+def summarize_latency(records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Total latency per tool name over a list of call records."""
+    totals: Dict[str, float] = defaultdict(float)
+    for record in records:
+        totals[record["name"]] += record["latency_ms"]
+    return dict(totals)
@@ -1 +1,3 @@
-from .volume_predictor import VolumePredictor
\ No newline at end of file
+from .volume_predictor import VolumePredictor
+from .registry import ModelRegistry, model_registry, serialize_predictions
+from .worker_pool import InferenceWorkerPool, inference_pool, predictor_fingerprint, predict_image
@@ -177,6 +177,8 @@ class DinoVisionTransformer(nn.Module):
         named_apply(init_weights_vit_timm, self)
 
     def interpolate_pos_encoding(self, x, w, h):
+        if torch.onnx.is_in_onnx_export():
+            return self.interpolate_pos_encoding_traceable(x, w, h)
         previous_dtype = x.dtype
         npatch = x.shape[1] - 1
         N = self.pos_embed.shape[1] - 1
@@ -209,6 +211,29 @@ class DinoVisionTransformer(nn.Module):
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).view(1, -1, dim)
         return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
 
+    def interpolate_pos_encoding_traceable(self, x, w, h):
+        """
+        Export variant of interpolate_pos_encoding: no Python branch on the input shape and
+        the target grid taken from the (traced) input size, so the ONNX graph interpolates
+        for any height/width. Interpolates to the grid size instead of the offset scale
+        factor, which differs from the eager path by a small resampling error.
+        """
+        previous_dtype = x.dtype
+        N = self.pos_embed.shape[1] - 1
+        M = int(math.sqrt(N))  # fixed by the checkpoint, safe to bake into the graph
+        pos_embed = self.pos_embed.float()
+        class_pos_embed = pos_embed[:, 0]
+        patch_pos_embed = pos_embed[:, 1:]
+        dim = x.shape[-1]
+        patch_pos_embed = nn.functional.interpolate(
+            patch_pos_embed.reshape(1, M, M, dim).permute(0, 3, 1, 2),
+            size=(w // self.patch_size, h // self.patch_size),
+            mode="bicubic",
+            antialias=self.interpolate_antialias
+        )
+        patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).reshape(1, -1, dim)
+        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
+
     def prepare_tokens_with_masks(self, x, masks=None):
         B, nc, w, h = x.shape
         x = self.patch_embed(x)
@@ -3,52 +3,85 @@ from PIL import Image
 import os
 import cv2
 import torch
-from typing import Union
+import torch.nn.functional as F
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 from io import BytesIO
+from torchvision.transforms import Compose
 from .depth_anything_v2.dpt import DepthAnythingV2
+from .depth_anything_v2.util.transform import Resize, NormalizeImage, PrepareForNet
+from .onnx_session import create_session
+
+MODEL_CONFIGS = {
+    'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
+    'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
+    'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]}
+}
+
+# DINOv2 patch size: the network input height/width must be a multiple of this
+PATCH_SIZE = 14
+
 
 class DepthEstimator:
     """
     Depth estimation using Depth Anything V2 model.
+    Supports two backends:
+    - 'torch': eager PyTorch on the .pth checkpoint
+    - 'onnx': ONNX Runtime on a graph exported with export_depth_anything_onnx
     """
-    def __init__(self, model_path: str, model_type: str = 'vits'):
+    def __init__(
+        self,
+        model_path: str,
+        model_type: str = 'vits',
+        backend: str = 'torch',
+        input_size: int = 518,
+        intra_op_num_threads: Optional[int] = None,
+        inter_op_num_threads: Optional[int] = None,
+    ):
         """
         Initialize the Depth Anything model handler.
+        model_path is the .pth checkpoint for the torch backend and the .onnx graph for the onnx backend.
         """
         self.model_path = model_path
         self.model_type = model_type
+        self.backend = backend
+        self.input_size = input_size
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        self.model_configs = {
-            'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
-            'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
-            'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]}
-        }
+        self.model_configs = MODEL_CONFIGS
         self.dataset = 'hypersim' # 'hypersim' for indoor model, 'vkitti' for outdoor model
         self.max_depth = 20 # 20 for indoor model, 80 for outdoor model
-        
+
+        if self.backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unsupported depth backend: {self.backend} (expected 'torch' or 'onnx')")
+
         try:
             if not os.path.exists(self.model_path):
                 raise FileNotFoundError(f'Model file not found: {self.model_path}')
-            
-            print(f'Loading Depth Anything V2 model from {self.model_path}, type={self.model_type}')
-
-            try:
-                # Try to load weights only
-                self.model = DepthAnythingV2(**{**self.model_configs[self.model_type], 'max_depth': self.max_depth})
-                state_dict = torch.load(self.model_path, map_location='cpu', weights_only=True)
-                self.model.load_state_dict(state_dict)
-            except Exception as weight_load_exc:
-                print(f"Failed to load weights only, trying to load full model... ({weight_load_exc})")
-                # Fallback: load entire model
-                self.model = torch.load(self.model_path, map_location='cpu', weights_only=False)
-
-            self.model.eval()
+
+            print(f'Loading Depth Anything V2 model from {self.model_path}, type={self.model_type}, backend={self.backend}')
+
+            if self.backend == 'onnx':
+                self.session = create_session(
+                    self.model_path,
+                    intra_op_num_threads=intra_op_num_threads,
+                    inter_op_num_threads=inter_op_num_threads,
+                )
+                self.input_name = self.session.get_inputs()[0].name
+                self.output_name = self.session.get_outputs()[0].name
+            else:
+                self.model = load_depth_anything(self.model_path, self.model_type, self.max_depth)
+                # torch's intra-op pool is process-wide, so this caps every torch op in the worker
+                if intra_op_num_threads:
+                    torch.set_num_threads(intra_op_num_threads)
             print(f'Depth Anything model loaded successfully')
-            
+
         except Exception as e:
             print(f'Failed to load Depth Anything model: {str(e)}')
             raise ValueError(f'Failed to load Depth Anything model: {str(e)}')
-    
+
+    def prepare_input(self, bgr_img: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        return prepare_depth_input(bgr_img, self.input_size)
+
     def predict(self, image_bytes: Union[bytes, np.ndarray]) -> np.ndarray:
         """
         Run depth estimation on an image and return a metric depth map (meter).
@@ -59,7 +92,171 @@ class DepthEstimator:
             bgr_img = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2BGR)
         else:
             bgr_img = image_bytes
-        
+
+        if self.backend == 'onnx':
+            input_tensor, (h, w) = self.prepare_input(bgr_img)
+            depth = self.session.run([self.output_name], {self.input_name: input_tensor})[0][0]
+            return cv2.resize(depth, (w, h), interpolation=cv2.INTER_LINEAR)
+
+        with torch.no_grad():
+            depth_map = self.model.infer_image(bgr_img, self.input_size)
+        return depth_map
+
+    def predict_batch(self, images: List[np.ndarray], max_batch_size: int = 8) -> List[np.ndarray]:
+        """
+        Run depth estimation on several images and return one metric depth map per image.
+        Images are bucketed by their network input shape (which only depends on the aspect
+        ratio), so every forward pass stacks images sharing the same DINOv2 patch grid.
+        """
+        prepared = [self.prepare_input(image) for image in images]
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for idx, (input_tensor, _) in enumerate(prepared):
+            buckets.setdefault(input_tensor.shape[2:], []).append(idx)
+
+        depth_maps: List[Optional[np.ndarray]] = [None] * len(images)
+        for indices in buckets.values():
+            for start in range(0, len(indices), max_batch_size):
+                chunk = indices[start:start + max_batch_size]
+                batch = np.concatenate([prepared[i][0] for i in chunk], axis=0)
+                for i, depth in zip(chunk, self._infer_batch(batch, [prepared[i][1] for i in chunk])):
+                    depth_maps[i] = depth
+        return depth_maps
+
+    def _infer_batch(self, batch: np.ndarray, sizes: List[Tuple[int, int]]) -> List[np.ndarray]:
+        if self.backend == 'onnx':
+            depths = self.session.run([self.output_name], {self.input_name: batch})[0]
+            return [cv2.resize(depth, (w, h), interpolation=cv2.INTER_LINEAR) for depth, (h, w) in zip(depths, sizes)]
+
+        with torch.no_grad():
+            device = next(self.model.parameters()).device
+            depths = self.model(torch.from_numpy(batch).to(device))
+            return [
+                F.interpolate(depth[None, None], (h, w), mode="bilinear", align_corners=True)[0, 0].cpu().numpy()
+                for depth, (h, w) in zip(depths, sizes)
+            ]
+
+
+@lru_cache(maxsize=None)
+def depth_transform(input_size: int) -> Compose:
+    """
+    The DepthAnythingV2.image2tensor preprocessing pipeline, built once per input size.
+    Its steps keep no per-call state, so the instance is shared across threads.
+    """
+    return Compose([
+        Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=PATCH_SIZE,
+            resize_method='lower_bound',
+            image_interpolation_method=cv2.INTER_CUBIC,
+        ),
+        NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        PrepareForNet(),
+    ])
+
+
+def prepare_depth_input(bgr_img: np.ndarray, input_size: int = 518) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Resize/normalize an image exactly like DepthAnythingV2.image2tensor, returning a
+    (1, 3, H, W) float32 array with H and W multiples of 14 and the original (h, w).
+    """
+    h, w = bgr_img.shape[:2]
+    image = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB) / 255.0
+    image = depth_transform(input_size)({'image': image})['image']
+    return image[np.newaxis].astype(np.float32), (h, w)
+
+
+def load_depth_anything(model_path: str, model_type: str = 'vits', max_depth: float = 20) -> DepthAnythingV2:
+    """
+    Load a Depth Anything V2 torch model from a .pth checkpoint in eval mode.
+    """
+    try:
+        # Try to load weights only
+        model = DepthAnythingV2(**{**MODEL_CONFIGS[model_type], 'max_depth': max_depth})
+        state_dict = torch.load(model_path, map_location='cpu', weights_only=True)
+        model.load_state_dict(state_dict)
+    except Exception as weight_load_exc:
+        print(f"Failed to load weights only, trying to load full model... ({weight_load_exc})")
+        # Fallback: load entire model
+        model = torch.load(model_path, map_location='cpu', weights_only=False)
+    model.eval()
+    return model
+
+
+def export_depth_anything_onnx(
+    model_path: str,
+    onnx_path: str,
+    model_type: str = 'vits',
+    max_depth: float = 20,
+    input_size: int = 518,
+    opset_version: int = 17,
+    verify: bool = True,
+) -> str:
+    """
+    Export a Depth Anything V2 checkpoint to ONNX.
+    The graph takes a (batch, 3, height, width) image whose height and width are
+    multiples of 14 and returns a (batch, height, width) metric depth map.
+    With verify, the exported graph is checked against torch on a portrait and a
+    landscape input (prepare_depth_input keeps the aspect ratio, so most inputs are not square).
+    """
+    if input_size % PATCH_SIZE != 0:
+        raise ValueError(f"input_size must be a multiple of {PATCH_SIZE}, got {input_size}")
+
+    model = load_depth_anything(model_path, model_type, max_depth).to('cpu')
+    # Non-square dummy, so no square-only shortcut can be baked into the trace
+    dummy = torch.randn(1, 3, input_size, input_size + 12 * PATCH_SIZE)
+
+    os.makedirs(os.path.dirname(onnx_path) or '.', exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            dummy,
+            onnx_path,
+            input_names=['image'],
+            output_names=['depth'],
+            dynamic_axes={
+                'image': {0: 'batch', 2: 'height', 3: 'width'},
+                'depth': {0: 'batch', 1: 'height', 2: 'width'},
+            },
+            opset_version=opset_version,
+            do_constant_folding=True,
+        )
+    print(f'Exported Depth Anything V2 ({model_type}) to {onnx_path}')
+    if verify:
+        check_onnx_parity(model, onnx_path, sizes=(
+            (input_size + 12 * PATCH_SIZE, input_size),  # portrait
+            (input_size, input_size + 12 * PATCH_SIZE),  # landscape
+            (input_size, input_size),
+        ))
+    return onnx_path
+
+
+def check_onnx_parity(
+    model: DepthAnythingV2,
+    onnx_path: str,
+    sizes: Tuple[Tuple[int, int], ...],
+    rtol: float = 1e-2,
+) -> Dict[Tuple[int, int], float]:
+    """
+    Run (height, width) inputs through the torch model and the exported graph and compare.
+    Returns the max error relative to the depth range per size; raises if any exceeds rtol
+    (the exported positional-embedding resampling differs slightly from eager, far below rtol).
+    """
+    session = create_session(onnx_path)
+    input_name = session.get_inputs()[0].name
+    errors = {}
+    for height, width in sizes:
+        image = torch.randn(1, 3, height, width)
         with torch.no_grad():
-            depth_map = self.model.infer_image(bgr_img)
-        return depth_map
\ No newline at end of file
+            expected = model(image).numpy()
+        actual = session.run(None, {input_name: image.numpy()})[0]
+        if actual.shape != expected.shape:
+            raise RuntimeError(f"ONNX depth shape {actual.shape} != torch {expected.shape} for input {height}x{width}")
+        errors[(height, width)] = float(np.abs(actual - expected).max() / max(float(np.ptp(expected)), 1e-6))
+        print(f"ONNX parity {height}x{width}: max relative error {errors[(height, width)]:.2e}")
+    failed = {size: err for size, err in errors.items() if err > rtol}
+    if failed:
+        raise RuntimeError(f"Exported depth graph diverges from torch: {failed}")
+    return errors
@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple, Union
+from PIL import Image
+
+# EXIF tags used for ingestion
+EXIF_IFD = 0x8769
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_FOCAL_LENGTH = 0x920A
+TAG_FOCAL_LENGTH_35MM = 0xA405
+TAG_ORIENTATION = 0x0112
+
+# EXIF orientation -> transpose that makes the image upright (same mapping as ImageOps.exif_transpose)
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+ImageSource = Union[str, bytes, bytearray, memoryview, BytesIO, Image.Image]
+
+
+@dataclass
+class LoadedImage:
+    """
+    A decoded, upright RGB image plus what ingestion learned about it.
+    original_size is the (width, height) of the full-resolution upright photo, which may be
+    larger than image.size when the JPEG was decoded at a reduced scale.
+    """
+    image: Image.Image
+    original_size: Tuple[int, int]
+    focal_length_mm: Optional[float] = None
+    focal_length_35mm: Optional[float] = None
+    camera_make: Optional[str] = None
+    camera_model: Optional[str] = None
+
+    @property
+    def scale(self) -> float:
+        """Decoded long side / original long side (1.0 when decoded at full size)."""
+        return max(self.image.size) / max(self.original_size)
+
+
+def open_image(source: ImageSource) -> Image.Image:
+    """
+    Open an image lazily (header only). File-like inputs such as the BytesIO returned by
+    minio_client.get_image are read in place rather than copied.
+    """
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, str):
+        return Image.open(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # BytesIO shares the buffer of an immutable bytes object until it is written to
+        return Image.open(BytesIO(source))
+    if hasattr(source, "read") and hasattr(source, "seek"):
+        source.seek(0)
+        return Image.open(source)
+    raise ValueError("Input img must be a file path (str), bytes, BytesIO, or a PIL.Image.Image.")
+
+
+def load_image(source: ImageSource, target_long_side: Optional[int] = None) -> LoadedImage:
+    """
+    Decode an image as upright RGB, at no less than target_long_side on its long side.
+
+    JPEGs are decoded with libjpeg DCT scaling (PIL draft mode), which skips most of the
+    work for large photos: a 12-MP upload decoded for a 1024 px pipeline is read at 1/2 or
+    1/4 scale. The EXIF orientation is applied and the focal length / camera fields are kept.
+    The result may still be larger than target_long_side; the caller does the final resize.
+    """
+    image = open_image(source)
+    exif = image.getexif()
+    orientation = exif.get(TAG_ORIENTATION, 1)
+    stored_width, stored_height = image.size
+
+    if target_long_side and image.format == "JPEG" and max(image.size) > target_long_side:
+        ratio = target_long_side / max(image.size)
+        # draft keeps the decoded size >= the requested one
+        image.draft("RGB", (max(1, int(stored_width * ratio)), max(1, int(stored_height * ratio))))
+
+    # Orientations 5-8 swap width and height
+    if orientation in (5, 6, 7, 8):
+        original_size = (stored_height, stored_width)
+    else:
+        original_size = (stored_width, stored_height)
+
+    image = image.convert("RGB")
+    if orientation in EXIF_TRANSPOSE:
+        image = image.transpose(EXIF_TRANSPOSE[orientation])
+
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    return LoadedImage(
+        image=image,
+        original_size=original_size,
+        focal_length_mm=_to_float(exif_ifd.get(TAG_FOCAL_LENGTH)),
+        focal_length_35mm=_to_float(exif_ifd.get(TAG_FOCAL_LENGTH_35MM)),
+        camera_make=_to_str(exif.get(TAG_MAKE)),
+        camera_model=_to_str(exif.get(TAG_MODEL)),
+    )
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return value if value > 0 else None
+
+
+def _to_str(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="ignore")
+    if not isinstance(value, str):
+        return None
+    return value.strip("\x00 ") or None
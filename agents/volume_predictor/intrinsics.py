@@ -0,0 +1,112 @@
+import json
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from utils.lru_cache import LRUCache
+from .image_io import LoadedImage
+
+# Diagonal of a 36 x 24 mm full-frame sensor; 35 mm equivalent focal lengths are defined against it
+FULL_FRAME_DIAGONAL_MM = math.hypot(36.0, 24.0)
+
+# 35 mm equivalent focal lengths (mm) of the main camera of common phones, keyed by
+# "<make> <model>" in lower case. Devices learned at runtime from images that carry the
+# EXIF tag are kept in a bounded LRU next to it, since make/model strings come from uploads.
+DEFAULT_DEVICE_TABLE: Dict[str, float] = {
+    "apple iphone 11": 26.0,
+    "apple iphone 12": 26.0,
+    "apple iphone 13": 26.0,
+    "apple iphone 14": 26.0,
+    "apple iphone 15": 26.0,
+    "apple iphone 15 pro": 24.0,
+    "google pixel 6": 25.0,
+    "google pixel 7": 25.0,
+    "google pixel 8": 25.0,
+    "samsung sm-s911b": 23.0,
+    "samsung sm-a546e": 24.0,
+    "xiaomi 2201117tg": 26.0,
+}
+
+
+@dataclass
+class CameraIntrinsics:
+    focal_length_x: float
+    focal_length_y: float
+    source: str  # "exif", "device_table" or "default"
+
+    def scaled(self, scale: float) -> "CameraIntrinsics":
+        """Intrinsics of the same camera after resizing the image by scale."""
+        return CameraIntrinsics(self.focal_length_x * scale, self.focal_length_y * scale, self.source)
+
+
+class IntrinsicsResolver:
+    """
+    Resolves the focal length (in pixels, at the original image resolution) of each photo:
+    1. EXIF FocalLengthIn35mmFilm, converted through the image diagonal
+    2. the 35 mm equivalent of the device model from the configured table, or from the
+       last max_learned_devices devices seen with the EXIF tag
+    3. the default focal length, scaled from reference_width to the image width
+    """
+    def __init__(
+        self,
+        default_focal_length_x: float = 470.4,
+        default_focal_length_y: float = 470.4,
+        reference_width: int = 640,
+        device_table_path: Optional[str] = None,
+        max_learned_devices: int = 256,
+    ):
+        self.default_focal_length_x = default_focal_length_x
+        self.default_focal_length_y = default_focal_length_y
+        self.reference_width = reference_width
+
+        self.device_table: Dict[str, float] = dict(DEFAULT_DEVICE_TABLE)
+        self.learned_devices = LRUCache(max_entries=max_learned_devices)
+        if device_table_path and os.path.exists(device_table_path):
+            with open(device_table_path) as f:
+                self.device_table.update({k.lower(): float(v) for k, v in json.load(f).items()})
+
+    def resolve(self, loaded: LoadedImage) -> CameraIntrinsics:
+        width, height = loaded.original_size
+        device = self.device_key(loaded.camera_make, loaded.camera_model)
+
+        if loaded.focal_length_35mm:
+            if device is not None and device not in self.device_table:
+                # Remember the device so its photos without the 35 mm tag resolve too
+                self.learned_devices.put(device, loaded.focal_length_35mm)
+            focal = self.focal_from_35mm(loaded.focal_length_35mm, width, height)
+            return CameraIntrinsics(focal, focal, "exif")
+
+        focal_length_35mm = self.device_focal_length(device)
+        if focal_length_35mm is not None:
+            focal = self.focal_from_35mm(focal_length_35mm, width, height)
+            return CameraIntrinsics(focal, focal, "device_table")
+
+        scale = width / self.reference_width
+        return CameraIntrinsics(
+            self.default_focal_length_x * scale, self.default_focal_length_y * scale, "default"
+        )
+
+    def device_focal_length(self, device: Optional[str]) -> Optional[float]:
+        """35 mm equivalent focal length of a device from the configured or learned table."""
+        if device is None:
+            return None
+        if device in self.device_table:
+            return self.device_table[device]
+        return self.learned_devices.get(device)
+
+    @staticmethod
+    def focal_from_35mm(focal_length_35mm: float, width: int, height: int) -> float:
+        """Focal length in pixels from a 35 mm equivalent focal length (diagonal convention)."""
+        return focal_length_35mm * math.hypot(width, height) / FULL_FRAME_DIAGONAL_MM
+
+    @staticmethod
+    def device_key(make: Optional[str], model: Optional[str]) -> Optional[str]:
+        if not model:
+            return None
+        model = model.lower()
+        make = (make or "").lower()
+        # Some vendors repeat the make in the model string ("Google Pixel 7")
+        return model if not make or model.startswith(make) else f"{make} {model}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {"known_devices": len(self.device_table), "learned_devices": self.learned_devices.stats()}
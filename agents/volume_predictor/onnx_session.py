@@ -0,0 +1,26 @@
+from typing import Optional
+import onnxruntime
+
+
+def create_session(
+    path: str,
+    intra_op_num_threads: Optional[int] = None,
+    inter_op_num_threads: Optional[int] = None,
+) -> onnxruntime.InferenceSession:
+    """
+    Create an ONNX Runtime session with full graph optimizations and explicit thread budgets.
+    A thread count of None (or 0) lets ONNX Runtime pick its own default.
+    """
+    sess_options = onnxruntime.SessionOptions()
+    sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    if intra_op_num_threads:
+        sess_options.intra_op_num_threads = intra_op_num_threads
+    if inter_op_num_threads:
+        sess_options.inter_op_num_threads = inter_op_num_threads
+
+    # Only request providers that this onnxruntime build actually ships
+    available = onnxruntime.get_available_providers()
+    providers = [p for p in ['CUDAExecutionProvider', 'CPUExecutionProvider'] if p in available]
+
+    return onnxruntime.InferenceSession(path, sess_options=sess_options, providers=providers)
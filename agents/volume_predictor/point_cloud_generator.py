@@ -1,51 +1,259 @@
 import numpy as np
 import open3d as o3d
-from typing import List
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Tuple
+from .yolov8.compact_mask import CompactMask
+
+VOLUME_METHODS = ("hull", "height")
 
 
 class PointCloudGenerator:
     """
     Generates point clouds from RGB images and depth maps, and calculates volumes
     from segmented regions.
+
+    Two volume engines are available:
+    - 'hull': convex hull of each mask's 3-D point cloud (open3d)
+    - 'height': integrates per-pixel height above the estimated plate/table plane
+      inside each mask's box crop, without full-frame temporaries
     """
     def __init__(
-        self, 
-        focal_length_x = 470.4, 
-        focal_length_y = 470.4
+        self,
+        focal_length_x = 470.4,
+        focal_length_y = 470.4,
+        method: str = "hull",
+        min_plane_points: int = 500,
+        max_plane_samples: int = 20000,
     ):
+        if method not in VOLUME_METHODS:
+            raise ValueError(f"Unsupported volume method: {method} (expected one of {list(VOLUME_METHODS)})")
         self.focal_length_x = focal_length_x
         self.focal_length_y = focal_length_y
-    
+        self.method = method
+        self.min_plane_points = min_plane_points
+        self.max_plane_samples = max_plane_samples
+
     def calculate_volumes_from_masks(
-        self, 
-        width: float, 
+        self,
+        width: float,
         height: float,
-        depth_map: np.ndarray, 
-        masks: np.ndarray
+        depth_map: np.ndarray,
+        masks: Sequence,
+        method: Optional[str] = None,
+        focal_length_x: Optional[float] = None,
+        focal_length_y: Optional[float] = None,
     ) -> List[float]:
         """
         Calculate volumes for multiple segmentation masks.
-        """    
-        # Generate mesh grid and calculate point cloud coordinates
-        x, y = np.meshgrid(np.arange(width), np.arange(height))
-        x = (x - width / 2) / self.focal_length_x
-        y = (y - height / 2) / self.focal_length_y
-        z = depth_map
-        points = np.stack((np.multiply(x, z), np.multiply(y, z), z), axis=-1).reshape(-1, 3)
-
-        volumes = []
+        The focal lengths default to the ones given at construction; pass them per call
+        when the image was resized or comes from a different camera.
+        """
+        return list(self.iter_volumes_from_masks(
+            width, height, depth_map, masks, method, focal_length_x, focal_length_y
+        ))
+
+    def iter_volumes_from_masks(
+        self,
+        width: float,
+        height: float,
+        depth_map: np.ndarray,
+        masks: Sequence,
+        method: Optional[str] = None,
+        focal_length_x: Optional[float] = None,
+        focal_length_y: Optional[float] = None,
+    ) -> Iterator[float]:
+        """
+        Yield the volume of each mask as soon as it is computed, in mask order.
+        """
+        fx = focal_length_x or self.focal_length_x
+        fy = focal_length_y or self.focal_length_y
+        method = method or self.method
+        if method == "height":
+            yield from self.iter_volumes_by_height(width, height, depth_map, masks, fx, fy)
+            return
+        if method != "hull":
+            raise ValueError(f"Unsupported volume method: {method} (expected one of {list(VOLUME_METHODS)})")
+
+        x, y = ray_grid(int(width), int(height), fx, fy)
+        z = np.asarray(depth_map, dtype=np.float32)
+
         for mask in masks:
-            mask_flat = (mask.flatten() == 1) # Apply mask to get segmented points
-            filtered_points = points[mask_flat] # Filter points
-            volume = 0.0
-            if len(filtered_points) < 4:  # Need at least 4 points for meaningful volume calculation
-                volume =  0.0
-            
+            # Only the masked pixels are projected to 3-D
+            rows, cols = mask_pixels(mask)
+            if len(rows) < 4:  # Need at least 4 points for meaningful volume calculation
+                yield 0.0
+                continue
+            zs = z[rows, cols]
+            filtered_points = np.stack((x[cols] * zs, y[rows] * zs, zs), axis=-1).astype(np.float64)
+
             # Create point cloud object
             pcd = o3d.geometry.PointCloud()
             pcd.points = o3d.utility.Vector3dVector(filtered_points)
-            hull, _ = pcd.compute_convex_hull() # Compute convex hull
-            volume = hull.get_volume() # Calculate volume    
-            volumes.append(volume)
-        
-        return volumes
\ No newline at end of file
+            try:
+                hull, _ = pcd.compute_convex_hull() # Compute convex hull
+                volume = hull.get_volume() # Calculate volume
+            except RuntimeError:
+                # Degenerate (e.g. coplanar) point sets have no hull
+                volume = 0.0
+            yield volume
+
+    def calculate_volumes_by_height(
+        self,
+        width: int,
+        height: int,
+        depth_map: np.ndarray,
+        masks: Sequence,
+        focal_length_x: Optional[float] = None,
+        focal_length_y: Optional[float] = None,
+    ) -> List[float]:
+        """
+        List form of iter_volumes_by_height.
+        """
+        return list(self.iter_volumes_by_height(width, height, depth_map, masks, focal_length_x, focal_length_y))
+
+    def iter_volumes_by_height(
+        self,
+        width: int,
+        height: int,
+        depth_map: np.ndarray,
+        masks: Sequence,
+        focal_length_x: Optional[float] = None,
+        focal_length_y: Optional[float] = None,
+    ) -> Iterator[float]:
+        """
+        Integrate, for every mask, the height of each pixel above the support plane times
+        the area that pixel covers on the plane.
+
+        With the plane n.P + d = 0 (|n| = 1, n pointing away from the camera) and the pixel ray
+        r = (x, y, 1), a pixel covers d^2 / (fx * fy * |n.r|^3) square meters of the plane and
+        the food surface point P = r * z sits -(n.P + d) meters above it.
+        """
+        if len(masks) == 0:
+            return
+        width, height = int(width), int(height)
+        fx = focal_length_x or self.focal_length_x
+        fy = focal_length_y or self.focal_length_y
+        x, y = ray_grid(width, height, fx, fy)
+        z = np.asarray(depth_map, dtype=np.float32)
+
+        boxes = [mask_box_crop(mask) for mask in masks]
+        background_rows, background_cols, food_depths = self.sample_background(z, boxes)
+        normal, offset = self.estimate_support_plane(x, y, z, background_rows, background_cols, food_depths)
+        area_scale = offset ** 2 / (fx * fy)
+
+        # Height x footprint over each mask's box only; the rays are separable, so no
+        # full-frame or per-pixel index arrays are built
+        for box in boxes:
+            if box is None:
+                yield 0.0
+                continue
+            x1, y1, x2, y2, crop = box
+            n_dot_r = normal[0] * x[np.newaxis, x1:x2] + normal[1] * y[y1:y2, np.newaxis] + normal[2]
+            heights = np.clip(-(n_dot_r * z[y1:y2, x1:x2] + offset), 0.0, None)
+            contribution = heights * area_scale / np.abs(n_dot_r) ** 3
+            yield float(contribution[crop].sum(dtype=np.float64))
+
+    def estimate_support_plane(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        z: np.ndarray,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        food_depths: np.ndarray,
+    ) -> Tuple[np.ndarray, float]:
+        """
+        Fit the plate/table plane to the sampled background (unmasked) pixels (rows, cols)
+        with an iteratively trimmed least-squares fit. Falls back to a fronto-parallel plane
+        behind the food when there is too little background or the fit is implausible.
+        Returns (unit normal pointing away from the camera, offset d).
+        """
+        if len(rows) >= self.min_plane_points:
+            zs = z[rows, cols]
+            points = np.stack((x[cols] * zs, y[rows] * zs, zs), axis=-1).astype(np.float64)
+
+            keep = np.ones(len(points), dtype=bool)
+            for _ in range(3):
+                centroid = points[keep].mean(axis=0)
+                _, _, vh = np.linalg.svd(points[keep] - centroid, full_matrices=False)
+                normal = vh[-1]
+                residuals = np.abs((points - centroid) @ normal)
+                threshold = 2.5 * np.median(residuals[keep]) + 1e-6
+                keep = residuals <= threshold
+                if keep.sum() < 3:
+                    break
+
+            if normal[2] < 0:
+                normal = -normal
+            # Reject planes nearly parallel to the viewing direction
+            if normal[2] > 0.2:
+                return normal.astype(np.float32), float(-normal @ centroid)
+
+        depth = np.percentile(food_depths, 95) if len(food_depths) else float(z.max())
+        return np.array([0.0, 0.0, 1.0], dtype=np.float32), -float(depth)
+
+    def sample_background(self, z: np.ndarray, boxes: List) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sample the frame on a regular grid of about 2 * max_plane_samples pixels and split it
+        with the mask box crops. Returns (rows, cols) of up to max_plane_samples background
+        pixels and the depths of the grid pixels that fall on food (for the fallback plane).
+        """
+        height, width = z.shape
+        step = max(1, int(np.sqrt(height * width / (2 * self.max_plane_samples))))
+        grid_rows = np.arange(0, height, step)
+        grid_cols = np.arange(0, width, step)
+        on_food = np.zeros((len(grid_rows), len(grid_cols)), dtype=bool)
+        for box in boxes:
+            if box is None:
+                continue
+            x1, y1, x2, y2, crop = box
+            r1, r2 = np.searchsorted(grid_rows, (y1, y2))
+            c1, c2 = np.searchsorted(grid_cols, (x1, x2))
+            on_food[r1:r2, c1:c2] |= crop[grid_rows[r1:r2, np.newaxis] - y1, grid_cols[np.newaxis, c1:c2] - x1]
+
+        food_rows, food_cols = np.nonzero(on_food)
+        food_depths = z[grid_rows[food_rows], grid_cols[food_cols]]
+        rows, cols = np.nonzero(~on_food)
+        if len(rows) > self.max_plane_samples:
+            picked = np.linspace(0, len(rows) - 1, self.max_plane_samples).astype(np.int64)
+            rows, cols = rows[picked], cols[picked]
+        return grid_rows[rows], grid_cols[cols], food_depths
+
+
+def mask_box_crop(mask) -> Optional[Tuple[int, int, int, int, np.ndarray]]:
+    """
+    (x1, y1, x2, y2, boolean crop) of a CompactMask or a full-frame binary mask, or None for
+    an empty mask. Full-frame masks are cropped to the bounding box of their pixels.
+    """
+    if isinstance(mask, CompactMask):
+        x1, y1, x2, y2 = mask.box
+        return x1, y1, x2, y2, mask.crop > 0
+    mask = np.asarray(mask)
+    row_hits = np.flatnonzero(mask.any(axis=1))
+    if len(row_hits) == 0:
+        return None
+    col_hits = np.flatnonzero(mask.any(axis=0))
+    y1, y2 = int(row_hits[0]), int(row_hits[-1]) + 1
+    x1, x2 = int(col_hits[0]), int(col_hits[-1]) + 1
+    return x1, y1, x2, y2, mask[y1:y2, x1:x2] > 0
+
+
+def mask_pixels(mask) -> Tuple[np.ndarray, np.ndarray]:
+    """(rows, cols) of the pixels of a CompactMask or a full-frame binary mask."""
+    if isinstance(mask, CompactMask):
+        return mask.nonzero()
+    return np.nonzero(np.asarray(mask) > 0)
+
+
+@lru_cache(maxsize=16)
+def ray_grid(width: int, height: int, focal_length_x: float, focal_length_y: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalized camera ray coordinates for an image size and focal length, cached per key.
+    The grid is separable, so it is stored as a float32 x row (width,) and y column (height,);
+    the ray of pixel (row, col) is (x[col], y[row], 1).
+    """
+    x = (np.arange(width, dtype=np.float32) - width / 2) / np.float32(focal_length_x)
+    y = (np.arange(height, dtype=np.float32) - height / 2) / np.float32(focal_length_y)
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return x, y
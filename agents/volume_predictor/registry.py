@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .volume_predictor import VolumePredictor, Prediction
+
+CHECKPOINT_DIR = Path(__file__).parent.parent / "checkpoints"
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the vision models.
+    The VolumePredictor (YOLOv8-seg ONNX session + Depth Anything V2 weights) is built
+    once per worker on first use and shared by every request afterwards.
+    """
+    def __init__(
+        self,
+        checkpoint_dir: Path = CHECKPOINT_DIR,
+        dav2_type: str = "vits",
+        dav2_backend: str = "torch",
+        dav2_intra_op_threads: Optional[int] = None,
+        precision: str = "fp32",
+        yolo_intra_op_threads: Optional[int] = None,
+        concurrent: bool = False,
+        volume_method: str = "hull",
+        working_long_side: Optional[int] = None,
+        device_table_path: Optional[str] = None,
+        warmup_size: tuple = (640, 480),
+    ):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.dav2_type = dav2_type
+        self.dav2_backend = dav2_backend
+        self.dav2_intra_op_threads = dav2_intra_op_threads
+        self.precision = precision
+        self.yolo_intra_op_threads = yolo_intra_op_threads
+        self.concurrent = concurrent
+        self.volume_method = volume_method
+        self.working_long_side = working_long_side
+        self.device_table_path = device_table_path
+        self.warmup_size = warmup_size
+
+        self._lock = threading.Lock()
+        self._predictor: Optional[VolumePredictor] = None
+        self._ready = False
+        self.failed = False  # warm-up gave up after all retries; the process needs a restart
+        self.load_time_ms: Optional[float] = None
+        self.warmup_time_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def config(self) -> Dict[str, Any]:
+        """Constructor arguments, so worker processes can build an identical registry."""
+        return {
+            "checkpoint_dir": self.checkpoint_dir,
+            "dav2_type": self.dav2_type,
+            "dav2_backend": self.dav2_backend,
+            "dav2_intra_op_threads": self.dav2_intra_op_threads,
+            "precision": self.precision,
+            "yolo_intra_op_threads": self.yolo_intra_op_threads,
+            "concurrent": self.concurrent,
+            "volume_method": self.volume_method,
+            "working_long_side": self.working_long_side,
+            "device_table_path": self.device_table_path,
+            "warmup_size": self.warmup_size,
+        }
+
+    @property
+    def is_ready(self) -> bool:
+        """True once the models are loaded and a warm-up inference has completed."""
+        return self._ready
+
+    def get_predictor(self) -> VolumePredictor:
+        """
+        Return the shared VolumePredictor, loading it on first call.
+        """
+        if self._predictor is None:
+            with self._lock:
+                if self._predictor is None:
+                    start = time.perf_counter()
+                    self._predictor = VolumePredictor(
+                        yolo_path=str(self.checkpoint_dir / "yolov8_foodseg103.onnx"),
+                        dav2_path=str(self.checkpoint_dir / "depth_anything_v2_metric_hypersim_vits.pth"),
+                        dav2_type=self.dav2_type,
+                        dav2_backend=self.dav2_backend,
+                        dav2_intra_op_threads=self.dav2_intra_op_threads,
+                        precision=self.precision,
+                        yolo_intra_op_threads=self.yolo_intra_op_threads,
+                        concurrent=self.concurrent,
+                        volume_method=self.volume_method,
+                        working_long_side=self.working_long_side,
+                        device_table_path=self.device_table_path,
+                    )
+                    self.load_time_ms = (time.perf_counter() - start) * 1000
+        return self._predictor
+
+    def fingerprint(self) -> str:
+        """Fingerprint of the loaded predictor, used as part of result cache keys."""
+        return self.get_predictor().fingerprint()
+
+    def warm_up(self) -> bool:
+        """
+        Load the models and run one inference on a blank image so that lazy
+        allocations (ONNX Runtime arenas, torch kernels) happen before traffic arrives.
+        Returns whether the registry is ready.
+        """
+        try:
+            predictor = self.get_predictor()
+            start = time.perf_counter()
+            dummy = Image.fromarray(np.zeros((self.warmup_size[1], self.warmup_size[0], 3), dtype=np.uint8))
+            predictor.predict(dummy)
+            self.warmup_time_ms = (time.perf_counter() - start) * 1000
+            self.last_error = None
+            self._ready = True
+            print(f"Vision models warmed up: load={self.load_time_ms:.2f} ms, warm-up={self.warmup_time_ms:.2f} ms")
+        except Exception as e:
+            self.last_error = str(e)
+            self._ready = False
+            print(f"Model warm-up failed: {e}")
+        return self._ready
+
+    def warm_up_with_retry(self, attempts: int = 3, backoff_s: float = 5.0) -> bool:
+        """
+        warm_up, retried with exponential backoff (backoff_s, 2 * backoff_s, ...) for
+        transient failures such as a checkpoint still being mounted. If every attempt fails
+        the registry is marked failed, so the liveness probe can get the pod restarted
+        instead of it staying unready forever.
+        """
+        for attempt in range(1, attempts + 1):
+            if self.warm_up():
+                self.failed = False
+                return True
+            if attempt < attempts:
+                delay = backoff_s * 2 ** (attempt - 1)
+                print(f"Retrying model warm-up in {delay:.0f}s ({attempt}/{attempts} attempts failed)")
+                time.sleep(delay)
+        self.failed = True
+        print(f"Model warm-up failed after {attempts} attempts, giving up")
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self._ready,
+            "failed": self.failed,
+            "loaded": self._predictor is not None,
+            "dav2_backend": self.dav2_backend,
+            "precision": self.precision,
+            "concurrent": self.concurrent,
+            "volume_method": self.volume_method,
+            "working_long_side": self.working_long_side,
+            "load_time_ms": self.load_time_ms,
+            "warmup_time_ms": self.warmup_time_ms,
+            "error": self.last_error,
+        }
+
+
+def serialize_predictions(predictions: List[Prediction]) -> List[Dict[str, Any]]:
+    """
+    Convert Prediction dataclasses into the JSON items returned by the API and tools.
+    """
+    result_items = []
+    for pred in predictions:
+        result_items.append({
+            "object_name": pred.object_name,
+            "volume_m3": pred.volume,
+            "weight_g": pred.weight,
+            "density_g_per_cm3": pred.density,
+            "score": pred.score,
+            "box": pred.box,
+        })
+    return result_items
+
+
+model_registry = ModelRegistry(
+    checkpoint_dir=Path(os.getenv("CHECKPOINT_DIR", str(CHECKPOINT_DIR))),
+    dav2_backend=os.getenv("DAV2_BACKEND", "torch"),
+    dav2_intra_op_threads=int(os.getenv("DAV2_INTRA_OP_THREADS", "0")) or None,
+    precision=os.getenv("MODEL_PRECISION", "fp32"),
+    yolo_intra_op_threads=int(os.getenv("YOLO_INTRA_OP_THREADS", "0")) or None,
+    concurrent=os.getenv("CONCURRENT_INFERENCE", "false").lower() == "true",
+    volume_method=os.getenv("VOLUME_METHOD", "hull"),
+    working_long_side=int(os.getenv("WORKING_LONG_SIDE", "1024")) or None,
+    device_table_path=os.getenv("CAMERA_DEVICE_TABLE"),
+)
@@ -2,20 +2,38 @@ import numpy as np
 from PIL import Image
 import cv2
 import time
-from .yolov8 import YOLOv8Seg
+import logging
+import hashlib
+import json
+from .yolov8 import YOLOv8Seg, CompactMask
 from .yolov8.density_map import density_map
 from .yolov8.utils import class_names
-from .depth_estimator import DepthEstimator
+from .depth_estimator import DepthEstimator, export_depth_anything_onnx
 from .point_cloud_generator import PointCloudGenerator
+from . import image_io
+from .image_io import LoadedImage
+from .intrinsics import CameraIntrinsics, IntrinsicsResolver
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from huggingface_hub import hf_hub_download
 
+logger = logging.getLogger(__name__)
+
+
+# Precision profiles selectable at construction time
+PRECISION_PROFILES = ("fp32", "int8")
+
+
+def quantized_model_path(onnx_path: str) -> str:
+    """Path of the INT8 variant of an ONNX model, e.g. model.onnx -> model.int8.onnx."""
+    return os.path.splitext(onnx_path)[0] + ".int8.onnx"
+
 
 @dataclass
 class Prediction:
@@ -23,17 +41,35 @@ class Prediction:
     volume: float
     box: List
     score: float
-    mask: np.ndarray
+    mask: CompactMask  # np.asarray(mask) gives the full-frame uint8 mask
     weight: float
     density: float
 
 
+def checkpoint_stat(path: str) -> str:
+    """path:size:mtime of a checkpoint, part of the predictor fingerprint."""
+    try:
+        stat = os.stat(path)
+        return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return f"{path}:missing"
+
+
 class VolumePredictor():
     def __init__(
         self,
         yolo_path: str,
         dav2_path: str,
         dav2_type: str,
+        dav2_backend: str = "torch",
+        dav2_intra_op_threads: Optional[int] = None,
+        dav2_inter_op_threads: Optional[int] = None,
+        precision: str = "fp32",
+        yolo_intra_op_threads: Optional[int] = None,
+        concurrent: bool = False,
+        volume_method: str = "hull",
+        working_long_side: Optional[int] = None,
+        device_table_path: Optional[str] = None,
         focal_length_x = 470.4, 
         focal_length_y = 470.4, 
         conf = 0.25,
@@ -61,55 +97,303 @@ class VolumePredictor():
         self.yolo_path = yolo_model_local_path
         self.dav2_path = dav2_model_local_path
 
-        self.depth_estimator = DepthEstimator(dav2_path, model_type=dav2_type)
-        self.pc_generator = PointCloudGenerator(focal_length_x, focal_length_y)
-        self.yolo = YOLOv8Seg(yolo_path, conf_thres=conf, iou_thres=iou)
+        if precision not in PRECISION_PROFILES:
+            raise ValueError(f"Unsupported precision profile: {precision} (expected one of {list(PRECISION_PROFILES)})")
+        self.precision = precision
+
+        # The INT8 profile runs quantized ONNX graphs produced by utils/quantize_models.py
+        if precision == "int8":
+            dav2_backend = "onnx"
+            yolo_path = quantized_model_path(yolo_path)
+            dav2_onnx_path = quantized_model_path(os.path.splitext(dav2_path)[0] + ".onnx")
+            for path in (yolo_path, dav2_onnx_path):
+                if not os.path.exists(path):
+                    raise FileNotFoundError(
+                        f"INT8 model not found: {path}. Run utils/quantize_models.py to build the int8 profile."
+                    )
+            dav2_path = dav2_onnx_path
+        # The ONNX backend runs a graph exported from the .pth checkpoint, exported once on first use
+        elif dav2_backend == "onnx":
+            dav2_onnx_path = os.path.splitext(dav2_path)[0] + ".onnx"
+            if not os.path.exists(dav2_onnx_path):
+                export_depth_anything_onnx(dav2_path, dav2_onnx_path, model_type=dav2_type)
+            dav2_path = dav2_onnx_path
+
+        # Checkpoints actually loaded, stat'ed before loading so the fingerprint describes
+        # exactly the weights held in memory
+        self.model_paths = (yolo_path, dav2_path)
+        checkpoint_stats = [checkpoint_stat(path) for path in self.model_paths]
+
+        self.depth_estimator = DepthEstimator(
+            dav2_path,
+            model_type=dav2_type,
+            backend=dav2_backend,
+            intra_op_num_threads=dav2_intra_op_threads,
+            inter_op_num_threads=dav2_inter_op_threads,
+        )
+        self.pc_generator = PointCloudGenerator(focal_length_x, focal_length_y, method=volume_method)
+        # focal_length_x/y are the fallback for 640 px wide images without EXIF or a known device
+        self.intrinsics_resolver = IntrinsicsResolver(
+            focal_length_x, focal_length_y, device_table_path=device_table_path
+        )
+        # Long side (px) the whole pipeline runs at; None keeps the uploaded resolution
+        self.working_long_side = working_long_side
+        self.yolo = YOLOv8Seg(
+            yolo_path, conf_thres=conf, iou_thres=iou, intra_op_num_threads=yolo_intra_op_threads
+        )
         self.conf = conf
         self.iou = iou
-        
-    def predict(self, img: [str, bytes, Image.Image]) -> List[Prediction]:
+        self.dav2_backend = dav2_backend
+        self._fingerprint = self._compute_fingerprint(checkpoint_stats)
+
+        # Depth estimation and segmentation are independent, so in concurrent mode they run
+        # side by side; give each model its own thread budget to avoid oversubscribing cores.
+        self.executor = (
+            ThreadPoolExecutor(max_workers=2, thread_name_prefix="volume-predictor")
+            if concurrent else None
+        )
+
+    def fingerprint(self) -> str:
+        """
+        Identifier of everything that changes predictions for a given image: the loaded
+        checkpoints (path, size, mtime when they were loaded) and the inference settings.
+        It is fixed for the lifetime of the predictor: a checkpoint replaced on disk is only
+        picked up, with a new fingerprint, when the models are loaded again (restart).
+        """
+        return self._fingerprint
+
+    def _compute_fingerprint(self, checkpoint_stats: List[str]) -> str:
+        parts = [
+            self.precision, self.dav2_backend, self.conf, self.iou, self.pc_generator.method,
+            self.working_long_side, self.pc_generator.focal_length_x, self.pc_generator.focal_length_y,
+            *checkpoint_stats,
+        ]
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+    def predict(self, img: [str, bytes, BytesIO, Image.Image]) -> List[Prediction]:
+        predictions, _ = self.predict_with_timings(img)
+        return predictions
+
+    def predict_with_timings(self, img: [str, bytes, BytesIO, Image.Image]) -> Tuple[List[Prediction], Dict[str, float]]:
+        """
+        Run the full pipeline and return the predictions with per-stage timings (ms).
+        In concurrent mode depth estimation and segmentation overlap, so the critical
+        path is decode + max(depth, segmentation) + volume instead of their sum.
+        """
         start = time.perf_counter()
+        rgb_image, scale, intrinsics = self._load(img)
+        decode_ms = (time.perf_counter() - start) * 1000
+
+        predictions, timings = self.predict_decoded_with_timings(rgb_image, scale, intrinsics)
+        timings = {
+            "decode_ms": decode_ms,
+            **timings,
+            "critical_path_ms": decode_ms + timings["critical_path_ms"],
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+        logger.info(
+            "VolumePredictor %s: %s",
+            "concurrent" if self.executor is not None else "sequential",
+            ", ".join(f"{k}={v:.2f}" for k, v in timings.items()),
+        )
+        return predictions, timings
 
-        if isinstance(img, str):
-            rgb_image = Image.open(img).convert("RGB")
-        elif isinstance(img, (bytes, bytearray)):
-            rgb_image = Image.open(BytesIO(img)).convert("RGB")
-        elif isinstance(img, Image.Image):
-            rgb_image = img.convert("RGB")
+    def predict_decoded_with_timings(
+        self, rgb_image: np.ndarray, scale: float, intrinsics: CameraIntrinsics
+    ) -> Tuple[List[Prediction], Dict[str, float]]:
+        """
+        Run the models on an image already decoded at working resolution (see prepare_image).
+        Timings exclude decoding.
+        """
+        start = time.perf_counter()
+        height, width = rgb_image.shape[:2]
+        if self.executor is not None:
+            depth_future = self.executor.submit(_timed, self._estimate_depth, rgb_image, width, height)
+            seg_future = self.executor.submit(_timed, self._segment, rgb_image, width, height)
+            depth_map, depth_ms = depth_future.result()
+            (boxes, scores, class_ids, masks), seg_ms = seg_future.result()
+            inference_ms = max(depth_ms, seg_ms)
         else:
-            raise ValueError("Input img must be a file path (str), bytes, or a PIL.Image.Image.")
+            depth_map, depth_ms = _timed(self._estimate_depth, rgb_image, width, height)
+            (boxes, scores, class_ids, masks), seg_ms = _timed(self._segment, rgb_image, width, height)
+            inference_ms = depth_ms + seg_ms
 
-        width, height = rgb_image.size
-        rgb_image = np.array(rgb_image)
+        volumes, volume_ms = _timed(self._calculate_volumes, width, height, depth_map, masks, intrinsics)
+        predictions = self._build_predictions(boxes, scores, class_ids, masks, volumes, scale)
 
-        dav2_start = time.perf_counter()
-        depth_map = self.depth_estimator.predict(rgb_image)
-        print(f"Depth Anything Model v2 Inference time: {(time.perf_counter() - dav2_start)*1000:.2f} ms")
-        depth_map = np.array(Image.fromarray(depth_map).resize((width, height), Image.NEAREST))
-        print("Depth map has been created")
-        
-        boxes, scores, class_ids, masks = self.yolo(rgb_image)
-        print("Segmentation masks has been created")
-        fixed_masks = []
-        for m in masks:
-            m_resized = cv2.resize(
-                m.astype(np.uint8), 
-                (width, height), interpolation=cv2.INTER_NEAREST)
-            fixed_masks.append(m_resized)
-        masks = np.array(fixed_masks)
-        
-        volumes = self.pc_generator.calculate_volumes_from_masks(
-            width, height, depth_map, masks
+        timings = {
+            "depth_ms": depth_ms,
+            "segmentation_ms": seg_ms,
+            "volume_ms": volume_ms,
+            "critical_path_ms": inference_ms + volume_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+        return predictions, timings
+
+    def predict_stages(self, img: [str, bytes, BytesIO, Image.Image]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run the pipeline stage by stage, yielding (event, data) as each stage finishes:
+        - "decoded": image sizes and decode_ms
+        - "depth": depth_ms
+        - "masks": the detections (object name, score, box) and segmentation_ms
+        - "volume": one event per detection with its Prediction, in detection order
+        - "done": all predictions and the stage timings
+        Segmentation runs before depth in sequential mode so detections are available first;
+        in concurrent mode whichever model finishes first is reported first.
+        """
+        start = time.perf_counter()
+        rgb_image, scale, intrinsics = self._load(img)
+        height, width = rgb_image.shape[:2]
+        timings = {"decode_ms": (time.perf_counter() - start) * 1000}
+        yield "decoded", {
+            "width": round(width / scale),
+            "height": round(height / scale),
+            "working_width": width,
+            "working_height": height,
+            "decode_ms": timings["decode_ms"],
+        }
+
+        if self.executor is not None:
+            futures = {
+                self.executor.submit(_timed, self._segment, rgb_image, width, height): "segmentation",
+                self.executor.submit(_timed, self._estimate_depth, rgb_image, width, height): "depth",
+            }
+            stages = ((futures[future], future.result()) for future in as_completed(futures))
+        else:
+            stages = (
+                (stage, _timed(fn, rgb_image, width, height))
+                for stage, fn in (("segmentation", self._segment), ("depth", self._estimate_depth))
+            )
+
+        for stage, (output, elapsed_ms) in stages:
+            if stage == "depth":
+                depth_map = output
+                timings["depth_ms"] = elapsed_ms
+                yield "depth", {"depth_ms": elapsed_ms}
+            else:
+                boxes, scores, class_ids, masks = output
+                timings["segmentation_ms"] = elapsed_ms
+                yield "masks", {
+                    "detections": [
+                        {
+                            "index": i,
+                            "object_name": self._object_name(class_ids[i]),
+                            "score": float(scores[i]),
+                            "box": [float(v) / scale for v in boxes[i]],
+                        }
+                        for i in range(len(boxes))
+                    ],
+                    "segmentation_ms": elapsed_ms,
+                }
+
+        volume_start = time.perf_counter()
+        predictions = []
+        volumes = self.pc_generator.iter_volumes_from_masks(
+            width, height, depth_map, masks,
+            focal_length_x=intrinsics.focal_length_x,
+            focal_length_y=intrinsics.focal_length_y,
+        )
+        for i, volume in enumerate(volumes):
+            prediction = self._build_predictions(
+                boxes[i:i + 1], scores[i:i + 1], class_ids[i:i + 1], masks[i:i + 1], [volume], scale
+            )[0]
+            predictions.append(prediction)
+            yield "volume", {"index": i, "prediction": prediction}
+        timings["volume_ms"] = (time.perf_counter() - volume_start) * 1000
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        yield "done", {"predictions": predictions, "timings": timings}
+
+    def predict_batch(self, images: List[Union[str, bytes, BytesIO, Image.Image]]) -> List[List[Prediction]]:
+        """
+        Predict several images at once, returning one list of predictions per input image.
+        Depth inputs are stacked per aspect-ratio bucket and YOLOv8-seg runs with a batch dimension.
+        """
+        start = time.perf_counter()
+        loaded = [self._load(img) for img in images]
+        if not loaded:
+            return []
+        results = self.predict_decoded_batch(
+            [rgb_image for rgb_image, _, _ in loaded],
+            [scale for _, scale, _ in loaded],
+            [camera for _, _, camera in loaded],
         )
+        logger.info(
+            "VolumePredictor batch of %d images: total_ms=%.2f",
+            len(images), (time.perf_counter() - start) * 1000,
+        )
+        return results
+
+    def predict_decoded_batch(
+        self,
+        rgb_images: List[np.ndarray],
+        scales: List[float],
+        intrinsics: List[CameraIntrinsics],
+    ) -> List[List[Prediction]]:
+        """Batched counterpart of predict_decoded_with_timings, for images already decoded."""
+        if self.executor is not None:
+            depth_future = self.executor.submit(self.depth_estimator.predict_batch, rgb_images)
+            seg_future = self.executor.submit(self.yolo.segment_batch, rgb_images)
+            depth_maps, segmentations = depth_future.result(), seg_future.result()
+        else:
+            depth_maps = self.depth_estimator.predict_batch(rgb_images)
+            segmentations = self.yolo.segment_batch(rgb_images)
+
+        results = []
+        for rgb_image, scale, camera, depth_map, (boxes, scores, class_ids, masks) in zip(
+            rgb_images, scales, intrinsics, depth_maps, segmentations
+        ):
+            height, width = rgb_image.shape[:2]
+            volumes = self._calculate_volumes(width, height, depth_map, masks, camera)
+            results.append(self._build_predictions(boxes, scores, class_ids, masks, volumes, scale))
+        return results
+
+    @staticmethod
+    def load_image(img: [str, bytes, BytesIO, Image.Image]) -> Image.Image:
+        """Decode an input at full resolution as upright RGB."""
+        return image_io.load_image(img).image
+
+    def _load(self, img) -> Tuple[np.ndarray, float, CameraIntrinsics]:
+        """
+        Decode an input at working resolution and resolve its camera intrinsics.
+        Returns the RGB array, the scale factor and the intrinsics at working resolution.
+        """
+        return prepare_image(img, self.working_long_side, self.intrinsics_resolver)
 
+    def _calculate_volumes(
+        self, width: int, height: int, depth_map: np.ndarray, masks, intrinsics: CameraIntrinsics
+    ) -> List[float]:
+        # The intrinsics are already scaled to the working resolution, so volumes are the
+        # same as at the original resolution (the depth map is metric and scale-free)
+        return self.pc_generator.calculate_volumes_from_masks(
+            width, height, depth_map, masks,
+            focal_length_x=intrinsics.focal_length_x,
+            focal_length_y=intrinsics.focal_length_y,
+        )
+
+    def _estimate_depth(self, rgb_image: np.ndarray, width: int, height: int) -> np.ndarray:
+        depth_map = self.depth_estimator.predict(rgb_image)
+        return np.array(Image.fromarray(depth_map).resize((width, height), Image.NEAREST))
+
+    def _segment(self, rgb_image: np.ndarray, width: int, height: int):
+        # Masks come back as CompactMask crops already in the rgb_image frame
+        return self.yolo(rgb_image)
+
+    @staticmethod
+    def _object_name(class_id) -> str:
+        if class_id < len(class_names):
+            return class_names[class_id]
+        return str(class_id)
+
+    def _build_predictions(self, boxes, scores, class_ids, masks, volumes, scale: float = 1.0) -> List[Prediction]:
+        """
+        Boxes are mapped back to original image coordinates; masks stay at working
+        resolution (mask.to_full((width, height)) upsamples one to the original size).
+        """
         predictions = []
         num_preds = min(len(boxes), len(volumes), len(scores), len(class_ids), len(masks))
         for i in range(num_preds):
             # Get the class name for the predicted class_id
-            if class_ids[i] < len(class_names):
-                object_name = class_names[class_ids[i]]
-            else:
-                object_name = str(class_ids[i])
+            object_name = self._object_name(class_ids[i])
 
             # Try to get density from density_map using the object_name 
             density = None
@@ -127,13 +411,59 @@ class VolumePredictor():
             prediction = Prediction(
                 object_name=object_name,
                 volume=vol,
-                box=boxes[i].tolist() if hasattr(boxes[i], "tolist") else list(boxes[i]),
+                box=[float(v) / scale for v in boxes[i]],
                 score=float(scores[i]),
                 mask=masks[i],
                 weight=weight,
                 density=density
             )
             predictions.append(prediction)
-
-        print(f"Pipeline Inference time: {(time.perf_counter() - start)*1000:.2f} ms")
         return predictions
+
+
+def prepare_image(
+    img: [str, bytes, BytesIO, Image.Image],
+    working_long_side: Optional[int],
+    intrinsics_resolver: IntrinsicsResolver,
+) -> Tuple[np.ndarray, float, CameraIntrinsics]:
+    """
+    Decode an input at working resolution and resolve its camera intrinsics.
+    Returns the RGB array, the scale factor and the intrinsics at working resolution.
+    """
+    loaded = image_io.load_image(img, working_long_side)
+    rgb_image, scale = to_working_size(loaded, working_long_side)
+    intrinsics = intrinsics_resolver.resolve(loaded).scaled(scale)
+    logger.debug(
+        "Intrinsics (%s): fx=%.1f fy=%.1f at %dx%d",
+        intrinsics.source, intrinsics.focal_length_x, intrinsics.focal_length_y,
+        rgb_image.shape[1], rgb_image.shape[0],
+    )
+    return rgb_image, scale, intrinsics
+
+
+def to_working_size(loaded: LoadedImage, working_long_side: Optional[int]) -> Tuple[np.ndarray, float]:
+    """
+    Bring a decoded image to the working resolution (long side working_long_side).
+    JPEGs usually arrive already reduced by draft-mode decoding, so this is a small resize.
+    Returns the RGB array and the scale factor relative to the original photo (<= 1).
+    """
+    image = loaded.image
+    width, height = loaded.original_size
+    long_side = max(width, height)
+    if not working_long_side or long_side <= working_long_side:
+        if image.size != loaded.original_size:
+            image = image.resize(loaded.original_size, Image.BILINEAR)
+        return np.array(image), 1.0
+    scale = working_long_side / long_side
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if image.size != size:
+        # reducing_gap lets PIL shrink by an integer factor first, which is much cheaper on large photos
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return np.array(image), scale
+
+
+def _timed(fn, *args):
+    """Call fn(*args) and return (result, elapsed ms)."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
@@ -0,0 +1,479 @@
+import asyncio
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .intrinsics import CameraIntrinsics, IntrinsicsResolver
+from .registry import ModelRegistry, model_registry
+from .volume_predictor import Prediction, prepare_image
+from utils.executors import inference_executor, run_io
+from utils.micro_batcher import QueueFullError
+
+
+@dataclass
+class PendingTask:
+    future: Future
+    blocks: List[shared_memory.SharedMemory] = field(default_factory=list)
+    worker_id: Optional[int] = None  # set once a worker picks the task up
+    result_block: Optional[str] = None  # name of the block the worker writes the masks into
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+class InferenceWorkerPool:
+    """
+    Pool of inference processes, each holding one VolumePredictor.
+
+    The API process decodes uploads at working resolution and writes the RGB arrays into
+    multiprocessing.shared_memory blocks; only the block names and a few scalars cross the
+    process boundary. Workers map the blocks without copying and run the models. On the way
+    back, the mask bits of all predictions of a task are written into one shared memory block
+    created by the worker; the pickled predictions carry only offsets and shapes, and the API
+    process copies the bits out and unlinks the block.
+    The API process itself never loads the models.
+
+    A monitor thread watches the worker processes: when one dies (OOM, native crash), the
+    task it was running is failed, its shared memory is released, it leaves ready_workers
+    (so /ready reports the pool as degraded) and a replacement is spawned. Tasks left
+    pending past the timeout, whose callers have given up, are released as well.
+    """
+    def __init__(
+        self,
+        num_workers: int,
+        registry_config: Dict[str, Any],
+        max_pending: int = 64,
+        timeout_s: float = 120.0,
+        monitor_interval_s: float = 1.0,
+    ):
+        self.num_workers = num_workers
+        self.registry_config = registry_config
+        self.max_pending = max_pending
+        self.timeout_s = timeout_s
+        self.monitor_interval_s = monitor_interval_s
+        self.working_long_side = registry_config.get("working_long_side")
+        self.intrinsics_resolver = IntrinsicsResolver(device_table_path=registry_config.get("device_table_path"))
+
+        self._ctx = mp.get_context("spawn")  # fork would copy the parent's ONNX/torch thread state
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._pending: Dict[int, PendingTask] = {}
+        self._processes: Dict[int, mp.Process] = {}  # worker id -> process
+        self._collector: Optional[threading.Thread] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._load_failed: set = set()  # worker ids whose models failed to load; not respawned
+
+        self.ready_workers: Dict[int, int] = {}  # worker id -> pid
+        self.fingerprint: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.worker_deaths = 0
+        self.expired = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._processes)
+
+    @property
+    def is_ready(self) -> bool:
+        return len(self.ready_workers) == self.num_workers
+
+    @property
+    def failed(self) -> bool:
+        """A worker could not load its models; it is not respawned, so the pool never gets ready."""
+        return bool(self._load_failed)
+
+    def start(self) -> None:
+        """Spawn the workers; each loads and warms up its models in the background."""
+        if self.started:
+            return
+        self._stopping.clear()
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id)
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="inference-monitor", daemon=True)
+        self._monitor.start()
+
+    def _spawn(self, worker_id: int) -> None:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.registry_config, self._tasks, self._results),
+            name=f"inference-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def _watch(self) -> None:
+        """Detect dead workers, fail their tasks, respawn them; release expired tasks."""
+        while not self._stopping.wait(self.monitor_interval_s):
+            for worker_id, process in list(self._processes.items()):
+                if process.is_alive() or self._stopping.is_set():
+                    continue
+                self.ready_workers.pop(worker_id, None)
+                if worker_id in self._load_failed:
+                    continue
+                self.worker_deaths += 1
+                self.last_error = f"Inference worker {worker_id} (pid {process.pid}) exited with code {process.exitcode}"
+                print(f"{self.last_error}; respawning it")
+                self._fail_tasks(
+                    lambda task: task.worker_id == worker_id,
+                    RuntimeError(f"Inference worker {worker_id} died while running this task"),
+                )
+                self.restarts += 1
+                self._spawn(worker_id)
+
+            deadline = time.monotonic() - self.timeout_s
+            self.expired += self._fail_tasks(
+                lambda task: task.submitted_at < deadline,
+                TimeoutError(f"Inference task not finished after {self.timeout_s:.0f}s"),
+            )
+
+    def _fail_tasks(self, predicate, error: Exception) -> int:
+        with self._lock:
+            task_ids = [task_id for task_id, task in self._pending.items() if predicate(task)]
+            tasks = [self._pending.pop(task_id) for task_id in task_ids]
+        for task in tasks:
+            _release(task.blocks)
+            if task.result_block is not None:
+                # A worker that died after writing its results never sent them
+                _unlink(task.result_block)
+            if not task.future.done():
+                task.future.set_exception(error)
+        return len(tasks)
+
+    def submit_batch(self, images: List[Any]) -> Future:
+        """
+        Decode the images and queue them as one task for the next free worker.
+        The future resolves to one list of predictions (or an Exception) per image.
+        """
+        # The slot is reserved in the same critical section as the check, so concurrent
+        # submits can never overshoot max_pending
+        task = PendingTask(Future())
+        task_id = next(self._task_ids)
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(f"Inference pool queue is full ({self.max_pending} pending tasks)")
+            self._pending[task_id] = task
+
+        blocks, items = task.blocks, []
+        try:
+            for img in images:
+                rgb_image, scale, intrinsics = prepare_image(img, self.working_long_side, self.intrinsics_resolver)
+                block = shared_memory.SharedMemory(create=True, size=rgb_image.nbytes)
+                blocks.append(block)
+                np.ndarray(rgb_image.shape, dtype=np.uint8, buffer=block.buf)[:] = rgb_image
+                items.append((
+                    block.name, rgb_image.shape, scale,
+                    intrinsics.focal_length_x, intrinsics.focal_length_y, intrinsics.source,
+                ))
+        except Exception:
+            with self._lock:
+                self._pending.pop(task_id, None)
+            _release(blocks)
+            raise
+
+        self._tasks.put((task_id, items))
+        return task.future
+
+    def predict_batch(self, images: List[Any]) -> List[Any]:
+        return self.submit_batch(images).result(timeout=self.timeout_s)
+
+    def predict(self, img: Any) -> List[Any]:
+        result = self.predict_batch([img])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def predict_async(self, img: Any, run_blocking: Callable[..., Awaitable[Any]] = run_io) -> List[Any]:
+        """
+        Awaitable predict; decoding and the shared-memory copy run through run_blocking
+        (the I/O pool by default) so the event loop is never blocked.
+        """
+        future = await run_blocking(self.submit_batch, [img])
+        result = (await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_s))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _collect(self) -> None:
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            kind = message[0]
+            if kind == "ready":
+                _, worker_id, pid, fingerprint = message
+                self.ready_workers[worker_id] = pid
+                self.fingerprint = fingerprint
+                print(f"Inference worker {worker_id} (pid {pid}) ready")
+            elif kind == "failed":
+                _, worker_id, error = message
+                self._load_failed.add(worker_id)
+                self.last_error = error
+                print(f"Inference worker {worker_id} failed to load models: {error}")
+            elif kind == "started":
+                _, worker_id, pid, task_id = message
+                with self._lock:
+                    task = self._pending.get(task_id)
+                    if task is not None:
+                        task.worker_id = worker_id
+                        task.result_block = _result_block_name(pid, task_id)
+            elif kind == "result":
+                _, task_id, results, result_block, mask_refs = message
+                with self._lock:
+                    task = self._pending.pop(task_id, None)
+                if task is None:  # Already failed by stop() or the monitor
+                    if result_block is not None:
+                        _unlink(result_block)
+                    continue
+                _release(task.blocks)
+                try:
+                    results = _unpack_masks(results, result_block, mask_refs)
+                except Exception as unpack_err:
+                    results = [RuntimeError(f"Could not read inference results: {unpack_err}")] * len(results)
+                self.completed += 1
+                if not task.future.done():
+                    task.future.set_result(results)
+
+    def stop(self) -> None:
+        if not self.started:
+            return
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=10)
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._fail_tasks(lambda task: True, RuntimeError("Inference pool stopped"))
+        self._processes = {}
+        self.ready_workers = {}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "workers": self.num_workers,
+            "ready_workers": len(self.ready_workers),
+            "alive_workers": sum(process.is_alive() for process in self._processes.values()),
+            "pids": sorted(self.ready_workers.values()),
+            "pending": len(self._pending),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "worker_deaths": self.worker_deaths,
+            "restarts": self.restarts,
+            "error": self.last_error,
+        }
+
+
+def _release(blocks: List[shared_memory.SharedMemory]) -> None:
+    for block in blocks:
+        block.close()
+        try:
+            block.unlink()
+        except FileNotFoundError:  # Already released by another path (stop, monitor)
+            pass
+
+
+def _unlink(name: str) -> None:
+    try:
+        # A tracked attach, so the unlink in _release is balanced in the resource tracker
+        block = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    _release([block])
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map a block created by the API process; the creator stays responsible for unlinking it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block with the resource tracker,
+        # which would unlink it when this worker exits
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+def _create_untracked(name: str, size: int) -> shared_memory.SharedMemory:
+    """Create a block in a worker that the API process will unlink once it has read it."""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+def _result_block_name(pid: int, task_id: int) -> str:
+    # Derived from the worker pid and task id, so the API process can unlink it if the
+    # worker dies between writing the block and sending the result
+    return f"nutrilens-result-{pid}-{task_id}"
+
+
+def _pack_masks(outputs: List[Any], name: str) -> Tuple[List[Any], Optional[str], List[Tuple[int, Tuple[int, ...]]]]:
+    """
+    Move the mask bits of all predictions into one shared memory block (in output order).
+    Returns the outputs with bits-less masks, the block name (None without masks) and the
+    (offset, shape) of each mask's bits in the block.
+    """
+    masks = [
+        prediction.mask
+        for output in outputs if not isinstance(output, Exception)
+        for prediction in output
+    ]
+    size = sum(mask.bits.nbytes for mask in masks)
+    if size == 0:
+        return outputs, None, []
+    block = _create_untracked(name, size)
+    refs, offset = [], 0
+    try:
+        for mask in masks:
+            np.ndarray(mask.bits.shape, dtype=np.uint8, buffer=block.buf, offset=offset)[:] = mask.bits
+            refs.append((offset, mask.bits.shape))
+            offset += mask.bits.nbytes
+    except BaseException:
+        _release([block])
+        raise
+    block.close()
+    packed = [
+        output if isinstance(output, Exception)
+        else [replace(prediction, mask=replace(prediction.mask, bits=None)) for prediction in output]
+        for output in outputs
+    ]
+    return packed, name, refs
+
+
+def _unpack_masks(outputs: List[Any], name: Optional[str], refs: List[Tuple[int, Tuple[int, ...]]]) -> List[Any]:
+    """Copy the mask bits written by _pack_masks back into the predictions and unlink the block."""
+    if name is None:
+        return outputs
+    block = shared_memory.SharedMemory(name=name)  # this process unlinks it, see _unlink
+    try:
+        refs = iter(refs)
+        unpacked = []
+        for output in outputs:
+            if isinstance(output, Exception):
+                unpacked.append(output)
+                continue
+            predictions: List[Prediction] = []
+            for prediction in output:
+                offset, shape = next(refs)
+                bits = np.ndarray(shape, dtype=np.uint8, buffer=block.buf, offset=offset).copy()
+                predictions.append(replace(prediction, mask=replace(prediction.mask, bits=bits)))
+            unpacked.append(predictions)
+        return unpacked
+    finally:
+        _release([block])
+
+
+def _worker_main(worker_id: int, registry_config: Dict[str, Any], tasks, results) -> None:
+    registry = ModelRegistry(**registry_config)
+    if not registry.warm_up():
+        results.put(("failed", worker_id, registry.last_error))
+        return
+    predictor = registry.get_predictor()
+    results.put(("ready", worker_id, os.getpid(), predictor.fingerprint()))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, items = task
+        results.put(("started", worker_id, os.getpid(), task_id))
+        blocks = [_attach(name) for name, *_ in items]
+        try:
+            rgb_images = [
+                np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+                for block, (_, shape, *_) in zip(blocks, items)
+            ]
+            scales = [scale for _, _, scale, _, _, _ in items]
+            intrinsics = [CameraIntrinsics(fx, fy, source) for _, _, _, fx, fy, source in items]
+            try:
+                outputs = predictor.predict_decoded_batch(rgb_images, scales, intrinsics)
+            except Exception:
+                # Retry image by image so only the failing one gets an error
+                outputs = []
+                for args in zip(rgb_images, scales, intrinsics):
+                    try:
+                        outputs.append(predictor.predict_decoded_with_timings(*args)[0])
+                    except Exception as predict_err:
+                        outputs.append(RuntimeError(f"Error during prediction: {predict_err}"))
+            del rgb_images
+        finally:
+            for block in blocks:
+                block.close()
+        try:
+            outputs, result_block, mask_refs = _pack_masks(outputs, _result_block_name(os.getpid(), task_id))
+        except Exception:
+            # e.g. /dev/shm full: fall back to pickling the masks with the predictions
+            result_block, mask_refs = None, []
+        results.put(("result", task_id, outputs, result_block, mask_refs))
+
+
+def process_rss_mb(pid: int) -> float:
+    """Resident set size of a process in MB (Linux /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+
+# Only created when INFERENCE_WORKERS > 0; otherwise models run in the API process
+inference_pool = (
+    InferenceWorkerPool(
+        INFERENCE_WORKERS,
+        model_registry.config(),
+        max_pending=int(os.getenv("INFERENCE_MAX_PENDING", "64")),
+        timeout_s=float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "120")),
+    )
+    if INFERENCE_WORKERS > 0 else None
+)
+
+
+def predictor_fingerprint() -> str:
+    """Fingerprint of the predictor that serves requests: the pool's, or the in-process one."""
+    if inference_pool is not None:
+        if inference_pool.fingerprint is None:
+            raise RuntimeError("Inference workers are not ready yet")
+        return inference_pool.fingerprint
+    return model_registry.fingerprint()
+
+
+def _predict_in_process(img: Any) -> List[Any]:
+    return model_registry.get_predictor().predict(img)
+
+
+def predict_image(img: Any) -> List[Any]:
+    """
+    Predict one image on the pool when enabled, in process otherwise (blocking).
+    In process, the prediction runs as a job on the inference executor, the same
+    single-slot pool the micro-batcher and the streaming endpoint use: the models keep
+    per-call state (YOLOv8Seg boxes, masks, image size), so they must never run concurrently.
+    """
+    if inference_pool is not None:
+        return inference_pool.predict(img)
+    return inference_executor.call(_predict_in_process, img)
@@ -1,2 +1,3 @@
 from .yolov8 import YOLOv8
-from .yolov8_seg import YOLOv8Seg
\ No newline at end of file
+from .yolov8_seg import YOLOv8Seg
+from .compact_mask import CompactMask
\ No newline at end of file
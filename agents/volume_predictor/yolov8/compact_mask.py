@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+
+@dataclass
+class CompactMask:
+    """
+    Binary instance mask stored as a bit-packed crop of its bounding box plus the box offset.
+    A 20-detection 12-MP frame needs a few hundred KB instead of N full-frame float maps;
+    the full-frame mask is only built when to_full() (or np.asarray) is called.
+    """
+    bits: np.ndarray  # np.packbits of the uint8 crop along its width
+    x1: int
+    y1: int
+    crop_height: int
+    crop_width: int
+    frame_height: int
+    frame_width: int
+
+    @classmethod
+    def from_crop(cls, crop: np.ndarray, x1: int, y1: int, frame_shape: Tuple[int, int]) -> "CompactMask":
+        crop = np.asarray(crop) > 0
+        return cls(
+            bits=np.packbits(crop, axis=1),
+            x1=int(x1),
+            y1=int(y1),
+            crop_height=crop.shape[0],
+            crop_width=crop.shape[1],
+            frame_height=int(frame_shape[0]),
+            frame_width=int(frame_shape[1]),
+        )
+
+    @property
+    def crop(self) -> np.ndarray:
+        """The uint8 0/1 mask inside the box, shape (crop_height, crop_width)."""
+        return np.unpackbits(self.bits, axis=1, count=self.crop_width)
+
+    @property
+    def box(self) -> Tuple[int, int, int, int]:
+        return self.x1, self.y1, self.x1 + self.crop_width, self.y1 + self.crop_height
+
+    @property
+    def area(self) -> int:
+        # Padding bits are always zero, so counting the packed bytes is exact
+        return int(np.unpackbits(self.bits).sum())
+
+    def nonzero(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cols) of the mask pixels in frame coordinates."""
+        rows, cols = np.nonzero(self.crop)
+        return rows + self.y1, cols + self.x1
+
+    def to_full(self, size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Build the full-frame uint8 mask, optionally resized (nearest) to size=(width, height).
+        """
+        full = np.zeros((self.frame_height, self.frame_width), dtype=np.uint8)
+        full[self.y1:self.y1 + self.crop_height, self.x1:self.x1 + self.crop_width] = self.crop
+        if size is not None and tuple(size) != (self.frame_width, self.frame_height):
+            full = cv2.resize(full, tuple(size), interpolation=cv2.INTER_NEAREST)
+        return full
+
+    def __array__(self, dtype=None, copy=None):
+        full = self.to_full()
+        return full if dtype is None else full.astype(dtype)
@@ -1,5 +1,6 @@
 import numpy as np
 import cv2
+from .compact_mask import CompactMask
 
 class_names = [
     'background',
@@ -314,6 +315,13 @@ def draw_masks_seg(image, boxes, class_ids, mask_alpha=0.3, mask_maps=None):
         # Draw fill mask image
         if mask_maps is None:
             cv2.rectangle(mask_img, (x1, y1), (x2, y2), color, -1)
+        elif isinstance(mask_maps[i], CompactMask):
+            # Compact masks carry their own box, so only that crop is touched
+            mx1, my1, mx2, my2 = mask_maps[i].box
+            crop_mask = mask_maps[i].crop[:, :, np.newaxis]
+            crop_mask_img = mask_img[my1:my2, mx1:mx2]
+            crop_mask_img = crop_mask_img * (1 - crop_mask) + crop_mask * color
+            mask_img[my1:my2, mx1:mx2] = crop_mask_img
         else:
             crop_mask = mask_maps[i][y1:y2, x1:x2, np.newaxis]
             crop_mask_img = mask_img[y1:y2, x1:x2]
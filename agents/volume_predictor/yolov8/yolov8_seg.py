@@ -1,17 +1,24 @@
 import math
 import time
+import logging
 import cv2
 import numpy as np
-import onnxruntime
+from ..onnx_session import create_session
 from .utils import xywh2xyxy, nms, draw_detections_seg, sigmoid
+from .compact_mask import CompactMask
+
+logger = logging.getLogger(__name__)
 
 
 class YOLOv8Seg:
 
-    def __init__(self, path, conf_thres=0.7, iou_thres=0.5, num_masks=32):
+    def __init__(self, path, conf_thres=0.7, iou_thres=0.5, num_masks=32,
+                 intra_op_num_threads=None, inter_op_num_threads=None):
         self.conf_threshold = conf_thres
         self.iou_threshold = iou_thres
         self.num_masks = num_masks
+        self.intra_op_num_threads = intra_op_num_threads
+        self.inter_op_num_threads = inter_op_num_threads
 
         # Initialize model
         self.initialize_model(path)
@@ -20,9 +27,10 @@ class YOLOv8Seg:
         return self.segment_objects(image)
 
     def initialize_model(self, path):
-        self.session = onnxruntime.InferenceSession(
+        self.session = create_session(
             path,
-            providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
+            intra_op_num_threads=self.intra_op_num_threads,
+            inter_op_num_threads=self.inter_op_num_threads,
         )
         # Get model info
         self.get_input_details()
@@ -39,6 +47,32 @@ class YOLOv8Seg:
 
         return self.boxes, self.scores, self.class_ids, self.mask_maps
 
+    def segment_batch(self, images):
+        """
+        Segment several images, returning one (boxes, scores, class_ids, mask_maps) tuple per image.
+        The images share one inference call when the exported graph has a dynamic batch axis;
+        graphs exported with a fixed batch of 1 fall back to one call per image.
+        """
+        input_tensors = []
+        image_shapes = []
+        for image in images:
+            input_tensors.append(self.prepare_input(image))
+            image_shapes.append(image.shape[:2])
+
+        if self.supports_batching:
+            outputs = self.inference(np.concatenate(input_tensors, axis=0))
+            per_image_outputs = [(outputs[0][i:i + 1], outputs[1][i:i + 1]) for i in range(len(images))]
+        else:
+            per_image_outputs = [self.inference(input_tensor) for input_tensor in input_tensors]
+
+        results = []
+        for (img_height, img_width), (box_output, mask_output) in zip(image_shapes, per_image_outputs):
+            self.img_height, self.img_width = img_height, img_width
+            self.boxes, self.scores, self.class_ids, mask_pred = self.process_box_output(box_output)
+            self.mask_maps = self.process_mask_output(mask_pred, mask_output)
+            results.append((self.boxes, self.scores, self.class_ids, self.mask_maps))
+        return results
+
     def prepare_input(self, image):
         self.img_height, self.img_width = image.shape[:2]
 
@@ -57,7 +91,7 @@ class YOLOv8Seg:
     def inference(self, input_tensor):
         start = time.perf_counter()
         outputs = self.session.run(self.output_names, {self.input_names[0]: input_tensor})
-        print(f"YOLOv8 ONNX Inference time: {(time.perf_counter() - start)*1000:.2f} ms")
+        logger.debug("YOLOv8-seg ONNX inference time: %.2f ms", (time.perf_counter() - start) * 1000)
         return outputs
 
     def process_box_output(self, box_output):
@@ -88,25 +122,27 @@ class YOLOv8Seg:
         return boxes[indices], scores[indices], class_ids[indices], mask_predictions[indices]
 
     def process_mask_output(self, mask_predictions, mask_output):
-
+        """
+        Build one CompactMask per box. Each mask is computed only inside its box:
+        the prototype crop is combined with the box coefficients, upscaled to the box size
+        in float32, blurred, thresholded and bit-packed, so no full-frame map is allocated.
+        """
         if mask_predictions.shape[0] == 0:
             return []
 
-        mask_output = np.squeeze(mask_output)
+        mask_output = np.squeeze(mask_output).astype(np.float32)
+        mask_predictions = mask_predictions.astype(np.float32)
 
-        # Calculate the mask maps for each box
         num_mask, mask_height, mask_width = mask_output.shape  # CHW
-        masks = sigmoid(mask_predictions @ mask_output.reshape((num_mask, -1)))
-        masks = masks.reshape((-1, mask_height, mask_width))
 
         # Downscale the boxes to match the mask size
         scale_boxes = self.rescale_boxes(self.boxes,
                                    (self.img_height, self.img_width),
                                    (mask_height, mask_width))
 
-        # For every box/mask pair, get the mask map
-        mask_maps = np.zeros((len(scale_boxes), self.img_height, self.img_width))
-        blur_size = (int(self.img_width / mask_width), int(self.img_height / mask_height))
+        # For every box/mask pair, get the crop-local mask
+        mask_maps = []
+        blur_size = (max(1, int(self.img_width / mask_width)), max(1, int(self.img_height / mask_height)))
         for i in range(len(scale_boxes)):
 
             scale_x1 = int(math.floor(scale_boxes[i][0]))
@@ -119,7 +155,16 @@ class YOLOv8Seg:
             x2 = int(math.ceil(self.boxes[i][2]))
             y2 = int(math.ceil(self.boxes[i][3]))
 
-            scale_crop_mask = masks[i][scale_y1:scale_y2, scale_x1:scale_x2]
+            proto_crop = mask_output[:, scale_y1:scale_y2, scale_x1:scale_x2]
+            if x2 <= x1 or y2 <= y1 or proto_crop.shape[1] == 0 or proto_crop.shape[2] == 0:
+                mask_maps.append(CompactMask.from_crop(
+                    np.zeros((max(0, y2 - y1), max(0, x2 - x1)), dtype=np.uint8),
+                    x1, y1, (self.img_height, self.img_width)))
+                continue
+
+            crop_h, crop_w = proto_crop.shape[1:]
+            scale_crop_mask = sigmoid(mask_predictions[i] @ proto_crop.reshape((num_mask, -1)))
+            scale_crop_mask = scale_crop_mask.reshape((crop_h, crop_w))
             crop_mask = cv2.resize(scale_crop_mask,
                               (x2 - x1, y2 - y1),
                               interpolation=cv2.INTER_CUBIC)
@@ -127,7 +172,7 @@ class YOLOv8Seg:
             crop_mask = cv2.blur(crop_mask, blur_size)
 
             crop_mask = (crop_mask > 0.5).astype(np.uint8)
-            mask_maps[i, y1:y2, x1:x2] = crop_mask
+            mask_maps.append(CompactMask.from_crop(crop_mask, x1, y1, (self.img_height, self.img_width)))
 
         return mask_maps
 
@@ -166,6 +211,8 @@ class YOLOv8Seg:
         self.input_shape = model_inputs[0].shape
         self.input_height = self.input_shape[2]
         self.input_width = self.input_shape[3]
+        # A symbolic (str/None) batch dimension means several images can share one run
+        self.supports_batching = not isinstance(self.input_shape[0], int)
 
     def get_output_details(self):
         model_outputs = self.session.get_outputs()